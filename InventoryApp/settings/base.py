@@ -36,11 +36,13 @@ INSTALLED_APPS = DJANGO_APPS + LOCAL_APPS + THIRD_PARTY_APPS
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'inventory.middleware.MetricsMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'inventory.middleware.QueryBudgetMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -120,11 +122,147 @@ CSRF_COOKIE_SECURE = config('CSRF_COOKIE_SECURE', default=False, cast=bool)
 SECURE_SSL_REDIRECT = config('SECURE_SSL_REDIRECT', default=False, cast=bool)
 
 # Cache configuration
+# Rendered item rows, cards and category blocks; see inventory/fragments.py
+FRAGMENT_CACHE_TIMEOUT = config('FRAGMENT_CACHE_TIMEOUT', default=7 * 86400, cast=int)
+FRAGMENT_CACHE_MAX_ENTRIES = config('FRAGMENT_CACHE_MAX_ENTRIES', default=50000, cast=int)
+FRAGMENT_CACHE_MAX_BYTES = config('FRAGMENT_CACHE_MAX_BYTES', default=64 * 1024, cast=int)
+# Lifetime of category versions in a process-local fragments cache, so other workers' bumps are seen
+FRAGMENT_VERSION_LOCAL_TTL = config('FRAGMENT_VERSION_LOCAL_TTL', default=10, cast=int)
+
+# Read-through item cache (see inventory.item_cache)
+ITEM_CACHE_TIMEOUT = config('ITEM_CACHE_TIMEOUT', default=3600, cast=int)
+ITEM_CACHE_MAX_ENTRIES = config('ITEM_CACHE_MAX_ENTRIES', default=20000, cast=int)
+ITEM_CACHE_LOCAL_MAX_ENTRIES = config('ITEM_CACHE_LOCAL_MAX_ENTRIES', default=1000, cast=int)
+ITEM_CACHE_LOCAL_TTL = config('ITEM_CACHE_LOCAL_TTL', default=5.0, cast=float)
+# Invalidation bus between workers' local cache tiers: '', 'file:<path>' or 'redis'
+CACHE_BUS = config('CACHE_BUS', default='')
+
 CACHES = {
     'default': {
         'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-    }
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'inventory-fragments',
+        'TIMEOUT': FRAGMENT_CACHE_TIMEOUT,
+        'OPTIONS': {
+            'MAX_ENTRIES': FRAGMENT_CACHE_MAX_ENTRIES,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+    'items': {
+        'BACKEND': 'inventory.tiered_cache.TieredCache',
+        'LOCATION': 'items',
+        'TIMEOUT': ITEM_CACHE_TIMEOUT,
+        'OPTIONS': {
+            'L2': 'items-shared',
+            'L1_MAX_ENTRIES': ITEM_CACHE_LOCAL_MAX_ENTRIES,
+            'L1_TIMEOUT': ITEM_CACHE_LOCAL_TTL,
+            'BUS': CACHE_BUS,
+        },
+    },
+    # Process-local, so TieredCache leaves it out and serves items from L1 only;
+    # point it at a shared backend (as production does with Redis) to use L2
+    'items-shared': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'inventory-items',
+        'TIMEOUT': ITEM_CACHE_TIMEOUT,
+        'OPTIONS': {
+            'MAX_ENTRIES': ITEM_CACHE_MAX_ENTRIES,
+            'CULL_FREQUENCY': 4,
+        },
+    },
+}
+
+# Days of OUT movements behind the days_of_cover alert rule (see inventory.alert_rules)
+ALERT_USAGE_WINDOW_DAYS = config('ALERT_USAGE_WINDOW_DAYS', default=30, cast=int)
+# Seconds the active alert rules stay cached; bounds how long a rule change goes unseen by other workers
+ALERT_RULES_CACHE_TIMEOUT = config('ALERT_RULES_CACHE_TIMEOUT', default=60, cast=int)
+
+# Resolved alerts older than this are compacted into per-item counts (see `manage.py compact_alerts`)
+ALERT_RETENTION_DAYS = config('ALERT_RETENTION_DAYS', default=90, cast=int)
+ALERT_COMPACT_BATCH_SIZE = config('ALERT_COMPACT_BATCH_SIZE', default=1000, cast=int)
+
+# Alert digests (see inventory.notifications); no recipients turns them off
+ALERT_DIGEST_RECIPIENTS = [
+    address.strip() for address in config('ALERT_DIGEST_RECIPIENTS', default='').split(',') if address.strip()
+]
+ALERT_DIGEST_INTERVAL = config('ALERT_DIGEST_INTERVAL', default=300, cast=int)
+ALERT_DIGEST_MAX_ALERTS = config('ALERT_DIGEST_MAX_ALERTS', default=50, cast=int)
+
+# Hot-item stock striping: a job folds stripes back into Item.quantity this many seconds after a movement
+STRIPE_COMPACT_DELAY = config('STRIPE_COMPACT_DELAY', default=5, cast=int)
+
+# Change feed (see inventory.change_feed and `manage.py run_consumers`)
+CHANGE_FEED_GAP_SECONDS = config('CHANGE_FEED_GAP_SECONDS', default=30, cast=int)
+CHANGE_FEED_RETENTION_DAYS = config('CHANGE_FEED_RETENTION_DAYS', default=7, cast=int)
+
+# Ledger partitions and archival (see inventory.ledger and `manage.py archive_ledger`)
+LEDGER_RETENTION_DAYS = config('LEDGER_RETENTION_DAYS', default=365, cast=int)
+LEDGER_PARTITION_MONTHS_AHEAD = config('LEDGER_PARTITION_MONTHS_AHEAD', default=3, cast=int)
+
+# History rows removed per DELETE when an item is deleted (see inventory.purge)
+ITEM_DELETE_BATCH_SIZE = config('ITEM_DELETE_BATCH_SIZE', default=5000, cast=int)
+
+# Offline client sync (see inventory.sync)
+SYNC_PAGE_SIZE = config('SYNC_PAGE_SIZE', default=500, cast=int)
+SYNC_MAX_PAGE_SIZE = config('SYNC_MAX_PAGE_SIZE', default=5000, cast=int)
+
+# Bulk read API (see inventory.bulk_api)
+BULK_API_PAGE_SIZE = config('BULK_API_PAGE_SIZE', default=500, cast=int)
+BULK_API_MAX_PAGE_SIZE = config('BULK_API_MAX_PAGE_SIZE', default=5000, cast=int)
+
+# Background jobs (see inventory.jobs and `manage.py run_jobs`)
+JOB_POLL_INTERVAL = config('JOB_POLL_INTERVAL', default=1.0, cast=float)
+JOB_HEARTBEAT_SECONDS = config('JOB_HEARTBEAT_SECONDS', default=10.0, cast=float)
+JOB_LEASE_SECONDS = config('JOB_LEASE_SECONDS', default=120, cast=int)
+JOB_RETRY_BACKOFF = config('JOB_RETRY_BACKOFF', default=30, cast=int)
+JOB_OUTPUT_DIR = config('JOB_OUTPUT_DIR', default=str(BASE_DIR / 'var' / 'jobs'))
+
+# Write-behind buffer for handheld scan events
+SCAN_JOURNAL_PATH = config('SCAN_JOURNAL_PATH', default=str(BASE_DIR / 'var' / 'scan_journal.sqlite3'))
+SCAN_FLUSH_INTERVAL = config('SCAN_FLUSH_INTERVAL', default=2.0, cast=float)
+
+# Idempotency keys for the stock API
+IDEMPOTENCY_KEY_TTL = config('IDEMPOTENCY_KEY_TTL', default=24 * 60 * 60, cast=int)
+IDEMPOTENCY_MAX_KEYS = config('IDEMPOTENCY_MAX_KEYS', default=100000, cast=int)
+IDEMPOTENCY_PURGE_EVERY = 100
+
+# Per-view SQL query budgets, keyed by URL name (see inventory.middleware)
+SQL_QUERY_BUDGET_DEFAULT = None
+SQL_QUERY_BUDGETS = {
+    'inventory:home': 5,
+    'inventory:item_detail': 5,
+    'inventory:item_create': 12,
+    'inventory:item_update': 12,
+    # Plus one DELETE per ITEM_DELETE_BATCH_SIZE history rows past the first batch
+    'inventory:item_delete': 24,
+    'inventory:update_stock': 20,
+    'inventory:analytics': 18,
+    'inventory:reports': 5,
+    'inventory:reports_filtered': 5,
+    'inventory:manage_alerts': 10,
+    'inventory:resolve_alert': 8,
+    'inventory:api_stock_update': 20,
+    'inventory:api_scan_events': 4,
+    'inventory:api_generate_alerts': 6,
+    'inventory:api_export_report': 6,
+    'inventory:api_job_status': 3,
+    'inventory:api_sync': 6,
+    'inventory:api_items': 3,
+    'inventory:api_transactions': 3,
+    'inventory:api_alerts': 3,
+    'inventory:job_download': 6,
+    'inventory:api_dashboard_data': 6,
 }
+# Overruns raise instead of logging; the test runner turns this on
+SQL_BUDGET_STRICT = config('SQL_BUDGET_STRICT', default=False, cast=bool)
+TEST_RUNNER = 'inventory.test_runner.InventoryTestRunner'
+
+# Local metrics: each worker snapshots to METRICS_DIR, /metrics merges them
+METRICS_DIR = config('METRICS_DIR', default=str(BASE_DIR / 'var' / 'metrics'))
+METRICS_FLUSH_INTERVAL = config('METRICS_FLUSH_INTERVAL', default=5.0, cast=float)
+METRICS_ALLOWED_IPS = config('METRICS_ALLOWED_IPS', default='127.0.0.1,::1').split(',')
 
 # Logging configuration
 LOGGING = {
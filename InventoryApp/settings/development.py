@@ -22,8 +22,11 @@ STATICFILES_DIRS = [
 # Static files storage
 STATICFILES_STORAGE = 'whitenoise.storage.CompressedManifestStaticFilesStorage'
 
-# Email backend for development
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
+# Email backend for development; use the filebased backend to keep sent digests
+EMAIL_BACKEND = config('EMAIL_BACKEND', default='django.core.mail.backends.console.EmailBackend')
+EMAIL_FILE_PATH = config('EMAIL_FILE_PATH', default=str(BASE_DIR / 'var' / 'mail'))
+EMAIL_HOST = config('EMAIL_HOST', default='localhost')
+EMAIL_PORT = config('EMAIL_PORT', default=1025, cast=int)
 
 # Development-specific settings
 DEBUG = True
@@ -78,7 +78,38 @@ if config('REDIS_URL', default=''):
             'OPTIONS': {
                 'CLIENT_CLASS': 'django_redis.client.DefaultClient',
             }
-        }
+        },
+        # Bounded by the Redis maxmemory policy rather than MAX_ENTRIES
+        'fragments': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': config('REDIS_URL'),
+            'KEY_PREFIX': 'fragments',
+            'TIMEOUT': FRAGMENT_CACHE_TIMEOUT,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            }
+        },
+        # Workers keep hot items in process and hear about changes over pub/sub
+        'items': {
+            'BACKEND': 'inventory.tiered_cache.TieredCache',
+            'LOCATION': 'items',
+            'TIMEOUT': ITEM_CACHE_TIMEOUT,
+            'OPTIONS': {
+                'L2': 'items-shared',
+                'L1_MAX_ENTRIES': ITEM_CACHE_LOCAL_MAX_ENTRIES,
+                'L1_TIMEOUT': config('ITEM_CACHE_LOCAL_TTL', default=60.0, cast=float),
+                'BUS': config('CACHE_BUS', default='redis'),
+            },
+        },
+        'items-shared': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': config('REDIS_URL'),
+            'KEY_PREFIX': 'items',
+            'TIMEOUT': ITEM_CACHE_TIMEOUT,
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            }
+        },
     }
 
 # Production logging
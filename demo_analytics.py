@@ -11,10 +11,10 @@ from datetime import datetime, timedelta
 import random
 
 # Setup Django environment
-os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'InventoryApp.settings')
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'InventoryApp.settings.development')
 django.setup()
 
-from inventory.models import Item, InventoryTransaction, InventoryAlert
+from inventory.models import Category, Item, InventoryTransaction, InventoryAlert, Supplier
 from django.contrib.auth.models import User
 from django.utils import timezone
 from django.db.models import Sum, Count, Avg, F
@@ -41,9 +41,14 @@ def create_demo_data():
     
     items_created = 0
     for item_data in sample_items:
+        defaults = dict(
+            item_data,
+            category=Category.objects.resolve(item_data['category']),
+            supplier=Supplier.objects.resolve(item_data['supplier']),
+        )
         item, created = Item.objects.get_or_create(
             name=item_data['name'],
-            defaults=item_data
+            defaults=defaults
         )
         if created:
             items_created += 1
@@ -58,30 +63,35 @@ def create_demo_data():
         user = User.objects.create_user('demo_user', 'demo@example.com', 'password123')
         print("👤 Created demo user")
     
-    transaction_types = ['STOCK_IN', 'STOCK_OUT', 'ADJUSTMENT']
+    transaction_types = ['IN', 'OUT', 'ADJUST']
     transactions_created = 0
     
     for _ in range(20):  # Create 20 sample transactions
         item = random.choice(items)
+        item.refresh_from_db()
         transaction_type = random.choice(transaction_types)
         
-        if transaction_type == 'STOCK_IN':
+        if transaction_type == 'IN':
             quantity = random.randint(5, 50)
-        elif transaction_type == 'STOCK_OUT':
+        elif transaction_type == 'OUT':
+            if item.quantity == 0:
+                continue
             quantity = -random.randint(1, min(10, item.quantity))
-        else:  # ADJUSTMENT
-            quantity = random.randint(-5, 5)
-        
-        # Create transaction from 1-30 days ago
-        created_at = timezone.now() - timedelta(days=random.randint(1, 30))
+        else:  # ADJUST
+            quantity = random.randint(-min(5, item.quantity), 5)
+            if quantity == 0:
+                continue
         
-        transaction = InventoryTransaction.objects.create(
-            item=item,
+        item.update_stock(
+            quantity_change=quantity,
             transaction_type=transaction_type,
-            quantity=quantity,
-            notes=f"Demo {transaction_type.lower()} transaction",
-            created_by=user,
-            created_at=created_at
+            reason=f"Demo {transaction_type.lower()} transaction",
+            user=user
+        )
+        
+        # Backdate the transaction to 1-30 days ago
+        InventoryTransaction.objects.filter(pk=item.transactions.latest('timestamp').pk).update(
+            timestamp=timezone.now() - timedelta(days=random.randint(1, 30))
         )
         transactions_created += 1
     
@@ -137,14 +147,14 @@ def demonstrate_analytics():
     
     # Category breakdown
     print("\n📊 Category Breakdown:")
-    categories = Item.objects.values('category').annotate(
+    categories = Item.objects.values('category__name').annotate(
         count=Count('id'),
         total_quantity=Sum('quantity'),
         total_value=Sum(F('quantity') * F('price'))
     ).order_by('-count')
     
     for cat in categories:
-        print(f"  {cat['category']}: {cat['count']} items, "
+        print(f"  {cat['category__name']}: {cat['count']} items, "
               f"Qty: {cat['total_quantity']}, "
               f"Value: ${(cat['total_value'] or 0):,.2f}")
     
@@ -160,9 +170,9 @@ def demonstrate_analytics():
     
     # Recent transactions
     print("\n📋 Recent Transactions:")
-    recent_transactions = InventoryTransaction.objects.select_related('item', 'created_by').order_by('-created_at')[:5]
+    recent_transactions = InventoryTransaction.objects.select_related('item', 'user').order_by('-timestamp')[:5]
     for trans in recent_transactions:
-        print(f"  {trans.created_at.strftime('%Y-%m-%d')}: {trans.item.name} "
+        print(f"  {trans.timestamp.strftime('%Y-%m-%d')}: {trans.item.name} "
               f"({trans.transaction_type}) Qty: {trans.quantity}")
     
     # Active alerts
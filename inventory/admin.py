@@ -1,17 +1,42 @@
 from django.contrib import admin
-from .models import Item, InventoryTransaction, InventoryAlert
+from django.contrib.auth import get_permission_codename
+from django.db import IntegrityError, transaction
+from django.db.models import Count, Q
+from django.utils import timezone
+
+from . import change_feed, fragments, item_cache, purge
+from .models import (
+    AlertRule, AlertSummary, Category, ConsumerOffset, DigestCursor, Item, InventoryTransaction, InventoryAlert, Job,
+    Supplier, TransactionRollup,
+)
 
 # Register your models here.
 
+@admin.register(Category, Supplier)
+class DimensionAdmin(admin.ModelAdmin):
+    list_display = ['name', 'get_item_count']
+    search_fields = ['name']
+    list_per_page = 50
+    
+    def get_item_count(self, obj):
+        return obj.item_count
+    get_item_count.short_description = 'Items'
+    get_item_count.admin_order_field = 'item_count'
+    
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(item_count=Count('items'))
+
+
 @admin.register(Item)
 class ItemAdmin(admin.ModelAdmin):
     list_display = ['name', 'quantity', 'price', 'category', 'supplier', 'get_stock_status', 'get_total_value', 'created_at']
     list_filter = ['category', 'supplier', 'created_at', 'updated_at']
-    search_fields = ['name', 'category', 'supplier']
+    search_fields = ['name', 'category__name', 'supplier__name']
+    autocomplete_fields = ['category', 'supplier']
     ordering = ['name']    
     readonly_fields = ['get_total_value', 'get_stock_status', 'created_at', 'updated_at']
     list_per_page = 25
-    actions = ['mark_low_stock_items', 'update_reorder_level']
+    actions = ['mark_low_stock_items', 'update_reorder_level', 'compact_stock_stripes']
     
     def get_stock_status(self, obj):
         """Display stock status for admin"""
@@ -25,7 +50,31 @@ class ItemAdmin(admin.ModelAdmin):
     
     def get_queryset(self, request):
         """Optimize queryset for admin"""
-        return super().get_queryset(request).select_related()
+        return super().get_queryset(request).select_related('category', 'supplier')
+    
+    def delete_model(self, request, obj):
+        """Delete the item's history in batches first (see inventory.purge)"""
+        purge.delete_items(Item.objects.filter(pk=obj.pk))
+    
+    def delete_queryset(self, request, queryset):
+        """Bulk delete through the same batched path"""
+        purge.delete_items(queryset)
+    
+    def get_deleted_objects(self, objs, request):
+        """Confirmation summary that counts each item's history instead of listing every row"""
+        items = Item.objects.filter(pk__in=[obj.pk for obj in objs])
+        deleted_objects = [f'{Item._meta.verbose_name.capitalize()}: {item}' for item in objs]
+        model_count = {Item._meta.verbose_name_plural: len(deleted_objects)}
+        perms_needed = set()
+        for model, count in purge.dependent_counts(items).items():
+            opts = model._meta
+            deleted_objects.append(f'{count:,} {opts.verbose_name_plural}')
+            model_count[opts.verbose_name_plural] = count
+            if model in self.admin_site._registry and not request.user.has_perm(
+                f'{opts.app_label}.{get_permission_codename("delete", opts)}'
+            ):
+                perms_needed.add(opts.verbose_name)
+        return deleted_objects, model_count, perms_needed, []
     
     def mark_low_stock_items(self, request, queryset):
         """Custom action to identify low stock items"""
@@ -38,10 +87,22 @@ class ItemAdmin(admin.ModelAdmin):
     
     def update_reorder_level(self, request, queryset):
         """Custom action to update reorder levels"""
-        updated = queryset.update(reorder_level=10)
+        with transaction.atomic():
+            updated = queryset.update(reorder_level=10, updated_at=timezone.now())
+            change_feed.record_rows(change_feed.ITEM, change_feed.UPDATE, queryset, item='pk')
+        fragments.invalidate_categories(*queryset.values_list('category', flat=True).distinct())
+        item_cache.invalidate(*queryset.values_list('pk', flat=True))
         self.message_user(request, f'{updated} items updated with default reorder level.')
     update_reorder_level.short_description = 'Set reorder level to 10'
     
+    def compact_stock_stripes(self, request, queryset):
+        """Custom action to fold counter stripes back into item quantity"""
+        folded = 0
+        for item in queryset.filter(Q(stripes__quantity__gt=0) | Q(stripes__quantity__lt=0)).distinct():
+            folded += item.compact_stripes()
+        self.message_user(request, f'Net movement of {folded} units folded back from counter stripes.')
+    compact_stock_stripes.short_description = 'Fold counter stripes into quantity'
+    
     fieldsets = (
         ('Basic Information', {
             'fields': ('name', 'quantity', 'price')
@@ -53,6 +114,10 @@ class ItemAdmin(admin.ModelAdmin):
             'fields': ('total_value', 'stock_status'),
             'classes': ('collapse',)
         }),
+        ('Hot Item Tuning', {
+            'fields': ('stripe_count',),
+            'classes': ('collapse',)
+        }),
     )
 
 
@@ -78,6 +143,23 @@ class InventoryTransactionAdmin(admin.ModelAdmin):
         return super().get_queryset(request).select_related('item', 'user')
 
 
+@admin.register(TransactionRollup)
+class TransactionRollupAdmin(admin.ModelAdmin):
+    """Daily totals written by `manage.py archive_ledger`; read only"""
+    list_display = ['day', 'item', 'transaction_type', 'movements', 'quantity', 'quantity_change']
+    list_filter = ['transaction_type']
+    search_fields = ['item__name']
+    list_select_related = ['item']
+    list_per_page = 50
+    date_hierarchy = 'day'
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
 @admin.register(InventoryAlert)
 class InventoryAlertAdmin(admin.ModelAdmin):
     list_display = ['item', 'alert_type', 'is_resolved_display', 'created_at', 'resolved_at']
@@ -108,10 +190,93 @@ class InventoryAlertAdmin(admin.ModelAdmin):
     
     def mark_unresolved(self, request, queryset):
         """Mark selected alerts as unresolved"""
-        updated = queryset.update(is_resolved=False, resolved_at=None)
+        with transaction.atomic():
+            updated = queryset.update(is_resolved=False, resolved_at=None)
+            change_feed.record_rows(change_feed.ALERT, change_feed.UPDATE, queryset)
         self.message_user(request, f'{updated} alerts marked as unresolved.')
     mark_unresolved.short_description = 'Mark selected alerts as unresolved'
     
     def get_queryset(self, request):
         """Optimize queryset"""
         return super().get_queryset(request).select_related('item')
+
+
+@admin.register(AlertSummary)
+class AlertSummaryAdmin(admin.ModelAdmin):
+    """Resolved alerts compacted by `manage.py compact_alerts`; read only"""
+    list_display = ['item', 'alert_type', 'resolved_count', 'first_created_at', 'last_resolved_at']
+    list_filter = ['alert_type']
+    search_fields = ['item__name']
+    list_select_related = ['item']
+    list_per_page = 50
+    
+    def has_add_permission(self, request):
+        return False
+    
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(AlertRule)
+class AlertRuleAdmin(admin.ModelAdmin):
+    list_display = ['__str__', 'min_quantity', 'max_quantity', 'days_of_cover', 'is_active', 'updated_at']
+    list_filter = ['is_active', 'category']
+    search_fields = ['item__name', 'category__name']
+    raw_id_fields = ['item']
+    autocomplete_fields = ['category']
+    readonly_fields = ['created_at', 'updated_at']
+    list_per_page = 30
+    
+    def get_queryset(self, request):
+        """Optimize queryset"""
+        return super().get_queryset(request).select_related('item', 'category')
+
+
+@admin.register(DigestCursor)
+class DigestCursorAdmin(admin.ModelAdmin):
+    list_display = ['recipient', 'last_notification_id', 'last_sent_at', 'failures']
+    list_filter = ['failures']
+    search_fields = ['recipient']
+    readonly_fields = ['last_notification_id', 'last_sent_at', 'failures', 'last_error']
+
+
+@admin.register(ConsumerOffset)
+class ConsumerOffsetAdmin(admin.ModelAdmin):
+    list_display = ['name', 'position', 'updated_at']
+    search_fields = ['name']
+    readonly_fields = ['updated_at']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'status', 'priority', 'attempts', 'get_progress', 'locked_by', 'created_at', 'finished_at']
+    list_filter = ['status', 'name', 'created_at']
+    search_fields = ['name', 'dedupe_key', 'locked_by']
+    ordering = ['-created_at']
+    readonly_fields = ['created_at', 'started_at', 'finished_at', 'heartbeat_at']
+    list_per_page = 30
+    
+    actions = ['requeue_jobs']
+    
+    def get_progress(self, obj):
+        """Display progress as done/total"""
+        if not obj.progress_total:
+            return '-'
+        return f"{obj.progress_current}/{obj.progress_total}"
+    get_progress.short_description = 'Progress'
+    
+    def requeue_jobs(self, request, queryset):
+        """Queue failed jobs again with a fresh set of attempts"""
+        updated = 0
+        for job in queryset.filter(status=Job.FAILED):
+            try:
+                with transaction.atomic():
+                    Job.objects.filter(pk=job.pk).update(
+                        status=Job.QUEUED, attempts=0, locked_by='', run_after=timezone.now(), finished_at=None
+                    )
+                updated += 1
+            except IntegrityError:
+                # Another active job already holds this dedupe key
+                pass
+        self.message_user(request, f'{updated} jobs queued again.')
+    requeue_jobs.short_description = 'Queue selected failed jobs again'
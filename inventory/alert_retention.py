@@ -0,0 +1,78 @@
+"""
+Compaction of resolved alerts past retention.
+
+check_and_create_alerts and the sweeps keep raising alerts, and resolved
+ones were never removed, so the alert table fills up with rows nothing
+reads. compact() folds alerts resolved more than ALERT_RETENTION_DAYS ago
+into one AlertSummary row per item and alert type (how many, when the first
+was raised, when the last was resolved) and deletes them.
+
+Work goes in batches of ALERT_COMPACT_BATCH_SIZE alerts, oldest resolution
+first, taken from the partial index on resolved alerts. Each batch is its
+own short transaction, so locks are held briefly and an interrupted run
+loses nothing. Deleted alerts are recorded in the change feed like any
+other alert delete.
+"""
+
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Max, Min
+from django.utils import timezone
+
+from . import change_feed
+from .models import AlertSummary, InventoryAlert
+
+
+def _summarize(alerts):
+    """Add the alerts in the queryset `alerts` to the per-item summaries"""
+    rows = alerts.order_by().values('item_id', 'alert_type').annotate(
+        compacted=Count('pk'), first_created=Min('created_at'), last_resolved=Max('resolved_at'),
+    )
+    select, params = rows.query.sql_with_params()
+    summaries = AlertSummary._meta.db_table
+    # Scalar minimum and maximum of two values
+    least, greatest = ('LEAST', 'GREATEST') if connection.vendor == 'postgresql' else ('MIN', 'MAX')
+    with connection.cursor() as cursor:
+        # WHERE true keeps SQLite from reading ON CONFLICT as a join constraint
+        cursor.execute(
+            f'INSERT INTO {summaries} (item_id, alert_type, resolved_count, first_created_at, last_resolved_at) '
+            f'SELECT compacted.item_id, compacted.alert_type, compacted.compacted, compacted.first_created, '
+            f'compacted.last_resolved FROM ({select}) compacted WHERE true '
+            f'ON CONFLICT (item_id, alert_type) DO UPDATE SET '
+            f'resolved_count = {summaries}.resolved_count + excluded.resolved_count, '
+            f'first_created_at = {least}({summaries}.first_created_at, excluded.first_created_at), '
+            f'last_resolved_at = {greatest}({summaries}.last_resolved_at, excluded.last_resolved_at)',
+            params,
+        )
+
+
+def compact(retention_days=None, batch_size=None, pause=0, progress=None):
+    """Fold alerts resolved before the retention window into summaries; returns how many were removed.
+
+    Sleeps `pause` seconds between batches to leave room for other writers.
+    `progress`, if given, is called with the running total after each batch.
+    """
+    retention_days = settings.ALERT_RETENTION_DAYS if retention_days is None else retention_days
+    batch_size = batch_size or settings.ALERT_COMPACT_BATCH_SIZE
+    expired = InventoryAlert.objects.filter(
+        is_resolved=True, resolved_at__lt=timezone.now() - timedelta(days=retention_days),
+    )
+    compacted = 0
+    while True:
+        with transaction.atomic():
+            batch = list(expired.order_by('resolved_at').values_list('pk', flat=True)[:batch_size])
+            if not batch:
+                break
+            alerts = expired.filter(pk__in=batch)
+            _summarize(alerts)
+            change_feed.record_rows(change_feed.ALERT, change_feed.DELETE, alerts)
+            alerts.delete()
+        compacted += len(batch)
+        if progress:
+            progress(compacted)
+        if pause:
+            time.sleep(pause)
+    return compacted
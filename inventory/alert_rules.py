@@ -0,0 +1,253 @@
+"""
+Alert rules compiled into set-based SQL.
+
+An AlertRule sets stock thresholds for a single item, a category, or every
+item (neither set). Each threshold falls through on its own: an item rule
+with only max_quantity still takes min_quantity from its category rule, then
+from the global rule, and finally from the item's reorder level.
+
+The active rules compile into CASE expressions on the Item queryset, so
+evaluating any number of items against any number of rules is one query.
+Alerts are written with INSERT ... SELECT, and adding rules never adds
+per-item queries. For each item the most urgent condition wins:
+
+    OUT_OF_STOCK  quantity is 0
+    LOW_STOCK     quantity <= min_quantity, or fewer than days_of_cover
+                  days of stock left at the OUT rate over the last
+                  ALERT_USAGE_WINDOW_DAYS
+    OVERSTOCK     quantity > max_quantity
+
+The active rules are cached in the default cache under a version key that
+is bumped whenever a rule is saved or deleted. The cached list also expires
+after ALERT_RULES_CACHE_TIMEOUT seconds, which bounds how long a change goes
+unseen by workers whose default cache is not shared with the writer's.
+
+Conditions that were not already alerted are also copied to the
+notification outbox (see inventory.notifications), and every alert written
+or replaced is recorded in the change feed.
+"""
+
+import time
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connection, transaction
+from django.db.models import (
+    Case, CharField, Exists, F, IntegerField, OuterRef, Q, Subquery, Sum, Value, When,
+)
+from django.db.models.functions import Cast, Coalesce, Concat
+from django.db.models.lookups import LessThan
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import change_feed, notifications
+
+RULES_CACHE_KEY = 'inventory:alert-rules'
+RULES_VERSION_KEY = 'inventory:alert-rules-version'
+THRESHOLDS = ('min_quantity', 'max_quantity', 'days_of_cover')
+
+
+def _model(name):
+    return apps.get_model('inventory', name)
+
+
+def active_rules():
+    """Threshold values of every active rule, as plain dicts"""
+    # Versions start from the clock, so an evicted version never matches an older list
+    key = f'{RULES_CACHE_KEY}:{cache.get_or_set(RULES_VERSION_KEY, time.time_ns, None)}'
+    rules = cache.get(key)
+    if rules is None:
+        rules = list(_model('AlertRule').objects.filter(is_active=True).values('item_id', 'category_id', *THRESHOLDS))
+        cache.set(key, rules, settings.ALERT_RULES_CACHE_TIMEOUT)
+    return rules
+
+
+def forget_rules():
+    """Make the next active_rules() read the rules from the database"""
+    try:
+        cache.incr(RULES_VERSION_KEY)
+    except ValueError:
+        cache.set(RULES_VERSION_KEY, time.time_ns(), None)
+
+
+@receiver(post_save, sender='inventory.AlertRule')
+@receiver(post_delete, sender='inventory.AlertRule')
+def _rules_changed(**kwargs):
+    forget_rules()
+    transaction.on_commit(forget_rules)
+
+
+def _text(expression):
+    return Cast(expression, output_field=CharField())
+
+
+class RuleSet:
+    """Active rules compiled into annotations on an Item queryset"""
+
+    def __init__(self, rules):
+        self.item_rules = [rule for rule in rules if rule['item_id']]
+        self.category_rules = [rule for rule in rules if not rule['item_id'] and rule['category_id']]
+        self.global_rule = next((rule for rule in rules if not rule['item_id'] and not rule['category_id']), {})
+
+    def threshold(self, name, default):
+        """CASE picking the most specific rule that sets `name`"""
+        whens = [
+            When(pk=rule['item_id'], then=Value(rule[name]))
+            for rule in self.item_rules if rule[name] is not None
+        ] + [
+            When(category_id=rule['category_id'], then=Value(rule[name]))
+            for rule in self.category_rules if rule[name] is not None
+        ]
+        if self.global_rule.get(name) is not None:
+            default = Value(self.global_rule[name])
+        if not whens:
+            return default
+        return Case(*whens, default=default, output_field=IntegerField())
+
+    def uses(self, name):
+        return self.global_rule.get(name) is not None or any(
+            rule[name] is not None for rule in self.item_rules + self.category_rules
+        )
+
+    def annotate(self, items):
+        """Add alert_type and alert_message; both are NULL for items needing no alert"""
+        items = items.annotate(alert_min=self.threshold('min_quantity', F('reorder_level')))
+        conditions = [
+            When(quantity=0, then=Value('OUT_OF_STOCK')),
+            When(quantity__lte=F('alert_min'), then=Value('LOW_STOCK')),
+        ]
+        messages = [
+            When(quantity=0, then=Concat(
+                Value('Item "'), 'name', Value('" is out of stock. Immediate restocking required.'),
+            )),
+            When(quantity__lte=F('alert_min'), then=Concat(
+                Value('Item "'), 'name', Value('" is running low. Current stock: '), _text('quantity'),
+                Value(', Reorder level: '), _text('alert_min'),
+            )),
+        ]
+
+        if self.uses('days_of_cover'):
+            window = settings.ALERT_USAGE_WINDOW_DAYS
+            usage = _model('InventoryTransaction').objects.filter(
+                item=OuterRef('pk'), transaction_type='OUT',
+                timestamp__gte=timezone.now() - timedelta(days=window),
+            ).values('item').annotate(total=Sum('quantity')).values('total')
+            items = items.annotate(
+                alert_cover=self.threshold('days_of_cover', Value(None, output_field=IntegerField())),
+                alert_usage=Coalesce(Subquery(usage), 0, output_field=IntegerField()),
+            )
+            # Days left = quantity / (usage / window), compared without dividing;
+            # a NULL days_of_cover makes the comparison NULL, so no alert
+            short = LessThan(F('quantity') * window, F('alert_usage') * F('alert_cover'))
+            conditions.append(When(short, then=Value('LOW_STOCK')))
+            messages.append(When(short, then=Concat(
+                Value('Item "'), 'name', Value('" has less than '), _text('alert_cover'),
+                Value(' days of cover. Current stock: '), _text('quantity'),
+                Value(f', used in the last {window} days: '), _text('alert_usage'),
+            )))
+
+        if self.uses('max_quantity'):
+            items = items.annotate(
+                alert_max=self.threshold('max_quantity', Value(None, output_field=IntegerField())),
+            )
+            over = Q(alert_max__isnull=False, quantity__gt=F('alert_max'))
+            conditions.append(When(over, then=Value('OVERSTOCK')))
+            messages.append(When(over, then=Concat(
+                Value('Item "'), 'name', Value('" is overstocked. Current stock: '), _text('quantity'),
+                Value(', Maximum: '), _text('alert_max'),
+            )))
+
+        return items.annotate(
+            alert_type=Case(*conditions, default=Value(None), output_field=CharField()),
+            alert_message=Case(*messages, default=Value(None), output_field=CharField()),
+        )
+
+
+def evaluate(items):
+    """`items` annotated with alert_type/alert_message, limited to items that need an alert"""
+    return RuleSet(active_rules()).annotate(items).filter(alert_type__isnull=False)
+
+
+def insert_from(evaluated, model, **values):
+    """INSERT ... SELECT the evaluated alerts into `model`'s table; returns how many rows were written.
+    
+    Each row gets item_id, alert_type and message from `evaluated`, plus the
+    constant column `values`.
+    """
+    # An annotation gets a column alias, so the outer SELECT can name it
+    rows = evaluated.annotate(alert_item=F('pk')).order_by().values('alert_item', 'alert_type', 'alert_message')
+    select, params = rows.query.sql_with_params()
+    columns = ', '.join(['item_id', 'alert_type', 'message', *values])
+    constants = ''.join(', %s' for _ in values)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {model._meta.db_table} ({columns}) '
+            f'SELECT evaluated.alert_item, evaluated.alert_type, evaluated.alert_message{constants} '
+            f'FROM ({select}) evaluated',
+            (*values.values(), *params),
+        )
+        return cursor.rowcount
+
+
+def _insert_alerts(evaluated, now=None):
+    created_at = connection.ops.adapt_datetimefield_value(now or timezone.now())
+    return insert_from(evaluated, _model('InventoryAlert'), is_resolved=False, created_at=created_at)
+
+
+def _queue_notifications(conditions):
+    """Put newly raised conditions in the digest outbox; mail goes out from a job after commit"""
+    if not notifications.recipients():
+        return 0
+    now = connection.ops.adapt_datetimefield_value(timezone.now())
+    queued = insert_from(conditions, _model('AlertNotification'), created_at=now)
+    if queued:
+        transaction.on_commit(notifications.schedule)
+    return queued
+
+
+def _new_conditions(evaluated):
+    """The evaluated alerts whose item has no unresolved alert of that type yet"""
+    open_alerts = _model('InventoryAlert').objects.filter(
+        item=OuterRef('pk'), alert_type=OuterRef('alert_type'), is_resolved=False,
+    )
+    return evaluated.exclude(Exists(open_alerts))
+
+
+def replace_alerts(items, count_new=True):
+    """Re-evaluate `items`, replacing their unresolved alerts.
+
+    Returns (items alerted, items that had no unresolved alert before), or
+    (items alerted, None) when `count_new` is false. Conditions that were
+    not already alerted go to the notification outbox.
+    """
+    InventoryAlert = _model('InventoryAlert')
+    evaluated = evaluate(items)
+    open_alerts = InventoryAlert.objects.filter(is_resolved=False, item__in=items.values('pk'))
+    with transaction.atomic():
+        generated = None
+        if count_new:
+            generated = evaluated.exclude(
+                Exists(InventoryAlert.objects.filter(item=OuterRef('pk'), is_resolved=False))
+            ).count()
+        _queue_notifications(_new_conditions(evaluated))
+        change_feed.record_rows(change_feed.ALERT, change_feed.DELETE, open_alerts)
+        open_alerts.delete()
+        alerted = _insert_alerts(evaluated)
+        change_feed.record_rows(change_feed.ALERT, change_feed.CREATE, open_alerts)
+    return alerted, generated
+
+
+def raise_missing_alerts(items):
+    """Create alerts for items whose condition has no open alert of that type yet"""
+    missing = _new_conditions(evaluate(items))
+    _queue_notifications(missing)
+    now = timezone.now()
+    raised = _insert_alerts(missing, now)
+    if raised:
+        change_feed.record_rows(change_feed.ALERT, change_feed.CREATE, _model('InventoryAlert').objects.filter(
+            is_resolved=False, created_at=now, item__in=items.values('pk'),
+        ))
+    return raised
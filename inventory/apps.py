@@ -4,3 +4,7 @@ from django.apps import AppConfig
 class InventoryConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'inventory'
+
+    def ready(self):
+        # Register the cache invalidation signals and the background tasks
+        from . import fragments, item_cache, tasks  # noqa: F401
@@ -0,0 +1,196 @@
+"""
+Bulk read API for items, transactions and alerts.
+
+Each resource maps its public field names to columns or SQL expressions.
+A request picks the fields it wants (`fields=`) and filters the rows. It
+then takes a page after a primary key (`after=`, keyset pagination) or
+looks rows up in batch (`ids=`, plus `name=` for items). Rows go straight
+from values_list() tuples into dicts, with no model instances, and are
+encoded with orjson when it is installed.
+"""
+
+import json
+from decimal import Decimal
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Case, CharField, F, Q, Value, When
+from django.utils.dateparse import parse_datetime
+
+from .models import InventoryAlert, InventoryTransaction, Item
+from .rows import TOTAL_VALUE
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+STOCK_STATUS_FILTERS = {
+    'out_of_stock': Q(quantity=0),
+    'low_stock': Q(quantity__gt=0, quantity__lte=F('reorder_level')),
+    'in_stock': Q(quantity__gt=F('reorder_level')) & ~Q(quantity=0),
+}
+
+STOCK_STATUS_NAME = Case(
+    *[When(condition, then=Value(name)) for name, condition in STOCK_STATUS_FILTERS.items()],
+    output_field=CharField(),
+)
+
+
+class BadRequest(ValueError):
+    """Raised for unknown fields or filters and malformed values"""
+
+
+def _list(value):
+    return [part.strip() for part in value.split(',') if part.strip()]
+
+
+def _ids(value):
+    try:
+        return [int(part) for part in _list(value)]
+    except ValueError:
+        raise BadRequest(f'Expected comma-separated ids, got {value!r}')
+
+
+def _flag(value):
+    if value.lower() not in ('true', 'false', '1', '0'):
+        raise BadRequest(f'Expected true or false, got {value!r}')
+    return value.lower() in ('true', '1')
+
+
+def _since(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        raise BadRequest(f'Expected an ISO 8601 timestamp, got {value!r}')
+    return moment
+
+
+def _stock_status(value):
+    statuses = _list(value)
+    unknown = set(statuses) - set(STOCK_STATUS_FILTERS)
+    if unknown:
+        raise BadRequest(f'Unknown stock status: {", ".join(sorted(unknown))}')
+    condition = Q(pk__in=[])
+    for status in statuses:
+        condition |= STOCK_STATUS_FILTERS[status]
+    return condition
+
+
+RESOURCES = {
+    'items': {
+        'model': Item,
+        'fields': {
+            'id': 'pk', 'name': 'name', 'category': 'category__name', 'supplier': 'supplier__name',
+            'quantity': 'quantity', 'reorder_level': 'reorder_level', 'price': 'price',
+            'total_value': TOTAL_VALUE, 'status': STOCK_STATUS_NAME,
+            'created_at': 'created_at', 'updated_at': 'updated_at',
+        },
+        'default_fields': ('id', 'name', 'category', 'supplier', 'quantity', 'reorder_level', 'price', 'status'),
+        'filters': {
+            'category': lambda value: Q(category__name__in=_list(value)),
+            'supplier': lambda value: Q(supplier__name__in=_list(value)),
+            'status': _stock_status,
+        },
+    },
+    'transactions': {
+        'model': InventoryTransaction,
+        'fields': {
+            'id': 'pk', 'item_id': 'item_id', 'item_name': 'item__name', 'transaction_type': 'transaction_type',
+            'quantity': 'quantity', 'reason': 'reason', 'user_id': 'user_id', 'timestamp': 'timestamp',
+        },
+        'default_fields': ('id', 'item_id', 'transaction_type', 'quantity', 'reason', 'user_id', 'timestamp'),
+        'filters': {
+            'item': lambda value: Q(item_id__in=_ids(value)),
+            'type': lambda value: Q(transaction_type__in=_list(value)),
+            'since': lambda value: Q(timestamp__gte=_since(value)),
+            'category': lambda value: Q(item__category__name__in=_list(value)),
+        },
+    },
+    'alerts': {
+        'model': InventoryAlert,
+        'fields': {
+            'id': 'pk', 'item_id': 'item_id', 'item_name': 'item__name', 'alert_type': 'alert_type',
+            'message': 'message', 'is_resolved': 'is_resolved', 'created_at': 'created_at',
+            'resolved_at': 'resolved_at',
+        },
+        'default_fields': ('id', 'item_id', 'alert_type', 'message', 'is_resolved', 'created_at'),
+        'filters': {
+            'item': lambda value: Q(item_id__in=_ids(value)),
+            'type': lambda value: Q(alert_type__in=_list(value)),
+            'resolved': lambda value: Q(is_resolved=_flag(value)),
+            'category': lambda value: Q(item__category__name__in=_list(value)),
+        },
+    },
+}
+
+# Query parameters that are not filters
+CONTROLS = ('fields', 'after', 'limit', 'ids', 'name')
+
+
+def read(resource, params):
+    """One page of `resource` for the query parameters `params` (a QueryDict).
+    
+    Returns {'results': [...], 'count': n, 'next_after': pk or None}, where
+    next_after is the `after` value for the following page.
+    """
+    spec = RESOURCES[resource]
+    names = _list(params['fields']) if params.get('fields') else list(spec['default_fields'])
+    unknown = set(names) - set(spec['fields'])
+    if unknown:
+        raise BadRequest(f'Unknown fields for {resource}: {", ".join(sorted(unknown))}')
+
+    try:
+        limit = int(params.get('limit', settings.BULK_API_PAGE_SIZE))
+        after = int(params.get('after', 0))
+    except ValueError:
+        raise BadRequest('limit and after must be integers')
+    if not 0 < limit <= settings.BULK_API_MAX_PAGE_SIZE:
+        raise BadRequest(f'limit must be between 1 and {settings.BULK_API_MAX_PAGE_SIZE}')
+
+    queryset = spec['model'].objects.filter(pk__gt=after)
+    for key in params:
+        if key in CONTROLS:
+            continue
+        if key not in spec['filters']:
+            raise BadRequest(f'Unknown filter for {resource}: {key}')
+        queryset = queryset.filter(spec['filters'][key](params[key]))
+    if 'ids' in params:
+        queryset = queryset.filter(pk__in=_ids(params['ids'])[:settings.BULK_API_MAX_PAGE_SIZE])
+    if 'name' in params:
+        if resource != 'items':
+            raise BadRequest('Lookup by name is only available for items')
+        queryset = queryset.filter(name__in=params.getlist('name')[:settings.BULK_API_MAX_PAGE_SIZE])
+
+    columns = []
+    for name in names:
+        column = spec['fields'][name]
+        if not isinstance(column, str):
+            queryset = queryset.annotate(**{f'api_{name}': column})
+            column = f'api_{name}'
+        columns.append(column)
+    # The pk rides along as a last column that zip() leaves out of each row
+    rows = list(queryset.order_by('pk').values_list(*columns, 'pk')[:limit])
+    return {
+        'results': [dict(zip(names, row)) for row in rows],
+        'count': len(rows),
+        'next_after': rows[-1][-1] if len(rows) == limit else None,
+    }
+
+
+def _default(value):
+    # Every decimal here is money; SQLite returns computed ones without their scale
+    if isinstance(value, Decimal):
+        return f'{value:.2f}'
+    raise TypeError(f'{type(value).__name__} is not JSON serializable')
+
+
+class _Encoder(DjangoJSONEncoder):
+    def default(self, o):
+        return _default(o) if isinstance(o, Decimal) else super().default(o)
+
+
+def dumps(payload):
+    """Encode `payload` as JSON bytes, with orjson when it is available"""
+    if orjson is not None:
+        return orjson.dumps(payload, default=_default)
+    return json.dumps(payload, cls=_Encoder).encode()
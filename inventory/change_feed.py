@@ -0,0 +1,181 @@
+"""
+Append-only change feed for items, stock movements and alerts.
+
+Every Item, InventoryTransaction and InventoryAlert write adds a ChangeEvent
+row in the same transaction. The event records the topic, the action, the
+changed row's id and its item. Single-row saves and item deletes are caught
+by the post_save/post_delete receivers below. Movements and alerts record
+their own single-row deletes (models.FeedsDeletes), since a receiver would
+stop Django fast-deleting them in bulk. Set-based writes (queryset updates
+and deletes, the alert rule INSERT ... SELECTs) call record_rows() with the
+affected queryset. Events are notices that a row changed, not copies of it;
+consumers read the current state themselves. Deleting an item records one
+item delete event, which also stands for its cascaded transactions and
+alerts.
+
+Consumers registered with @consumer('name') read the feed in batches after
+a durable offset (ConsumerOffset), moved in the same transaction as their
+handler. Event ids are allocated when a row is inserted, but become visible
+when its transaction commits, so a lower id can appear after a higher one.
+Reads therefore stop at a gap in the sequence until the event after it is
+CHANGE_FEED_GAP_SECONDS old. After that the gap is taken to be a rolled-back
+write. `manage.py run_consumers` drives the registered consumers and prunes
+events older than CHANGE_FEED_RETENTION_DAYS that every consumer has read.
+"""
+
+from datetime import timedelta
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F, Max, Min
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+ITEM, TRANSACTION, ALERT = 'item', 'transaction', 'alert'
+CREATE, UPDATE, DELETE = 'create', 'update', 'delete'
+
+consumers = {}
+
+
+def _model(name):
+    return apps.get_model('inventory', name)
+
+
+def record(topic, action, object_id, item_id):
+    """Append one event; call inside the transaction making the change"""
+    return _model('ChangeEvent').objects.create(topic=topic, action=action, object_id=object_id, item_id=item_id)
+
+
+def record_rows(topic, action, rows, item='item_id'):
+    """Append an event for every row of the queryset `rows` with one INSERT ... SELECT.
+
+    `item` names the field holding each row's item id. Returns how many
+    events were written.
+    """
+    select, params = rows.order_by().annotate(
+        feed_object=F('pk'), feed_item=F(item),
+    ).values('feed_object', 'feed_item').query.sql_with_params()
+    created_at = connection.ops.adapt_datetimefield_value(timezone.now())
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {_model("ChangeEvent")._meta.db_table} (topic, action, object_id, item_id, created_at) '
+            f'SELECT %s, %s, changed.feed_object, changed.feed_item, %s FROM ({select}) changed',
+            (topic, action, created_at, *params),
+        )
+        return cursor.rowcount
+
+
+@receiver(post_save, sender='inventory.Item')
+def _item_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        record(ITEM, CREATE if created else UPDATE, instance.pk, instance.pk)
+
+
+@receiver(post_delete, sender='inventory.Item')
+def _item_deleted(sender, instance, **kwargs):
+    record(ITEM, DELETE, instance.pk, instance.pk)
+
+
+@receiver(post_save, sender='inventory.InventoryTransaction')
+def _transaction_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        record(TRANSACTION, CREATE if created else UPDATE, instance.pk, instance.item_id)
+
+
+@receiver(post_save, sender='inventory.InventoryAlert')
+def _alert_saved(sender, instance, created, raw=False, **kwargs):
+    if not raw:
+        record(ALERT, CREATE if created else UPDATE, instance.pk, instance.item_id)
+
+
+def settled(rows, position):
+    """The leading `rows` after `position` (in id order) up to the first recent gap.
+
+    Works for any table whose ids are allocated on insert and that has a
+    created_at column, such as the alert notification outbox.
+    """
+    settled_at = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_GAP_SECONDS)
+    ready = []
+    for row in rows:
+        if row.pk != position + 1 and row.created_at > settled_at:
+            # A lower id may still be in an open transaction
+            break
+        ready.append(row)
+        position = row.pk
+    return ready
+
+
+def read(position, limit=500):
+    """Committed events after `position`, oldest first, stopping at a recent gap"""
+    return settled(_model('ChangeEvent').objects.filter(pk__gt=position).order_by('pk')[:limit], position)
+
+
+def settled_position():
+    """The furthest position read() can get to now, without stopping at a gap.
+
+    Events older than CHANGE_FEED_GAP_SECONDS count as settled, gaps before
+    them included, as in read(). From the newest of them the recent events
+    are followed while their ids run on without a gap.
+    """
+    ChangeEvent = _model('ChangeEvent')
+    settled = timezone.now() - timedelta(seconds=settings.CHANGE_FEED_GAP_SECONDS)
+    # Walks back from the newest event, so only recent events are read
+    position = ChangeEvent.objects.filter(created_at__lte=settled).order_by('-pk').values_list('pk', flat=True).first()
+    if position is None:
+        first = ChangeEvent.objects.aggregate(pk=Min('pk'))['pk']
+        position = first - 1 if first is not None else 0
+    while True:
+        events = read(position, 500)
+        if events:
+            position = events[-1].pk
+        if len(events) < 500:
+            # The end of the feed, or a gap read() stops at
+            return position
+
+
+def consumer(name):
+    """Register a function taking a list of events as the handler of consumer `name`"""
+    def register(func):
+        consumers[name] = func
+        return func
+    return register
+
+
+def consume(name, batch_size=500):
+    """Hand the next batch of events to consumer `name` and advance its offset; returns the batch size.
+
+    The handler runs in the transaction that moves the offset, so database
+    work it does is applied exactly once. Anything else it does happens at
+    least once.
+    """
+    ConsumerOffset = _model('ConsumerOffset')
+    handler = consumers[name]
+    ConsumerOffset.objects.get_or_create(name=name)
+    with transaction.atomic():
+        offset = ConsumerOffset.objects.select_for_update().get(name=name)
+        events = read(offset.position, batch_size)
+        if events:
+            handler(events)
+            offset.position = events[-1].pk
+            offset.save(update_fields=['position', 'updated_at'])
+    return len(events)
+
+
+def prune():
+    """Delete events past retention that every consumer has read; returns how many.
+
+    The newest event is always kept, so an empty feed never hides how far
+    it has been pruned.
+    """
+    ChangeEvent = _model('ChangeEvent')
+    cutoff = timezone.now() - timedelta(days=settings.CHANGE_FEED_RETENTION_DAYS)
+    latest = ChangeEvent.objects.aggregate(pk=Max('pk'))['pk']
+    expired = ChangeEvent.objects.filter(created_at__lt=cutoff, pk__lt=latest)
+    slowest = _model('ConsumerOffset').objects.filter(name__in=consumers).aggregate(
+        position=Min('position'))['position']
+    if slowest is not None:
+        expired = expired.filter(pk__lte=slowest)
+    deleted, _ = expired.delete()
+    return deleted
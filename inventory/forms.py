@@ -1,15 +1,37 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
 from django.contrib.auth.models import User
-from .models import Item, InventoryTransaction, InventoryAlert
+from django.db import transaction
+from .models import Category, Item, InventoryTransaction, InventoryAlert, Supplier, normalize_name
 
 
 class ItemForm(forms.ModelForm):
-    """Form for creating and updating inventory items"""
+    """Form for creating and updating inventory items.
+    
+    Category and supplier are typed as names and matched to existing rows
+    regardless of case and spacing; new names are added when the item is
+    saved, never during validation. Left out of the submitted data, they
+    keep the item's current values.
+    """
+    category = forms.CharField(max_length=200, required=False, initial=Item.DEFAULT_CATEGORY, widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Enter category (e.g., Electronics, Office Supplies)'
+    }))
+    supplier = forms.CharField(max_length=200, required=False, widget=forms.TextInput(attrs={
+        'class': 'form-control',
+        'placeholder': 'Enter supplier name (optional)'
+    }))
+    
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk:
+            self.initial['category'] = self.instance.category.name
+            self.initial['supplier'] = self.instance.supplier.name if self.instance.supplier_id else ''
     
     class Meta:
         model = Item
-        fields = ['name', 'quantity', 'price', 'category', 'supplier', 'reorder_level']
+        # category and supplier are names resolved to rows in save()
+        fields = ['name', 'quantity', 'price', 'reorder_level']
         widgets = {
             'name': forms.TextInput(attrs={
                 'class': 'form-control',
@@ -26,14 +48,6 @@ class ItemForm(forms.ModelForm):
                 'step': '0.01',
                 'min': '0'
             }),
-            'category': forms.TextInput(attrs={
-                'class': 'form-control',
-                'placeholder': 'Enter category (e.g., Electronics, Office Supplies)'
-            }),
-            'supplier': forms.TextInput(attrs={
-                'class': 'form-control',
-                'placeholder': 'Enter supplier name (optional)'
-            }),
             'reorder_level': forms.NumberInput(attrs={
                 'class': 'form-control',
                 'placeholder': 'Minimum stock level',
@@ -42,6 +56,29 @@ class ItemForm(forms.ModelForm):
             }),
         }
     
+    def clean_category(self):
+        """The category name, or None to keep the item's current category"""
+        category = normalize_name(self.cleaned_data['category'])
+        if not category and not self.instance.category_id:
+            return Item.DEFAULT_CATEGORY
+        return category or None
+    
+    def clean_supplier(self):
+        """The supplier name, '' for no supplier, or None to keep the current one"""
+        if 'supplier' not in self.data:
+            return None
+        return normalize_name(self.cleaned_data['supplier'])
+    
+    def save(self, commit=True):
+        """Resolve the category and supplier names, adding new ones, then save the item"""
+        with transaction.atomic():
+            category, supplier = self.cleaned_data['category'], self.cleaned_data['supplier']
+            if category is not None:
+                self.instance.category = Category.objects.resolve(category)
+            if supplier is not None:
+                self.instance.supplier = Supplier.objects.resolve(supplier) if supplier else None
+            return super().save(commit)
+    
     def clean_quantity(self):
         quantity = self.cleaned_data.get('quantity')
         if quantity < 0:
@@ -0,0 +1,124 @@
+"""
+Template fragment cache for item rows, cards and detail panels.
+
+Item fragments are keyed on the item's pk and updated_at, so a changed item
+simply misses and re-renders while every other row is served from cache.
+Fragments that cover a whole category are keyed on a per-category version
+number (by category id) that is bumped whenever an item in that category is
+saved or deleted. The versions must be seen by every worker, so in a cache
+that lives in process memory (LocMemCache) they only last
+FRAGMENT_VERSION_LOCAL_TTL seconds, which bounds how long another worker's
+bump can go unseen. Versions start from the clock rather than 1, so a
+version that expired or was evicted never comes back to match fragments
+cached under it before.
+Entries live in the ``fragments`` cache alias, which is capped by
+FRAGMENT_CACHE_MAX_ENTRIES, and fragments larger than
+FRAGMENT_CACHE_MAX_BYTES are rendered but never stored.
+"""
+
+import hashlib
+import time
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from . import metrics
+
+CACHE_ALIAS = 'fragments'
+
+
+def fragment_cache():
+    return caches[CACHE_ALIAS]
+
+
+def fragment_key(name, vary_on=()):
+    digest = hashlib.md5(':'.join(str(value) for value in vary_on).encode(), usedforsecurity=False)
+    return f'fragment:{name}:{digest.hexdigest()}'
+
+
+def get_fragment(name, vary_on=()):
+    """Cached markup for a fragment, or None; records a hit or miss"""
+    html = fragment_cache().get(fragment_key(name, vary_on))
+    metrics.record_cache(f'fragment:{name}', html is not None)
+    return html
+
+
+def get_fragments(name, vary_ons):
+    """Bulk lookup: {vary_on: markup} for the fragments that are cached"""
+    keys = {fragment_key(name, vary_on): vary_on for vary_on in vary_ons}
+    found = fragment_cache().get_many(keys)
+    for key in keys:
+        metrics.record_cache(f'fragment:{name}', key in found)
+    return {keys[key]: html for key, html in found.items()}
+
+
+def set_fragment(name, vary_on, html):
+    if len(html.encode()) <= settings.FRAGMENT_CACHE_MAX_BYTES:
+        fragment_cache().set(fragment_key(name, vary_on), html, settings.FRAGMENT_CACHE_TIMEOUT)
+    return html
+
+
+def _version_key(category):
+    return 'fragment-category-version:' + hashlib.md5(str(category).encode(), usedforsecurity=False).hexdigest()
+
+
+def _version_timeout(cache):
+    return settings.FRAGMENT_VERSION_LOCAL_TTL if isinstance(cache, LocMemCache) else None
+
+
+def category_versions(categories):
+    """{category: version} for the given categories, starting unknown ones afresh"""
+    cache = fragment_cache()
+    keys = {_version_key(category): category for category in categories}
+    found = cache.get_many(keys)
+    missing = {key: time.time_ns() for key in keys if key not in found}
+    if missing:
+        cache.set_many(missing, _version_timeout(cache))
+        found.update(missing)
+    return {keys[key]: version for key, version in found.items()}
+
+
+def bump_categories(*categories):
+    """Invalidate every category-level fragment for these categories"""
+    cache = fragment_cache()
+    for category in set(categories):
+        key = _version_key(category)
+        try:
+            cache.incr(key)
+        except ValueError:
+            cache.set(key, time.time_ns(), _version_timeout(cache))
+
+
+def invalidate_categories(*categories):
+    """Bump category versions once the current transaction commits.
+
+    Waiting for the commit means no reader can cache pre-commit rows under
+    the new version. Code that changes items with queryset.update() must
+    call this, since no model signals are sent.
+    """
+    transaction.on_commit(lambda: bump_categories(*categories))
+
+
+@receiver(pre_save, sender='inventory.Item')
+def _remember_old_category(sender, instance, update_fields=None, **kwargs):
+    if instance.pk is None or (update_fields is not None and 'category' not in update_fields):
+        instance._old_category = None
+        return
+    instance._old_category = sender.objects.filter(pk=instance.pk).values_list('category', flat=True).first()
+
+
+@receiver(post_save, sender='inventory.Item')
+def _item_saved(sender, instance, **kwargs):
+    categories = [instance.category_id]
+    if getattr(instance, '_old_category', None):
+        categories.append(instance._old_category)
+    invalidate_categories(*categories)
+
+
+@receiver(post_delete, sender='inventory.Item')
+def _item_deleted(sender, instance, **kwargs):
+    invalidate_categories(instance.category_id)
@@ -0,0 +1,146 @@
+"""
+Idempotency keys for the stock mutation API.
+
+A client sends an ``Idempotency-Key`` header with a POST. The first request
+with a given key runs normally and its response is stored in the same
+database transaction as the stock change; any retry with the same key gets
+the stored response back without running the view again. Server errors,
+raised or returned, are not stored, so a retry after one runs afresh.
+"""
+
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, JsonResponse
+from django.utils import timezone
+
+from .models import IdempotencyKey
+
+HEADER = 'Idempotency-Key'
+REPLAY_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+
+
+class IdempotencyConflict(Exception):
+    """Raised when a key is reused for a different request body"""
+
+
+class _LostRace(Exception):
+    """A concurrent request with the same key committed first"""
+
+
+def request_fingerprint(request):
+    return hashlib.sha256(request.body).hexdigest()
+
+
+def key_from_request(request):
+    """Return the client's idempotency key, or None if it did not send one"""
+    key = request.headers.get(HEADER, '').strip()
+    if not key:
+        return None
+    if len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f'{HEADER} must be at most {MAX_KEY_LENGTH} characters')
+    return key
+
+
+def conflict_response():
+    return JsonResponse({
+        'success': False,
+        'error': f'{HEADER} was already used with a different request body'
+    }, status=422)
+
+
+def _replay(stored):
+    response = HttpResponse(
+        stored.response_body,
+        status=stored.status_code,
+        content_type='application/json'
+    )
+    response[REPLAY_HEADER] = 'true'
+    return response
+
+
+def _lookup(key, scope, fingerprint):
+    stored = IdempotencyKey.objects.filter(key=key, scope=scope).first()
+    if stored is None:
+        return None
+    if stored.created_at < timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL):
+        stored.delete()
+        return None
+    if stored.request_hash != fingerprint:
+        raise IdempotencyConflict(key)
+    return stored
+
+
+_stored_since_purge = 0
+
+
+def _note_stored_key():
+    """Purge the store every IDEMPOTENCY_PURGE_EVERY new keys in this process"""
+    global _stored_since_purge
+    _stored_since_purge += 1
+    if _stored_since_purge >= settings.IDEMPOTENCY_PURGE_EVERY:
+        _stored_since_purge = 0
+        purge_expired_keys()
+
+
+def purge_expired_keys():
+    """Drop expired keys and trim the store to IDEMPOTENCY_MAX_KEYS rows"""
+    cutoff = timezone.now() - timedelta(seconds=settings.IDEMPOTENCY_KEY_TTL)
+    deleted, _ = IdempotencyKey.objects.filter(created_at__lt=cutoff).delete()
+    overflow = IdempotencyKey.objects.order_by('-created_at').values_list('created_at', flat=True)[
+        settings.IDEMPOTENCY_MAX_KEYS:settings.IDEMPOTENCY_MAX_KEYS + 1
+    ]
+    if overflow:
+        trimmed, _ = IdempotencyKey.objects.filter(created_at__lte=overflow[0]).delete()
+        deleted += trimmed
+    return deleted
+
+
+def idempotent(view):
+    """Make a POST view safe to retry when the client sends an Idempotency-Key"""
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        if request.method != 'POST':
+            return view(request, *args, **kwargs)
+        try:
+            key = key_from_request(request)
+        except ValueError as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        if key is None:
+            return view(request, *args, **kwargs)
+
+        scope = request.path
+        fingerprint = request_fingerprint(request)
+        try:
+            stored = _lookup(key, scope, fingerprint)
+            if stored:
+                return _replay(stored)
+
+            try:
+                with transaction.atomic():
+                    response = view(request, *args, **kwargs)
+                    if response.status_code < 500:
+                        try:
+                            with transaction.atomic():
+                                IdempotencyKey.objects.create(
+                                    key=key,
+                                    scope=scope,
+                                    request_hash=fingerprint,
+                                    status_code=response.status_code,
+                                    response_body=response.content.decode(response.charset),
+                                )
+                        except IntegrityError:
+                            # Undo this request's changes; the winner's result stands
+                            raise _LostRace
+            except _LostRace:
+                return _replay(_lookup(key, scope, fingerprint))
+        except IdempotencyConflict:
+            return conflict_response()
+
+        _note_stored_key()
+        return response
+    return wrapper
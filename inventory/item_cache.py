@@ -0,0 +1,95 @@
+"""
+Read-through cache for single items looked up by primary key.
+
+Items live in the ``items`` cache alias, a TieredCache: a per-process LRU
+in front of a shared cache, with invalidations broadcast to other workers.
+Only a miss in both tiers reaches the database. Each item is cached under a
+key carrying its generation, like the category versions of the fragment
+cache. Saving or deleting an item starts a new generation straight away and
+again once the transaction commits. A reader that loaded the old row before
+that can still fill its cache entry, but no one looks under that key again.
+Fills use add(), which TieredCache does not broadcast. Code that changes
+item rows with queryset.update() must call invalidate() itself.
+"""
+
+import time
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.http import Http404
+
+CACHE_ALIAS = 'items'
+
+
+def item_cache():
+    return caches[CACHE_ALIAS]
+
+
+def item_key(pk, generation):
+    return f'item:{pk}:{generation}'
+
+
+def _generation_key(pk):
+    return f'item-generation:{pk}'
+
+
+def _generation(pk):
+    cache = item_cache()
+    key = _generation_key(pk)
+    generation = cache.get(key)
+    if generation is None:
+        generation = time.time_ns()
+        # Lost to a concurrent start or invalidation: use theirs
+        if not cache.add(key, generation, settings.ITEM_CACHE_TIMEOUT):
+            generation = cache.get(key, generation)
+    return generation
+
+
+def _items():
+    # Category and supplier names travel with the cached item
+    return apps.get_model('inventory', 'Item').objects.select_related('category', 'supplier')
+
+
+def get_item(pk):
+    """The item with this pk; raises Item.DoesNotExist like Item.objects.get()"""
+    key = item_key(pk, _generation(pk))
+    item = item_cache().get(key)
+    if item is None:
+        item = _items().get(pk=pk)
+        item_cache().add(key, item, settings.ITEM_CACHE_TIMEOUT)
+    return item
+
+
+def get_item_or_404(pk, fresh=False):
+    """Cached item for views; `fresh` reads the database row instead"""
+    Item = apps.get_model('inventory', 'Item')
+    try:
+        return _items().get(pk=pk) if fresh else get_item(pk)
+    except (Item.DoesNotExist, ValueError):
+        raise Http404('No Item matches the given query.')
+
+
+def _drop(pks):
+    # One write, and one broadcast, for every item
+    generation = time.time_ns()
+    item_cache().set_many({_generation_key(pk): generation for pk in pks}, settings.ITEM_CACHE_TIMEOUT)
+
+
+def invalidate(*pks):
+    """Forget these items now and again once the current transaction commits"""
+    _drop(pks)
+    transaction.on_commit(lambda: _drop(pks))
+
+
+def clear():
+    item_cache().clear()
+
+
+@receiver(post_save, sender='inventory.Item')
+@receiver(post_delete, sender='inventory.Item')
+def _item_changed(sender, instance, **kwargs):
+    invalidate(instance.pk)
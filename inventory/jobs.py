@@ -0,0 +1,201 @@
+"""
+Database-backed job queue for work too slow to run inside a request.
+
+Views enqueue jobs and hand back a status URL; `manage.py run_jobs` workers
+claim them, highest priority first. A claim is a conditional UPDATE from
+QUEUED to RUNNING, so two workers can never take the same job, and a
+dedupe key keeps a second copy of the same work from being queued while one
+is pending or running. While a job runs, a heartbeat thread records its
+progress and keeps the claim alive. Jobs whose heartbeat stops for
+JOB_LEASE_SECONDS (a killed worker) go back to the queue. Failed attempts
+are retried with exponential backoff until max_attempts is reached.
+
+Tasks are plain functions registered with @task('name') that take a
+Progress as their first argument and the job payload as keyword arguments.
+Whatever they return must be JSON serialisable and is stored as the result.
+"""
+
+import logging
+import os
+import socket
+import threading
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .models import Job
+
+logger = logging.getLogger(__name__)
+
+tasks = {}
+
+
+def task(name):
+    """Register a function as the task run for jobs called `name`"""
+    def register(func):
+        tasks[name] = func
+        return func
+    return register
+
+
+def enqueue(name, payload=None, priority=0, max_attempts=3, dedupe_key='', delay=0):
+    """Queue a job to run `delay` seconds from now, or return the active job already holding `dedupe_key`"""
+    if name not in tasks:
+        raise ValueError(f'Unknown job {name!r}')
+    try:
+        with transaction.atomic():
+            return Job.objects.create(
+                name=name, payload=payload or {}, priority=priority,
+                max_attempts=max_attempts, dedupe_key=dedupe_key,
+                run_after=timezone.now() + timedelta(seconds=delay),
+            )
+    except IntegrityError:
+        existing = Job.objects.filter(dedupe_key=dedupe_key, status__in=Job.ACTIVE).first()
+        if existing is None:
+            raise
+        return existing
+
+
+def worker_name():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+
+def claim(worker, jobs=None):
+    """Take the most urgent runnable job for `worker`, or return None.
+    
+    `jobs` optionally narrows the candidates to a queryset of jobs.
+    """
+    now = timezone.now()
+    queued = (jobs if jobs is not None else Job.objects.all()).filter(status=Job.QUEUED, run_after__lte=now)
+    candidates = queued.order_by('-priority', 'run_after', 'pk').values_list('pk', flat=True)[:10]
+    for pk in candidates:
+        claimed = Job.objects.filter(pk=pk, status=Job.QUEUED).update(
+            status=Job.RUNNING, locked_by=worker, heartbeat_at=now,
+            started_at=now, attempts=F('attempts') + 1,
+        )
+        if claimed:
+            return Job.objects.get(pk=pk)
+    return None
+
+
+def requeue_stale():
+    """Release jobs whose worker stopped heart-beating; returns how many"""
+    expired = timezone.now() - timedelta(seconds=settings.JOB_LEASE_SECONDS)
+    stale = Job.objects.filter(status=Job.RUNNING, heartbeat_at__lt=expired)
+    failed = stale.filter(attempts__gte=F('max_attempts')).update(
+        status=Job.FAILED, error='Worker lease expired', finished_at=timezone.now(),
+    )
+    retried = stale.update(status=Job.QUEUED, locked_by='', error='Worker lease expired')
+    return failed + retried
+
+
+class Progress:
+    """Handed to tasks so they can report how far along they are"""
+
+    def __init__(self, job):
+        self.job = job
+        self.current = job.progress_current
+        self.total = job.progress_total
+        self.message = job.progress_message
+        self._lock = threading.Lock()
+
+    def report(self, current, total=None, message=None):
+        with self._lock:
+            self.current = current
+            if total is not None:
+                self.total = total
+            if message is not None:
+                self.message = message[:200]
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'progress_current': self.current,
+                'progress_total': self.total,
+                'progress_message': self.message,
+            }
+
+
+class Heartbeat(threading.Thread):
+    """Writes progress and renews the claim from its own DB connection.
+
+    The task may hold a long transaction on the worker's connection, which
+    would hide progress written through it until the task finished.
+    """
+
+    def __init__(self, job, progress):
+        super().__init__(name=f'job-{job.pk}-heartbeat', daemon=True)
+        self.job = job
+        self.progress = progress
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(settings.JOB_HEARTBEAT_SECONDS):
+                try:
+                    Job.objects.filter(pk=self.job.pk, locked_by=self.job.locked_by).update(
+                        heartbeat_at=timezone.now(), **self.progress.snapshot()
+                    )
+                except OperationalError as e:
+                    # SQLite refuses writers while the task holds its lock; try again next beat
+                    logger.debug('Heartbeat for job %s skipped: %s', self.job.pk, e)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def run(job):
+    """Run a claimed job and record its outcome; returns the updated job"""
+    progress = Progress(job)
+    heartbeat = Heartbeat(job, progress)
+    heartbeat.start()
+    ours = Job.objects.filter(pk=job.pk, status=Job.RUNNING, locked_by=job.locked_by)
+    try:
+        func = tasks.get(job.name)
+        if func is None:
+            job.attempts = job.max_attempts
+            raise LookupError(f'No task registered for job {job.name!r}')
+        result = func(progress, **job.payload)
+    except Exception:
+        heartbeat.stop()
+        error = traceback.format_exc()
+        logger.warning('Job %s (%s) attempt %s failed', job.pk, job.name, job.attempts, exc_info=True)
+        if job.attempts < job.max_attempts:
+            delay = settings.JOB_RETRY_BACKOFF * 2 ** (job.attempts - 1)
+            ours.update(
+                status=Job.QUEUED, locked_by='', error=error,
+                run_after=timezone.now() + timedelta(seconds=delay), **progress.snapshot()
+            )
+        else:
+            ours.update(status=Job.FAILED, error=error, finished_at=timezone.now(), **progress.snapshot())
+    else:
+        heartbeat.stop()
+        ours.update(status=Job.SUCCEEDED, result=result, finished_at=timezone.now(), **progress.snapshot())
+    job.refresh_from_db()
+    return job
+
+
+def work(worker=None, burst=False, stop=None, poll_interval=None):
+    """Claim and run jobs until `stop` is set, or until the queue is empty with `burst`"""
+    worker = worker or worker_name()
+    stop = stop or threading.Event()
+    poll_interval = settings.JOB_POLL_INTERVAL if poll_interval is None else poll_interval
+    processed = 0
+    while not stop.is_set():
+        requeue_stale()
+        job = claim(worker)
+        if job is None:
+            if burst:
+                break
+            stop.wait(poll_interval)
+            continue
+        run(job)
+        processed += 1
+    return processed
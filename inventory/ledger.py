@@ -0,0 +1,197 @@
+"""
+Ledger partitions and archival of old stock movements.
+
+On PostgreSQL the InventoryTransaction table is partitioned by month on
+timestamp (migration 0013). Each partition is named after its month, e.g.
+``inventory_inventorytransaction_p202607``, and a default partition catches
+rows outside every month created so far. ensure_partitions() creates the
+current month and LEDGER_PARTITION_MONTHS_AHEAD months after it, moving any
+rows the default partition already holds for them. Date range queries and
+admin drill-downs then only read the partitions they cover.
+
+archive() rolls movements older than LEDGER_RETENTION_DAYS into daily
+TransactionRollup rows, one per item, UTC day and movement type, and
+removes them from the ledger: a whole month past the window is rolled up
+and detached (and dropped unless kept), anything else is rolled up and
+deleted a day at a time. On SQLite the table is not partitioned and only
+that second path runs. Each month or day is one transaction, so an
+interrupted run loses nothing and the next one carries on.
+
+Rollups keep the signed net change, so stock_at() still answers for any
+time in the past: current stock minus the net change since, read from the
+raw rows and the rollups after it. Inside the archived range the answer is
+the stock at the end of that day. Adjustments recorded before the signed
+change was kept have none and count as no change. The retention window can
+not be shorter than the history the dashboard trends and the days-of-cover
+rules read from raw rows.
+"""
+
+import re
+from datetime import datetime, time, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import Count, Sum
+from django.db.models.functions import Coalesce, TruncDate
+from django.utils import timezone
+
+from .models import InventoryTransaction, TransactionRollup
+
+TABLE = InventoryTransaction._meta.db_table
+DEFAULT_PARTITION = f'{TABLE}_default'
+PARTITION_NAME = re.compile(rf'^{TABLE}_p(\d{{4}})(\d{{2}})$')
+
+# The dashboard's monthly trend counts six months of raw movements
+MIN_RETENTION_DAYS = 180
+
+
+def minimum_retention_days():
+    return max(MIN_RETENTION_DAYS, settings.ALERT_USAGE_WINDOW_DAYS)
+
+
+def is_partitioned():
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT EXISTS (SELECT 1 FROM pg_partitioned_table WHERE partrelid = to_regclass(%s))', [TABLE])
+        return cursor.fetchone()[0]
+
+
+def month_start(moment):
+    return datetime(moment.year, moment.month, 1, tzinfo=dt_timezone.utc)
+
+
+def next_month(start):
+    return datetime(start.year + start.month // 12, start.month % 12 + 1, 1, tzinfo=dt_timezone.utc)
+
+
+def partition_name(start):
+    return f'{TABLE}_p{start:%Y%m}'
+
+
+def partitions():
+    """Monthly partitions attached to the ledger, as (name, start, end) oldest first"""
+    if not is_partitioned():
+        return []
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT child.relname FROM pg_inherits '
+            'JOIN pg_class child ON child.oid = pg_inherits.inhrelid '
+            'WHERE pg_inherits.inhparent = to_regclass(%s)',
+            [TABLE],
+        )
+        names = [row[0] for row in cursor.fetchall()]
+    months = []
+    for name in names:
+        match = PARTITION_NAME.match(name)
+        if match:
+            start = datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=dt_timezone.utc)
+            months.append((name, start, next_month(start)))
+    return sorted(months, key=lambda month: month[1])
+
+
+def _literal(moment):
+    # Partition bounds are DDL, which takes no parameters
+    return f"'{moment.isoformat()}'"
+
+
+def ensure_partitions(months_ahead=None):
+    """Create the partitions for this month and the next `months_ahead`; returns the names created"""
+    if not is_partitioned():
+        return []
+    months_ahead = settings.LEDGER_PARTITION_MONTHS_AHEAD if months_ahead is None else months_ahead
+    existing = {name for name, _, _ in partitions()}
+    start = month_start(timezone.now())
+    created = []
+    for _ in range(months_ahead + 1):
+        end = next_month(start)
+        name = partition_name(start)
+        if name not in existing:
+            with transaction.atomic(), connection.cursor() as cursor:
+                cursor.execute(f'CREATE TABLE {name} (LIKE {TABLE} INCLUDING DEFAULTS)')
+                # Rows the default partition holds for this month move with it, or ATTACH would fail
+                cursor.execute(
+                    f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} '
+                    f'WHERE "timestamp" >= %s AND "timestamp" < %s RETURNING *) '
+                    f'INSERT INTO {name} SELECT * FROM moved',
+                    [start, end],
+                )
+                cursor.execute(
+                    f'ALTER TABLE {TABLE} ATTACH PARTITION {name} '
+                    f'FOR VALUES FROM ({_literal(start)}) TO ({_literal(end)})'
+                )
+            created.append(name)
+        start = end
+    return created
+
+
+def _roll_up(start, end):
+    """Add the movements in [start, end) to the daily rollups; returns how many rows were rolled up"""
+    movements = InventoryTransaction.objects.filter(timestamp__gte=start, timestamp__lt=end)
+    rows = movements.order_by().annotate(
+        day=TruncDate('timestamp', tzinfo=dt_timezone.utc),
+    ).values('item_id', 'day', 'transaction_type').annotate(
+        rolled_movements=Count('pk'),
+        rolled_quantity=Sum('quantity'),
+        rolled_change=Sum(Coalesce('quantity_change', 0)),
+    )
+    select, params = rows.query.sql_with_params()
+    rollups = TransactionRollup._meta.db_table
+    with connection.cursor() as cursor:
+        # WHERE true keeps SQLite from reading ON CONFLICT as a join constraint
+        cursor.execute(
+            f'INSERT INTO {rollups} (item_id, day, transaction_type, movements, quantity, quantity_change) '
+            f'SELECT rolled.item_id, rolled.day, rolled.transaction_type, rolled.rolled_movements, '
+            f'rolled.rolled_quantity, rolled.rolled_change FROM ({select}) rolled WHERE true '
+            f'ON CONFLICT (item_id, day, transaction_type) DO UPDATE SET '
+            f'movements = {rollups}.movements + excluded.movements, '
+            f'quantity = {rollups}.quantity + excluded.quantity, '
+            f'quantity_change = {rollups}.quantity_change + excluded.quantity_change',
+            params,
+        )
+    return movements.count()
+
+
+def archive(retention_days=None, keep_detached=False):
+    """Roll movements past the retention window into daily rollups and remove them.
+
+    Returns {'rows': movements archived, 'partitions': partitions detached}.
+    Detached partitions are dropped unless `keep_detached` is set.
+    """
+    retention_days = settings.LEDGER_RETENTION_DAYS if retention_days is None else retention_days
+    if retention_days < minimum_retention_days():
+        raise ValueError(f'Ledger retention must be at least {minimum_retention_days()} days')
+    cutoff = datetime.combine(
+        (timezone.now() - timedelta(days=retention_days)).astimezone(dt_timezone.utc).date(),
+        time.min, tzinfo=dt_timezone.utc,
+    )
+    archived = {'rows': 0, 'partitions': []}
+
+    for name, start, end in partitions():
+        if end > cutoff:
+            break
+        with transaction.atomic(), connection.cursor() as cursor:
+            archived['rows'] += _roll_up(start, end)
+            cursor.execute(f'ALTER TABLE {TABLE} DETACH PARTITION {name}')
+            if not keep_detached:
+                cursor.execute(f'DROP TABLE {name}')
+        archived['partitions'].append(name)
+
+    # Whatever is left: the default partition on PostgreSQL, everything on SQLite
+    days = InventoryTransaction.objects.filter(timestamp__lt=cutoff).datetimes('timestamp', 'day', tzinfo=dt_timezone.utc)
+    for start in days:
+        end = start + timedelta(days=1)
+        with transaction.atomic():
+            archived['rows'] += _roll_up(start, end)
+            InventoryTransaction.objects.filter(timestamp__gte=start, timestamp__lt=end).delete()
+    return archived
+
+
+def stock_at(item, moment):
+    """Stock `item` held at `moment`; at the end of that UTC day if its movements were archived"""
+    later = item.transactions.filter(timestamp__gt=moment).aggregate(
+        total=Sum(Coalesce('quantity_change', 0)))['total'] or 0
+    day = moment.astimezone(dt_timezone.utc).date()
+    rolled_later = item.transaction_rollups.filter(day__gt=day).aggregate(
+        total=Sum('quantity_change'))['total'] or 0
+    return item.available_quantity - later - rolled_later
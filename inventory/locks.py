@@ -0,0 +1,103 @@
+"""
+Named leases in the database, so a task runs on at most one node at a time.
+
+A lease is a row with a unique name and an expiry. Taking it is an INSERT,
+or a takeover UPDATE once the previous holder's lease has expired. While
+the `lease()` block runs, a keeper thread renews it from its own connection.
+If a renewal finds the lease gone to someone else, `lost` is set on the
+handle so long-running work can stop.
+"""
+
+import logging
+import os
+import socket
+import threading
+import uuid
+from contextlib import contextmanager
+from datetime import timedelta
+
+from django.db import IntegrityError, OperationalError, connection, transaction
+from django.utils import timezone
+
+from .models import Lease
+
+logger = logging.getLogger(__name__)
+
+
+class LockHeld(Exception):
+    """Raised when another process holds the lease"""
+
+
+def holder_name():
+    return f'{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}'
+
+
+def acquire(name, holder, ttl):
+    """Take the lease for `ttl` seconds; returns False if someone else holds it"""
+    now = timezone.now()
+    expires_at = now + timedelta(seconds=ttl)
+    try:
+        with transaction.atomic():
+            Lease.objects.create(name=name, holder=holder, acquired_at=now, expires_at=expires_at)
+        return True
+    except IntegrityError:
+        # Take over a lease whose holder stopped renewing it
+        return bool(Lease.objects.filter(name=name, expires_at__lt=now).update(
+            holder=holder, acquired_at=now, expires_at=expires_at,
+        ))
+
+
+def renew(name, holder, ttl):
+    """Extend our lease; returns False if it is no longer ours"""
+    return bool(Lease.objects.filter(name=name, holder=holder).update(
+        expires_at=timezone.now() + timedelta(seconds=ttl),
+    ))
+
+
+def release(name, holder):
+    Lease.objects.filter(name=name, holder=holder).delete()
+
+
+class LeaseKeeper(threading.Thread):
+    """Renews a lease every third of its ttl until stopped"""
+
+    def __init__(self, name, holder, ttl):
+        super().__init__(name=f'lease-{name}', daemon=True)
+        self.lease_name = name
+        self.holder = holder
+        self.ttl = ttl
+        self.lost = False
+        self.stopped = threading.Event()
+
+    def run(self):
+        try:
+            while not self.stopped.wait(self.ttl / 3):
+                try:
+                    if not renew(self.lease_name, self.holder, self.ttl):
+                        logger.error('Lease %s was taken over from %s', self.lease_name, self.holder)
+                        self.lost = True
+                        return
+                except OperationalError as e:
+                    logger.warning('Could not renew lease %s: %s', self.lease_name, e)
+        finally:
+            connection.close()
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+@contextmanager
+def lease(name, ttl=60, holder=None):
+    """Hold the named lease for the duration of the block, or raise LockHeld"""
+    holder = holder or holder_name()
+    if not acquire(name, holder, ttl):
+        current = Lease.objects.filter(name=name).values_list('holder', flat=True).first()
+        raise LockHeld(f'{name} is held by {current or "another process"}')
+    keeper = LeaseKeeper(name, holder, ttl)
+    keeper.start()
+    try:
+        yield keeper
+    finally:
+        keeper.stop()
+        release(name, holder)
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import ledger, locks
+
+ARCHIVE_LEASE = 'ledger-archive'
+
+
+class Command(BaseCommand):
+    help = (
+        'Create upcoming ledger partitions, then roll stock movements older than the retention window '
+        'into daily per-item totals and remove them (detaching whole monthly partitions on PostgreSQL). '
+        'Holds a database lease so only one archive runs across all nodes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='Days of movements to keep (default LEDGER_RETENTION_DAYS)')
+        parser.add_argument('--keep-detached', action='store_true',
+                            help='Leave detached partitions in place as standalone tables instead of dropping them')
+        parser.add_argument('--lock-ttl', type=int, default=300,
+                            help='Seconds the archive lease lasts without renewal')
+
+    def handle(self, *args, **options):
+        try:
+            with locks.lease(ARCHIVE_LEASE, ttl=options['lock_ttl']):
+                created = ledger.ensure_partitions()
+                archived = ledger.archive(options['retention_days'], keep_detached=options['keep_detached'])
+        except locks.LockHeld as e:
+            raise CommandError(f'Another ledger archive is running: {e}')
+        except ValueError as e:
+            raise CommandError(str(e))
+        for name in created:
+            self.stdout.write(f'Created partition {name}')
+        for name in archived['partitions']:
+            self.stdout.write(f'{"Detached" if options["keep_detached"] else "Dropped"} partition {name}')
+        self.stdout.write(self.style.SUCCESS(f'{archived["rows"]:,} movements rolled up into daily totals'))
@@ -0,0 +1,101 @@
+import gzip
+import json
+import time
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.core.serializers.json import DjangoJSONEncoder
+from django.http import QueryDict
+from django.test import Client
+from django.urls import reverse
+
+from inventory import bulk_api
+from inventory.models import InventoryTransaction, Item
+
+DATA_PREFIX = 'BULKBENCH'
+
+
+class Command(BaseCommand):
+    help = 'Measure rows/sec served by the bulk read API, against model instances and the stdlib encoder'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Items to generate')
+        parser.add_argument('--transactions', type=int, default=200000, help='Transactions to generate')
+        parser.add_argument('--page-size', type=int, default=5000, help='Rows per page')
+        parser.add_argument('--keep-data', action='store_true', help='Leave the generated data in place')
+
+    def handle(self, *args, **options):
+        call_command('generate_inventory_data', items=options['rows'], transactions=options['transactions'],
+                     prefix=DATA_PREFIX, clear=True, stdout=self.stdout)
+        page_size = options['page_size']
+        self.stdout.write(f'{"resource":<14}{"mode":<16}{"rows":>10}{"seconds":>9}{"rows/s":>11}{"MiB":>8}')
+        try:
+            for resource in ('items', 'transactions'):
+                self.report(resource, 'models+json', *self.models(resource, page_size))
+                with mock.patch.object(bulk_api, 'orjson', None):
+                    self.report(resource, 'tuples+json', *self.tuples(resource, page_size))
+                if bulk_api.orjson is not None:
+                    self.report(resource, 'tuples+orjson', *self.tuples(resource, page_size))
+                self.report(resource, 'http', *self.served(resource, page_size))
+        finally:
+            if not options['keep_data']:
+                generated = Item.objects.filter(name__startswith=f'{DATA_PREFIX}-')
+                InventoryTransaction.objects.filter(item__in=generated).delete()
+                generated.delete()
+
+    def report(self, resource, mode, rows, seconds, size):
+        self.stdout.write(f'{resource:<14}{mode:<16}{rows:>10,}{seconds:>9.2f}{rows / seconds:>11,.0f}'
+                          f'{size / 2 ** 20:>8.1f}')
+
+    def models(self, resource, page_size):
+        """Baseline: model instances turned into dicts and encoded with the json module"""
+        spec = bulk_api.RESOURCES[resource]
+        names = [name for name in spec['default_fields'] if isinstance(spec['fields'][name], str)]
+        attributes = [spec['fields'][name].replace('pk', 'id') for name in names]
+        rows = size = after = 0
+        started = time.perf_counter()
+        while True:
+            page = list(spec['model'].objects.filter(pk__gt=after).order_by('pk')[:page_size])
+            body = json.dumps({'results': [
+                {name: getattr(obj, attribute) for name, attribute in zip(names, attributes)} for obj in page
+            ]}, cls=DjangoJSONEncoder)
+            rows += len(page)
+            size += len(body)
+            if len(page) < page_size:
+                return rows, time.perf_counter() - started, size
+            after = page[-1].pk
+
+    def tuples(self, resource, page_size):
+        rows = size = 0
+        params = QueryDict(mutable=True)
+        params['limit'] = page_size
+        started = time.perf_counter()
+        while True:
+            page = bulk_api.read(resource, params)
+            size += len(bulk_api.dumps(page))
+            rows += page['count']
+            if page['next_after'] is None:
+                return rows, time.perf_counter() - started, size
+            params['after'] = page['next_after']
+
+    def served(self, resource, page_size):
+        """End to end through the URL, middleware and gzip, following `next` links"""
+        user, _ = User.objects.get_or_create(username=f'{DATA_PREFIX.lower()}-reader')
+        client = Client(HTTP_ACCEPT_ENCODING='gzip')
+        client.force_login(user)
+        url = f'{reverse(f"inventory:api_{resource}")}?limit={page_size}'
+        rows = size = 0
+        started = time.perf_counter()
+        try:
+            while url:
+                response = client.get(url)
+                size += len(response.content)
+                body = response.content
+                page = json.loads(gzip.decompress(body) if response.get('Content-Encoding') == 'gzip' else body)
+                rows += page['count']
+                url = page['next']
+            return rows, time.perf_counter() - started, size
+        finally:
+            user.delete()
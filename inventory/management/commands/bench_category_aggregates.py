@@ -0,0 +1,106 @@
+import statistics
+import time
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.db.models import Avg, Count, F, Sum
+from django.test import Client
+from django.urls import reverse
+
+from inventory.models import Category, InventoryTransaction, Item, Supplier
+from inventory.views import _category_totals
+
+DATA_PREFIX = 'CATBENCH'
+VARCHAR_TABLE = 'bench_varchar_items'
+
+BREAKDOWNS = {
+    'dashboard': (('-total_value',), {'count': Count('id'), 'total_value': Sum(F('quantity') * F('price'))}),
+    'category_summary': ((), {
+        'item_count': Count('id'), 'total_quantity': Sum('quantity'),
+        'total_value': Sum(F('quantity') * F('price')), 'avg_price': Avg('price'),
+    }),
+}
+
+PAGES = {
+    'dashboard': ('inventory:analytics', ()),
+    'category_summary': ('inventory:reports_filtered', ('category_summary',)),
+}
+
+
+class Command(BaseCommand):
+    help = (
+        'Time the dashboard and report category breakdowns grouped on the integer category key '
+        'against the same SQL grouped on a varchar column, as item.category used to be'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=200000, help='Items to generate')
+        parser.add_argument('--suppliers', type=int, default=2000, help='Size of the supplier pool')
+        parser.add_argument('--repeat', type=int, default=7, help='Runs per measurement; the median is reported')
+        parser.add_argument('--keep-data', action='store_true', help='Leave the generated data in place')
+
+    def handle(self, *args, **options):
+        # Only categories and suppliers added for the benchmark are removed afterwards
+        existing = {model: set(model.objects.values_list('pk', flat=True)) for model in (Category, Supplier)}
+        call_command('generate_inventory_data', items=options['items'], transactions=0,
+                     suppliers=options['suppliers'], prefix=DATA_PREFIX, clear=True, stdout=self.stdout)
+        self.build_varchar_table()
+        repeat = options['repeat']
+        self.stdout.write(f'{"breakdown":<18}{"grouped on":<16}{"median ms":>10}{"best ms":>10}')
+        try:
+            for name, (ordering, aggregates) in BREAKDOWNS.items():
+                totals = Item.objects.values('category').annotate(**aggregates).order_by(*ordering)
+                sql, params = totals.query.sql_with_params()
+                varchar_sql = sql.replace(f'"{Item._meta.db_table}"', VARCHAR_TABLE).replace('"category_id"', '"category"')
+                self.report(name, 'varchar', self.measure(lambda: self.run_sql(varchar_sql, params), repeat))
+                self.report(name, 'integer key', self.measure(lambda: self.run_sql(sql, params), repeat))
+                self.report(name, '+ names', self.measure(lambda: _category_totals(*ordering, **aggregates), repeat))
+                self.report(name, 'page (http)', self.measure(self.page_getter(*PAGES[name]), repeat))
+        finally:
+            with connection.cursor() as cursor:
+                cursor.execute(f'DROP TABLE IF EXISTS {VARCHAR_TABLE}')
+            if not options['keep_data']:
+                generated = Item.objects.filter(name__startswith=f'{DATA_PREFIX}-')
+                InventoryTransaction.objects.filter(item__in=generated).delete()
+                generated.delete()
+                for model, pks in existing.items():
+                    model.objects.exclude(pk__in=pks).filter(items__isnull=True).delete()
+            User.objects.filter(username=f'{DATA_PREFIX.lower()}-reader').delete()
+
+    def build_varchar_table(self):
+        """Copy of the item table with the category name inlined, as the column used to be"""
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP TABLE IF EXISTS {VARCHAR_TABLE}')
+            cursor.execute(
+                f'CREATE TABLE {VARCHAR_TABLE} AS '
+                f'SELECT item.*, category.name AS category '
+                f'FROM {Item._meta.db_table} item '
+                f'JOIN {Category._meta.db_table} category ON category.id = item.category_id'
+            )
+
+    def run_sql(self, sql, params):
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def page_getter(self, url_name, args):
+        user, _ = User.objects.get_or_create(username=f'{DATA_PREFIX.lower()}-reader')
+        client = Client()
+        client.force_login(user)
+        url = reverse(url_name, args=args)
+        return lambda: client.get(url)
+
+    def measure(self, func, repeat):
+        func()  # warm the page cache and the plan
+        timings = []
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            timings.append((time.perf_counter() - started) * 1000)
+        return statistics.median(timings), min(timings)
+
+    def report(self, name, mode, timings):
+        median, best = timings
+        self.stdout.write(f'{name:<18}{mode:<16}{median:>10.1f}{best:>10.1f}')
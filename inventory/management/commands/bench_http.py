@@ -0,0 +1,315 @@
+import http.client
+import json
+import os
+import secrets
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import count
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db.models import F, Max
+from django.test import Client
+from django.urls import reverse
+
+from inventory import jobs
+from inventory.models import ChangeEvent, Item, InventoryAlert, InventoryTransaction, Job
+from inventory.scan_buffer import get_journal
+
+DATA_PREFIX = 'HTTPBENCH'
+DEFAULT_BASELINE = Path(settings.BASE_DIR) / 'benchmarks' / 'http_baseline.json'
+
+# One scenario per URL name in inventory/urls.py. 'share' scales the request
+# count for views that are too slow to hit hundreds of times on big datasets.
+SCENARIOS = {
+    'home': {},
+    'item_detail': {'kwargs': lambda ctx, n: {'pk': ctx['hot_item']}},
+    'item_create': {},
+    'item_update': {'kwargs': lambda ctx, n: {'pk': ctx['hot_item']}},
+    'item_delete': {'kwargs': lambda ctx, n: {'pk': ctx['hot_item']}},
+    'update_stock': {'kwargs': lambda ctx, n: {'pk': ctx['hot_item']}},
+    'register': {'anonymous': True},
+    'analytics': {'share': 0.25},
+    'reports': {'share': 0.1},
+    'reports_filtered': {'kwargs': lambda ctx, n: {'report_type': 'low_stock'}, 'query': '?type=low_stock',
+                         'share': 0.25},
+    'manage_alerts': {'share': 0.1},
+    'resolve_alert': {'kwargs': lambda ctx, n: {'alert_id': ctx['alerts'][n % len(ctx['alerts'])]},
+                      'status': 302},
+    'api_stock_update': {
+        'method': 'POST',
+        'kwargs': lambda ctx, n: {'item_id': ctx['hot_item']},
+        # Alternate IN and OUT so the benchmark item's stock stays level
+        'body': lambda ctx, n: {'transaction_type': 'OUT' if n % 2 else 'IN', 'quantity': 1,
+                                'reason': 'HTTP benchmark'},
+    },
+    'api_scan_events': {
+        'method': 'POST',
+        'body': lambda ctx, n: {'item_id': ctx['hot_item'], 'transaction_type': 'IN', 'quantity': 1},
+        'status': 202,
+    },
+    'api_generate_alerts': {'method': 'POST', 'share': 0.02, 'status': 202},
+    'api_dashboard_data': {},
+    'api_export_report': {'method': 'POST', 'kwargs': lambda ctx, n: {'report_type': 'low_stock'},
+                          'share': 0.02, 'status': 202},
+    'api_job_status': {'kwargs': lambda ctx, n: {'job_id': ctx['export_job']}},
+    'api_sync': {'query': lambda ctx, n: f'?since={ctx["sync_cursor"]}'},
+    'api_items': {'query': '?limit=500'},
+    'api_transactions': {'query': '?limit=500'},
+    'api_alerts': {},
+    'job_download': {'kwargs': lambda ctx, n: {'job_id': ctx['export_job']}, 'share': 0.1},
+    'metrics': {},
+}
+
+
+def percentile(ordered, pct):
+    """Nearest-rank percentile of an already sorted list"""
+    if not ordered:
+        return 0.0
+    rank = max(1, -(-len(ordered) * pct // 100))
+    return ordered[int(rank) - 1]
+
+
+class Command(BaseCommand):
+    help = (
+        'Benchmark every inventory URL over HTTP against a locally started server, on generated '
+        'datasets of several sizes, and compare req/s, latency percentiles and queries per request '
+        'with stored baselines. Generates and removes its own data in the configured database.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--sizes', default='1000,10000',
+                            help='Comma-separated item counts, one dataset per size')
+        parser.add_argument('--transactions-per-item', type=int, default=20)
+        parser.add_argument('--requests', type=int, default=200, help='Measured requests per URL')
+        parser.add_argument('--warmup', type=int, default=5, help='Unmeasured requests per URL')
+        parser.add_argument('--concurrency', type=int, default=4, help='Concurrent clients')
+        parser.add_argument('--urls', default='', help='Comma-separated URL names (default: all)')
+        parser.add_argument('--server', choices=('runserver', 'gunicorn'), default='runserver')
+        parser.add_argument('--workers', type=int, default=4, help='gunicorn worker processes')
+        parser.add_argument('--port', type=int, default=0, help='Server port (default: a free one)')
+        parser.add_argument('--baseline', default=str(DEFAULT_BASELINE), help='Baseline JSON file')
+        parser.add_argument('--update-baseline', action='store_true',
+                            help='Write this run as the new baseline instead of comparing')
+        parser.add_argument('--threshold', type=float, default=0.2,
+                            help='Allowed relative regression in p95 latency and req/s')
+        parser.add_argument('--output', help='Also write the results of this run to this JSON file')
+        parser.add_argument('--keep-data', action='store_true', help='Leave the last dataset in place')
+        parser.add_argument('--force', action='store_true', help='Run even when DEBUG is off')
+
+    def handle(self, *args, **options):
+        if not settings.DEBUG and not options['force']:
+            raise CommandError('bench_http writes benchmark data to the configured database; '
+                               'use --force to run it with DEBUG off')
+        names = [n for n in options['urls'].split(',') if n] or list(SCENARIOS)
+        unknown = set(names) - set(SCENARIOS)
+        if unknown:
+            raise CommandError(f'No benchmark scenario for: {", ".join(sorted(unknown))}')
+        sizes = [int(size) for size in options['sizes'].split(',') if size]
+
+        port = options['port'] or free_port()
+        cookies = self.authenticate()
+        results = {}
+        server = self.start_server(options['server'], port, options['workers'])
+        try:
+            for size in sizes:
+                self.stdout.write(self.style.MIGRATE_HEADING(f'Dataset: {size:,} items'))
+                context = self.prepare(size, options['transactions_per_item'])
+                self.stdout.write(f'{"url":<22}{"req/s":>9}{"p50 ms":>9}{"p95 ms":>9}{"p99 ms":>9}'
+                                  f'{"queries":>9}{"errors":>8}')
+                for name in names:
+                    result = self.measure(port, cookies, name, SCENARIOS[name], context, options)
+                    results[f'{size}/{name}'] = result
+                    self.stdout.write(
+                        f'{name:<22}{result["req_per_sec"]:>9.1f}{result["p50_ms"]:>9.1f}'
+                        f'{result["p95_ms"]:>9.1f}{result["p99_ms"]:>9.1f}'
+                        f'{result["queries"]:>9}{result["errors"]:>8}'
+                    )
+        finally:
+            server.terminate()
+            server.wait(timeout=30)
+            self.drain_scan_journal()
+            if not options['keep_data']:
+                self.clear()
+
+        if options['output']:
+            write_json(options['output'], results)
+        if options['update_baseline']:
+            write_json(options['baseline'], results)
+            self.stdout.write(self.style.SUCCESS(f'Baseline written to {options["baseline"]}'))
+            return
+        self.compare(results, options['baseline'], options['threshold'])
+
+    def authenticate(self):
+        """Session and CSRF cookies for a staff user, so SQL headers are returned"""
+        user, created = User.objects.get_or_create(username='http_bench', defaults={'is_staff': True})
+        if created:
+            user.set_unusable_password()
+            user.save()
+        client = Client()
+        client.force_login(user)
+        return {
+            settings.SESSION_COOKIE_NAME: client.cookies[settings.SESSION_COOKIE_NAME].value,
+            settings.CSRF_COOKIE_NAME: secrets.token_hex(16),
+        }
+
+    def start_server(self, kind, port, workers):
+        env = dict(os.environ, DJANGO_SETTINGS_MODULE=os.environ.get(
+            'DJANGO_SETTINGS_MODULE', 'InventoryApp.settings.development'))
+        if kind == 'gunicorn':
+            command = [sys.executable, '-m', 'gunicorn', 'InventoryApp.wsgi:application',
+                       '--bind', f'127.0.0.1:{port}', '--workers', str(workers)]
+        else:
+            command = [sys.executable, 'manage.py', 'runserver', f'127.0.0.1:{port}', '--noreload']
+        server = subprocess.Popen(command, cwd=settings.BASE_DIR, env=env,
+                                  stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            if server.poll() is not None:
+                raise CommandError(f'{kind} exited with status {server.returncode}')
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise CommandError(f'{kind} did not start listening on port {port}')
+
+    def prepare(self, size, transactions_per_item):
+        call_command('generate_inventory_data', items=size, transactions=size * transactions_per_item,
+                     prefix=DATA_PREFIX, clear=True, stdout=self.stdout)
+        generated = Item.objects.filter(name__startswith=f'{DATA_PREFIX}-')
+        hot_item = generated.order_by('-quantity').values_list('pk', flat=True).first()
+        # Alerts for resolve_alert to work through, one per request
+        low = list(generated.filter(quantity__lte=F('reorder_level')).values_list('pk', flat=True)[:50])
+        InventoryAlert.objects.bulk_create([
+            InventoryAlert(item_id=pk, alert_type='LOW_STOCK', message='HTTP benchmark alert')
+            for pk in low or [hot_item]
+        ])
+        alerts = list(InventoryAlert.objects.filter(item__name__startswith=f'{DATA_PREFIX}-')
+                      .values_list('pk', flat=True))
+        # A finished export for the job status and download scenarios
+        export = jobs.enqueue('export_report', {'report_type': 'low_stock'}, dedupe_key=f'{DATA_PREFIX}-export')
+        jobs.run(jobs.claim('bench_http', Job.objects.filter(pk=export.pk)))
+        # Deltas start from here, so api_sync returns the changes the earlier scenarios made
+        sync_cursor = ChangeEvent.objects.aggregate(last=Max('pk'))['last'] or 0
+        return {'hot_item': hot_item, 'alerts': alerts, 'export_job': export.pk, 'sync_cursor': sync_cursor}
+
+    def measure(self, port, cookies, name, scenario, context, options):
+        requests = max(3, int(options['requests'] * scenario.get('share', 1.0)))
+        warmup = min(options['warmup'], requests)
+        expected = scenario.get('status', 200)
+        numbers = count()
+        lock = threading.Lock()
+        samples = []
+
+        def send(measured):
+            n = next(numbers)
+            query = scenario.get('query', '')
+            path = reverse(f'inventory:{name}', kwargs=scenario['kwargs'](context, n)
+                           if 'kwargs' in scenario else None) + (query(context, n) if callable(query) else query)
+            headers = {}
+            if not scenario.get('anonymous'):
+                headers['Cookie'] = '; '.join(f'{key}={value}' for key, value in cookies.items())
+                headers['X-CSRFToken'] = cookies[settings.CSRF_COOKIE_NAME]
+            body = None
+            if 'body' in scenario:
+                body = json.dumps(scenario['body'](context, n))
+                headers['Content-Type'] = 'application/json'
+
+            conn = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+            started = time.perf_counter()
+            try:
+                conn.request(scenario.get('method', 'GET'), path, body=body, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                elapsed = time.perf_counter() - started
+                queries = response.getheader('X-SQL-Queries')
+                sample = (elapsed, int(queries) if queries else None, response.status == expected)
+            except OSError:
+                sample = (time.perf_counter() - started, None, False)
+            finally:
+                conn.close()
+            if measured:
+                with lock:
+                    samples.append(sample)
+
+        for _ in range(warmup):
+            send(False)
+        started = time.perf_counter()
+        with ThreadPoolExecutor(options['concurrency']) as pool:
+            list(pool.map(send, [True] * requests))
+        wall = time.perf_counter() - started
+
+        latencies = sorted(sample[0] * 1000 for sample in samples)
+        queries = sorted(sample[1] for sample in samples if sample[1] is not None)
+        return {
+            'requests': requests,
+            'req_per_sec': round(requests / wall, 2),
+            'p50_ms': round(percentile(latencies, 50), 2),
+            'p95_ms': round(percentile(latencies, 95), 2),
+            'p99_ms': round(percentile(latencies, 99), 2),
+            'queries': percentile(queries, 50) if queries else None,
+            'errors': sum(1 for sample in samples if not sample[2]),
+        }
+
+    def compare(self, results, baseline_path, threshold):
+        try:
+            with open(baseline_path) as fh:
+                baseline = json.load(fh)
+        except FileNotFoundError:
+            self.stdout.write(self.style.WARNING(
+                f'No baseline at {baseline_path}; run with --update-baseline to record one'))
+            baseline = {}
+
+        failures = []
+        for key, result in results.items():
+            if result['errors']:
+                failures.append(f'{key}: {result["errors"]} failed requests')
+            base = baseline.get(key)
+            if not base:
+                continue
+            if result['p95_ms'] > base['p95_ms'] * (1 + threshold):
+                failures.append(f'{key}: p95 {result["p95_ms"]:.1f}ms vs baseline {base["p95_ms"]:.1f}ms')
+            if result['req_per_sec'] < base['req_per_sec'] * (1 - threshold):
+                failures.append(
+                    f'{key}: {result["req_per_sec"]:.1f} req/s vs baseline {base["req_per_sec"]:.1f}')
+            if None not in (result['queries'], base['queries']) and result['queries'] > base['queries']:
+                failures.append(f'{key}: {result["queries"]} queries vs baseline {base["queries"]}')
+
+        if failures:
+            raise CommandError('Performance regressions:\n  ' + '\n  '.join(failures))
+        self.stdout.write(self.style.SUCCESS('No regressions against the baseline'))
+
+    def drain_scan_journal(self):
+        journal = get_journal()
+        while journal.flush()[0]:
+            pass
+
+    def clear(self):
+        generated = Item.objects.filter(name__startswith=f'{DATA_PREFIX}-')
+        InventoryTransaction.objects.filter(item__in=generated).delete()
+        generated.delete()
+        # The export behind the download scenario, and work queued by the POST scenarios
+        Job.objects.filter(dedupe_key__startswith=f'{DATA_PREFIX}-').delete()
+        Job.objects.filter(status=Job.QUEUED, dedupe_key__in=['sweep_alerts', 'export_report:low_stock']).delete()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def write_json(path, results):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'w') as fh:
+        json.dump(results, fh, indent=2, sort_keys=True)
+        fh.write('\n')
@@ -0,0 +1,84 @@
+import gc
+import time
+import tracemalloc
+from datetime import timedelta
+
+from django.contrib import admin
+from django.contrib.admin.utils import get_deleted_objects
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils import timezone
+
+from inventory import purge
+from inventory.management.commands.generate_inventory_data import write_transactions
+from inventory.models import InventoryAlert, Item
+
+DATA_PREFIX = 'DELBENCH'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure time and peak Python memory of deleting an item with a long history, and of the admin "
+        "delete confirmation page, through Django's collector and through inventory.purge"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--movements', type=int, default=500000, help='Ledger rows of the deleted item')
+        parser.add_argument('--alerts', type=int, default=5000, help='Resolved alerts of the deleted item')
+
+    def handle(self, *args, **options):
+        request = RequestFactory().get('/')
+        request.user, _ = User.objects.get_or_create(
+            username=f'{DATA_PREFIX.lower()}-admin', defaults={'is_staff': True, 'is_superuser': True},
+        )
+        item_admin = admin.site._registry[Item]
+        modes = {
+            'delete (collector)': lambda item: item.delete(),
+            'delete (batched)': lambda item: purge.delete_items(Item.objects.filter(pk=item.pk)),
+            'confirm (collector)': lambda item: get_deleted_objects([item], request, admin.site),
+            'confirm (counts)': lambda item: item_admin.get_deleted_objects([item], request),
+        }
+        self.stdout.write(f'{"mode":<22}{"seconds":>9}{"peak MiB":>10}')
+        try:
+            for mode, run in modes.items():
+                seconds, _ = self.measure(run, options, trace=False)
+                _, peak = self.measure(run, options, trace=True)
+                self.stdout.write(f'{mode:<22}{seconds:>9.2f}{peak / 2 ** 20:>10.1f}')
+        finally:
+            purge.delete_items(Item.objects.filter(name__startswith=f'{DATA_PREFIX}-'))
+            request.user.delete()
+
+    def measure(self, run, options, trace):
+        """(seconds, peak bytes allocated) of `run` on a freshly generated item"""
+        item = self.make_item(options)
+        gc.collect()
+        if trace:
+            # Tracing slows Python down several times, so time is taken on its own pass
+            tracemalloc.start()
+        started = time.perf_counter()
+        try:
+            run(item)
+            seconds = time.perf_counter() - started
+            peak = tracemalloc.get_traced_memory()[1] if trace else 0
+        finally:
+            if trace:
+                tracemalloc.stop()
+        return seconds, peak
+
+    def make_item(self, options):
+        item = Item.objects.create(name=f'{DATA_PREFIX}-{time.monotonic_ns()}', quantity=0, price=1)
+        start = timezone.now() - timedelta(days=365)
+        batch = []
+        for n in range(options['movements']):
+            batch.append((item.pk, 'OUT', 1, -1, '', f'{start + timedelta(seconds=n * 30):%Y-%m-%d %H:%M:%S.%f}'))
+            if len(batch) == 10000:
+                write_transactions(batch)
+                batch = []
+        if batch:
+            write_transactions(batch)
+        InventoryAlert.objects.bulk_create([
+            InventoryAlert(item=item, alert_type='LOW_STOCK', message='bench', is_resolved=True, resolved_at=start)
+            for _ in range(options['alerts'])
+        ], batch_size=1000)
+        return item
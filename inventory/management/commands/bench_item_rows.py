@@ -0,0 +1,83 @@
+import gc
+import time
+import tracemalloc
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+from django.template.loader import render_to_string
+from django.test import RequestFactory, override_settings
+
+from inventory.models import Item, InventoryTransaction
+from inventory.rows import item_rows
+
+DATA_PREFIX = 'ROWBENCH'
+
+
+class Command(BaseCommand):
+    help = 'Compare memory and render time of model instances vs ItemRow tuples on large list pages'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--rows', type=int, default=100000, help='Items to list')
+        parser.add_argument('--repeat', type=int, default=3, help='Runs per mode; the best is reported')
+        parser.add_argument('--keep-data', action='store_true', help='Leave the generated items in place')
+
+    def handle(self, *args, **options):
+        call_command('generate_inventory_data', items=options['rows'], transactions=0,
+                     prefix=DATA_PREFIX, clear=True, stdout=self.stdout)
+        queryset = Item.objects.filter(name__startswith=f'{DATA_PREFIX}-')
+        request = RequestFactory().get('/')
+        request.user = AnonymousUser()
+        summary = {'item_count': options['rows'], 'total_quantity': 0, 'total_value': 0}
+
+        pages = {
+            'item_list': lambda items: render_to_string(
+                'inventory/item_list.html', {'items': items, 'search_query': ''}, request),
+            'reports': lambda items: render_to_string('inventory/reports.html', {
+                'items': items, 'summary': summary, 'report_type': 'stock_levels',
+                'report_title': 'Stock Levels Report',
+            }, request),
+        }
+        loaders = {
+            'models': lambda: list(queryset.order_by('quantity')),
+            'rows': lambda: item_rows(queryset.order_by('quantity')),
+        }
+
+        # Fragments are looked up but never stored, so every run renders every row
+        self.stdout.write(f'{"page":<11}{"mode":<8}{"fetch s":>9}{"render s":>10}{"rows MiB":>10}')
+        try:
+            with override_settings(FRAGMENT_CACHE_MAX_BYTES=0):
+                self.run(pages, loaders, options['repeat'])
+        finally:
+            if not options['keep_data']:
+                InventoryTransaction.objects.filter(item__in=queryset).delete()
+                queryset.delete()
+
+    def run(self, pages, loaders, repeat):
+        for page, render in pages.items():
+            for mode, load in loaders.items():
+                fetch, draw, peak = min(
+                    (self.measure(load, render) for _ in range(repeat)),
+                    key=lambda result: result[0] + result[1],
+                )
+                self.stdout.write(f'{page:<11}{mode:<8}{fetch:>9.2f}{draw:>10.2f}{peak / 2 ** 20:>10.1f}')
+
+    def measure(self, load, render):
+        """(fetch seconds, cold render seconds, peak bytes allocated while fetching)"""
+        gc.collect()
+        started = time.perf_counter()
+        items = load()
+        fetched = time.perf_counter()
+        render(items)
+        rendered = time.perf_counter()
+        del items
+
+        # Tracing slows Python down several times, so memory gets its own pass
+        gc.collect()
+        tracemalloc.start()
+        try:
+            load()
+            peak = tracemalloc.get_traced_memory()[1]
+        finally:
+            tracemalloc.stop()
+        return fetched - started, rendered - fetched, peak
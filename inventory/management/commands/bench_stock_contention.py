@@ -0,0 +1,94 @@
+import threading
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connection
+
+from inventory.models import Item, InventoryTransaction
+
+
+class Command(BaseCommand):
+    help = 'Measure concurrent OUT throughput on one hot item, with and without counter stripes'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=8, help='Concurrent clients')
+        parser.add_argument('--movements', type=int, default=200, help='OUT movements per client')
+        parser.add_argument('--stripes', type=int, default=8, help='Stripe count for the striped run')
+
+    def handle(self, *args, **options):
+        threads = options['threads']
+        movements = options['movements']
+        if connection.vendor == 'sqlite':
+            self.stdout.write(self.style.WARNING(
+                'SQLite serializes all writers, so these numbers mostly reflect lock-upgrade '
+                'retries; run against PostgreSQL for representative results.'
+            ))
+
+        self.stdout.write(f'{"mode":<12}{"moves/s":>10}{"accepted":>10}{"rejected":>10}{"retries":>9}')
+        for mode, stripe_count in (('row-lock', 0), ('striped', options['stripes'])):
+            result = self.run_mode(mode, stripe_count, threads, movements)
+            self.stdout.write(
+                f'{mode:<12}{result["rate"]:>10.1f}{result["accepted"]:>10}'
+                f'{result["rejected"]:>10}{result["retries"]:>9}'
+            )
+
+    def run_mode(self, mode, stripe_count, threads, movements):
+        # Stock for 90% of the attempts, so the tail must be rejected rather than go negative
+        opening = threads * movements * 9 // 10
+        item = Item.objects.create(
+            name=f'__bench_contention_{mode}_{time.time_ns()}',
+            quantity=opening,
+            price=1,
+            reorder_level=0,
+            stripe_count=stripe_count,
+        )
+        counters = {'accepted': 0, 'rejected': 0, 'retries': 0}
+        lock = threading.Lock()
+
+        def client():
+            local = {'accepted': 0, 'rejected': 0, 'retries': 0}
+            hot = Item.objects.get(pk=item.pk)
+            try:
+                for _ in range(movements):
+                    while True:
+                        try:
+                            hot.update_stock(-1, 'OUT', 'contention benchmark')
+                            local['accepted'] += 1
+                        except ValueError:
+                            local['rejected'] += 1
+                        except OperationalError:
+                            local['retries'] += 1
+                            continue
+                        break
+            finally:
+                connection.close()
+            with lock:
+                for key, value in local.items():
+                    counters[key] += value
+
+        workers = [threading.Thread(target=client) for _ in range(threads)]
+        started = time.perf_counter()
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - started
+
+        try:
+            item.compact_stripes()
+            item.refresh_from_db()
+            logged = InventoryTransaction.objects.filter(item=item).count()
+            if item.quantity != opening - counters['accepted'] or item.quantity < 0:
+                self.stderr.write(self.style.ERROR(
+                    f'{mode}: final quantity {item.quantity} does not match '
+                    f'{opening} - {counters["accepted"]}'
+                ))
+            if logged != counters['accepted']:
+                self.stderr.write(self.style.ERROR(
+                    f'{mode}: {logged} ledger rows for {counters["accepted"]} accepted movements'
+                ))
+        finally:
+            item.delete()
+
+        counters['rate'] = (threads * movements) / elapsed if elapsed else 0.0
+        return counters
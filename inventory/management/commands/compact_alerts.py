@@ -0,0 +1,24 @@
+from django.core.management.base import BaseCommand
+
+from inventory import alert_retention
+
+
+class Command(BaseCommand):
+    help = (
+        'Fold alerts resolved more than ALERT_RETENTION_DAYS ago into per-item summary counts and delete them, '
+        'in short batches so open alerts stay writable'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--retention-days', type=int, default=None,
+                            help='Days resolved alerts are kept (default ALERT_RETENTION_DAYS)')
+        parser.add_argument('--batch-size', type=int, default=None,
+                            help='Alerts per transaction (default ALERT_COMPACT_BATCH_SIZE)')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches')
+
+    def handle(self, *args, **options):
+        compacted = alert_retention.compact(
+            options['retention_days'], options['batch_size'], pause=options['pause'],
+            progress=lambda done: self.stdout.write(f'  {done:,} compacted'),
+        )
+        self.stdout.write(self.style.SUCCESS(f'{compacted:,} resolved alerts compacted into summaries'))
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from inventory.models import Item
+
+
+class Command(BaseCommand):
+    help = 'Fold hot-item counter stripes back into Item.quantity and refresh their alerts'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=0,
+            help='Keep running, compacting every INTERVAL seconds (default: run once)'
+        )
+
+    def handle(self, *args, **options):
+        interval = options['interval']
+        while True:
+            started = time.perf_counter()
+            items = Item.objects.filter(
+                Q(stripe_count__gt=0) | Q(stripes__quantity__gt=0) | Q(stripes__quantity__lt=0)
+            ).distinct()
+            compacted = 0
+            folded = 0
+            for item in items:
+                folded += item.compact_stripes()
+                compacted += 1
+            elapsed = time.perf_counter() - started
+            self.stdout.write(
+                f'Compacted {compacted} items (net {folded} units folded) in {elapsed * 1000:.1f} ms'
+            )
+            if not interval:
+                break
+            time.sleep(interval)
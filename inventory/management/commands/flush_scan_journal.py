@@ -0,0 +1,36 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from inventory.scan_buffer import get_journal
+
+
+class Command(BaseCommand):
+    help = 'Apply buffered scan events from the local journal in batched transactions'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval', type=float, default=None,
+            help='Coalescing window in seconds (default: SCAN_FLUSH_INTERVAL)'
+        )
+        parser.add_argument('--batch-size', type=int, default=5000, help='Maximum events per transaction')
+        parser.add_argument('--once', action='store_true', help='Drain the journal once and exit')
+
+    def handle(self, *args, **options):
+        journal = get_journal()
+        interval = options['interval'] or settings.SCAN_FLUSH_INTERVAL
+        self.stdout.write(f'Flushing {journal.path} every {interval}s')
+        while True:
+            started = time.perf_counter()
+            applied, rejected, cursor = journal.flush(batch_size=options['batch_size'])
+            if applied or rejected:
+                self.stdout.write(
+                    f'Applied {applied} scans, rejected {rejected}, cursor {cursor} '
+                    f'({(time.perf_counter() - started) * 1000:.1f} ms)'
+                )
+            if applied + rejected >= options['batch_size']:
+                continue  # backlog: keep draining without waiting
+            if options['once']:
+                break
+            time.sleep(interval)
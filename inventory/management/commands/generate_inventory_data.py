@@ -0,0 +1,318 @@
+import io
+import math
+import multiprocessing
+import os
+import random
+import time
+from array import array
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from itertools import accumulate
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+
+from inventory import fragments, purge
+from inventory.models import Category, Item, InventoryTransaction, Supplier
+
+CATEGORIES = [
+    # name, relative catalog share, median price
+    ('Electronics', 14, 180.0),
+    ('Office Supplies', 12, 8.0),
+    ('Clothing', 11, 25.0),
+    ('Tools', 9, 40.0),
+    ('Food', 10, 5.0),
+    ('Books', 8, 18.0),
+    ('Sports', 7, 35.0),
+    ('Home & Kitchen', 10, 22.0),
+    ('Toys', 6, 15.0),
+    ('Health', 7, 12.0),
+    ('Automotive', 4, 60.0),
+    ('Garden', 2, 28.0),
+]
+
+ADJECTIVES = ['Basic', 'Premium', 'Compact', 'Heavy-Duty', 'Classic', 'Eco', 'Pro', 'Mini',
+              'Deluxe', 'Smart', 'Wireless', 'Portable', 'Organic', 'Ultra', 'Standard', 'Lite']
+NOUNS = ['Widget', 'Kit', 'Set', 'Pack', 'Unit', 'Module', 'Bundle', 'Case', 'Box', 'Tool',
+         'Adapter', 'Panel', 'Holder', 'Cable', 'Bottle', 'Sheet']
+
+IN_REASONS = ['Supplier delivery', 'Restock', 'Customer return', 'Transfer in']
+OUT_REASONS = ['Sale', 'Online order', 'Wholesale order', 'Transfer out']
+ADJUST_REASONS = ['Cycle count', 'Damaged goods', 'Shrinkage']
+
+# The ledger is generated in a fixed number of item shards, each with its own
+# seeded stream, so the output does not depend on how many workers run them.
+SHARDS = 16
+
+# Inherited by forked workers
+_plan = {}
+
+
+class Command(BaseCommand):
+    help = (
+        'Generate a deterministic synthetic catalog and transaction ledger for load testing. '
+        'Popularity is Zipf-skewed and volume follows yearly and weekly seasonality.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--items', type=int, default=1000, help='Number of items to create')
+        parser.add_argument('--transactions', type=int, default=10000, help='Number of ledger rows to create')
+        parser.add_argument('--seed', type=int, default=42,
+                            help='Random seed; same seed and --end-date, same data')
+        parser.add_argument('--days', type=int, default=365, help='History length in days')
+        parser.add_argument('--end-date', type=date.fromisoformat, default=None,
+                            help='Last day of the history, YYYY-MM-DD (default: yesterday)')
+        parser.add_argument('--skew', type=float, default=1.1, help='Zipf exponent for item popularity')
+        parser.add_argument('--seasonality', type=float, default=0.35,
+                            help='Amplitude of the yearly demand cycle (0 disables)')
+        parser.add_argument('--suppliers', type=int, default=200, help='Size of the supplier pool')
+        parser.add_argument('--batch-size', type=int, default=50000, help='Rows per insert batch')
+        parser.add_argument('--workers', type=int, default=0,
+                            help='Parallel ledger writers (default: CPU count on PostgreSQL, 1 elsewhere)')
+        parser.add_argument('--prefix', default='GEN', help='Name prefix of generated items')
+        parser.add_argument('--clear', action='store_true', help='Delete previously generated items first')
+
+    def handle(self, *args, **options):
+        if options['items'] <= 0:
+            raise CommandError('--items must be positive')
+        prefix = options['prefix']
+        workers = options['workers'] or (os.cpu_count() if connection.vendor == 'postgresql' else 1)
+        if connection.vendor == 'sqlite' and workers > 1:
+            self.stdout.write(self.style.WARNING('SQLite has a single writer; using one worker'))
+            workers = 1
+
+        if options['clear']:
+            self.clear(prefix)
+        elif Item.objects.filter(name__startswith=f'{prefix}-').exists():
+            raise CommandError(f'Items named {prefix}-* already exist; use --clear or another --prefix')
+
+        end_date = options['end_date'] or datetime.now(dt_timezone.utc).date() - timedelta(days=1)
+        days = day_weights(end_date, options['days'], options['seasonality'])
+        rng = random.Random(options['seed'])
+        started = time.perf_counter()
+        category_ids = dimension_ids(Category, [name for name, _, _ in CATEGORIES])
+        supplier_ids = dimension_ids(Supplier, [f'Supplier {n:04d}' for n in range(1, options['suppliers'] + 1)])
+        # Items date from the start of their history, not from when the command ran
+        created = f'{end_date - timedelta(days=options["days"])} 00:00:00.000000'
+        item_ids, reorder_levels = create_items(rng, options['items'], category_ids, list(supplier_ids.values()),
+                                                prefix, created, options['batch_size'])
+        self.report('items', len(item_ids), started)
+
+        started = time.perf_counter()
+        _plan.update(
+            item_ids=item_ids,
+            reorder_levels=reorder_levels,
+            popularity=popularity(rng, len(item_ids), options['skew']),
+            days=days,
+            batch_size=options['batch_size'],
+        )
+        shard_totals = split(options['transactions'], [
+            sum(_plan['popularity'][shard::SHARDS]) for shard in range(SHARDS)
+        ], rng)
+        jobs = [(options['seed'], shard, total) for shard, total in enumerate(shard_totals)]
+        if workers > 1:
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                results = pool.map(generate_shard, jobs)
+        else:
+            results = [generate_shard(job) for job in jobs]
+        self.report('transactions', options['transactions'], started)
+
+        started = time.perf_counter()
+        set_quantities(item_ids, results, options['batch_size'])
+        fragments.invalidate_categories(*category_ids.values())
+        self.report('item quantities', len(item_ids), started)
+
+    def report(self, what, rows, started):
+        elapsed = time.perf_counter() - started
+        rate = rows / elapsed if elapsed else float('inf')
+        self.stdout.write(f'{rows:>13,} {what:<16} in {elapsed:8.1f}s ({rate:,.0f} rows/s)')
+
+    def clear(self, prefix):
+        # Batched, so clearing a 100M-row ledger never holds one huge DELETE
+        deleted = purge.delete_items(Item.objects.filter(name__startswith=f'{prefix}-'))
+        self.stdout.write(f'Removed {deleted:,} previously generated items and their history')
+
+
+def split(total, weights, rng):
+    """Distribute total over weights, handing the rounding remainder out at random"""
+    scale = total / sum(weights)
+    counts = [int(w * scale) for w in weights]
+    for index in rng.sample(range(len(weights)), total - sum(counts)):
+        counts[index] += 1
+    return counts
+
+
+def popularity(rng, count, skew):
+    """Zipf weights over a shuffled ranking, so hot items are spread over the id range"""
+    ranks = list(range(1, count + 1))
+    rng.shuffle(ranks)
+    return [1.0 / (rank ** skew) for rank in ranks]
+
+
+def day_weights(end_date, days, seasonality):
+    """(date, weight) per day up to end_date: a yearly cycle peaking in December, quieter weekends"""
+    result = []
+    for offset in range(days - 1, -1, -1):
+        day = end_date - timedelta(days=offset)
+        yearly = 1 + seasonality * math.cos(2 * math.pi * (day.timetuple().tm_yday - 350) / 365.25)
+        weekly = 0.6 if day.weekday() >= 5 else 1.0
+        result.append((day.isoformat(), yearly * weekly))
+    return result
+
+
+def dimension_ids(model, names):
+    """{name: pk} for these category or supplier names, adding the ones that do not exist yet"""
+    existing = set(model.objects.filter(name__in=names).values_list('name', flat=True))
+    model.objects.bulk_create([model(name=name) for name in names if name not in existing])
+    return dict(model.objects.filter(name__in=names).values_list('name', 'pk'))
+
+
+def create_items(rng, count, category_ids, supplier_ids, prefix, created, batch_size):
+    shares = list(accumulate(share for _, share, _ in CATEGORIES))
+    reorder_levels = array('l')
+    names = []
+    rows = []
+
+    for n in range(count):
+        category, _, median_price = rng.choices(CATEGORIES, cum_weights=shares)[0]
+        price = max(round(median_price * math.exp(rng.gauss(0, 0.6)), 2), 0.5)
+        reorder_level = rng.choice((5, 10, 10, 15, 20, 25, 50))
+        name = f'{prefix}-{n:07d} {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)}'
+        supplier = rng.choice(supplier_ids) if rng.random() > 0.05 else None
+        names.append(name)
+        reorder_levels.append(reorder_level)
+        rows.append((name, 0, f'{price:.2f}', created, created, reorder_level, category_ids[category], supplier, 0))
+        if len(rows) >= batch_size:
+            write_items(rows)
+            rows = []
+    if rows:
+        write_items(rows)
+
+    # Map generation order to primary keys without relying on RETURNING support
+    ids_by_name = dict(
+        Item.objects.filter(name__startswith=f'{prefix}-').values_list('name', 'id').iterator(chunk_size=10000)
+    )
+    return array('q', (ids_by_name[name] for name in names)), reorder_levels
+
+
+ITEM_COLUMNS = 'name, quantity, price, created_at, updated_at, reorder_level, category_id, supplier_id, stripe_count'
+TRANSACTION_COLUMNS = 'item_id, transaction_type, quantity, quantity_change, reason, user_id, timestamp'
+
+
+def write_items(rows):
+    table = Item._meta.db_table
+    if connection.vendor == 'postgresql':
+        copy_into(f'{table} ({ITEM_COLUMNS})', (
+            f'{name}\t{qty}\t{price}\t{created}+00\t{updated}+00\t{reorder}\t{category}\t'
+            f'{supplier if supplier is not None else chr(92) + "N"}\t{stripes}\n'
+            for name, qty, price, created, updated, reorder, category, supplier, stripes in rows
+        ))
+    else:
+        execute_many(f'INSERT INTO {table} ({ITEM_COLUMNS}) VALUES ({", ".join(["%s"] * 9)})', rows)
+
+
+def write_transactions(rows):
+    table = InventoryTransaction._meta.db_table
+    if connection.vendor == 'postgresql':
+        copy_into(f'{table} ({TRANSACTION_COLUMNS})', (
+            f'{item_id}\t{kind}\t{qty}\t{change}\t{reason}\t\\N\t{ts}+00\n'
+            for item_id, kind, qty, change, reason, ts in rows
+        ))
+    else:
+        execute_many(f'INSERT INTO {table} ({TRANSACTION_COLUMNS}) VALUES (%s, %s, %s, %s, %s, NULL, %s)', rows)
+
+
+def execute_many(sql, rows):
+    """Multi-row insert; timestamps are passed as naive UTC text"""
+    with transaction.atomic(), connection.cursor() as cursor:
+        if connection.vendor == 'sqlite':
+            # Skip Django's per-row placeholder translation on the hot path
+            cursor.cursor.executemany(sql.replace('%s', '?'), rows)
+        else:
+            cursor.executemany(sql, rows)
+
+
+def copy_into(target, lines):
+    """COPY ... FROM STDIN on PostgreSQL"""
+    buffer = io.StringIO(''.join(lines))
+    with transaction.atomic(), connection.cursor() as cursor:
+        raw = cursor.cursor
+        if hasattr(raw, 'copy_expert'):  # psycopg2
+            raw.copy_expert(f'COPY {target} FROM STDIN', buffer)
+        else:  # psycopg 3
+            with raw.copy(f'COPY {target} FROM STDIN') as copy:
+                copy.write(buffer.getvalue())
+
+
+def generate_shard(job):
+    """Write one shard's ledger in time order; returns (item indexes, final quantities)"""
+    seed, shard, total = job
+    rng = random.Random(f'{seed}:{shard}')
+    rand = rng.random
+    item_ids = _plan['item_ids']
+    reorder_levels = _plan['reorder_levels']
+    batch_size = _plan['batch_size']
+    members = range(shard, len(item_ids), SHARDS)
+    cum_popularity = list(accumulate(_plan['popularity'][shard::SHARDS]))
+    positions = range(len(members))
+    quantities = array('q', bytes(8 * len(members)))
+
+    days = _plan['days']
+    rows = []
+    for (day, _), count in zip(days, split(total, [weight for _, weight in days], rng) if total else []):
+        if not count:
+            continue
+        picks = rng.choices(positions, cum_weights=cum_popularity, k=count)
+        micros = sorted(int(rand() * 86400000000) for _ in range(count))
+        for position, micro in zip(picks, micros):
+            index = members[position]
+            on_hand = quantities[position]
+            reorder_level = reorder_levels[index]
+            roll = rand()
+            if on_hand <= reorder_level:
+                # Replenishment order once stock falls to the reorder point
+                kind, qty, reasons = 'IN', reorder_level * (3 + int(roll * 6)) + 1, IN_REASONS
+                on_hand += qty
+            elif roll < 0.03:
+                kind, qty, reasons = 'ADJUST', 1 + int(roll * 100), ADJUST_REASONS
+                on_hand -= qty
+            elif roll < 0.08:
+                kind, qty, reasons = 'IN', 1 + int((roll - 0.03) * 60), IN_REASONS
+                on_hand += qty
+            else:
+                kind, qty, reasons = 'OUT', min(int(rng.expovariate(0.5)) + 1, 24, on_hand), OUT_REASONS
+                on_hand -= qty
+            change = on_hand - quantities[position]
+            quantities[position] = on_hand
+            seconds, micro = divmod(micro, 1000000)
+            minutes, seconds = divmod(seconds, 60)
+            hours, minutes = divmod(minutes, 60)
+            rows.append((item_ids[index], kind, qty, change, reasons[int(rand() * len(reasons))],
+                         f'{day} {hours:02d}:{minutes:02d}:{seconds:02d}.{micro:06d}'))
+            if len(rows) >= batch_size:
+                write_transactions(rows)
+                rows = []
+    if rows:
+        write_transactions(rows)
+    return list(members), quantities
+
+
+def set_quantities(item_ids, results, batch_size):
+    table = Item._meta.db_table
+    pairs = [
+        (quantity, item_ids[index])
+        for members, quantities in results
+        for index, quantity in zip(members, quantities)
+    ]
+    with transaction.atomic():
+        if connection.vendor == 'postgresql':
+            with connection.cursor() as cursor:
+                cursor.execute('CREATE TEMP TABLE generated_quantity (id bigint, quantity integer) ON COMMIT DROP')
+            copy_into('generated_quantity', (f'{item_id}\t{qty}\n' for qty, item_id in pairs))
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f'UPDATE {table} SET quantity = g.quantity FROM generated_quantity g WHERE {table}.id = g.id'
+                )
+        else:
+            for start in range(0, len(pairs), batch_size):
+                execute_many(f'UPDATE {table} SET quantity = %s WHERE id = %s', pairs[start:start + batch_size])
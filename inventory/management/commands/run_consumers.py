@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import change_feed
+
+
+class Command(BaseCommand):
+    help = 'Feed change events to the registered change feed consumers in batches, and prune old events'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--consumer', action='append', dest='names',
+                            help='Only run this consumer (repeatable); default: all registered')
+        parser.add_argument('--batch-size', type=int, default=500, help='Events per consumer transaction')
+        parser.add_argument('--interval', type=float, default=1.0, help='Seconds to wait once every consumer is caught up')
+        parser.add_argument('--once', action='store_true', help='Drain the feed once and exit')
+
+    def handle(self, *args, **options):
+        names = options['names'] or sorted(change_feed.consumers)
+        unknown = set(names) - set(change_feed.consumers)
+        if unknown:
+            raise CommandError(f'Unknown consumers: {", ".join(sorted(unknown))}')
+        self.stdout.write(f'Running consumers: {", ".join(names) or "none"}')
+        while True:
+            handled = 0
+            for name in names:
+                count = change_feed.consume(name, batch_size=options['batch_size'])
+                if count:
+                    self.stdout.write(f'{name}: {count} events')
+                handled += count
+            pruned = change_feed.prune()
+            if pruned:
+                self.stdout.write(f'Pruned {pruned} events')
+            if handled:
+                continue  # backlog: keep draining without waiting
+            if options['once']:
+                break
+            time.sleep(options['interval'])
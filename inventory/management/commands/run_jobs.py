@@ -0,0 +1,48 @@
+import multiprocessing
+import signal
+import threading
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from inventory import jobs
+
+
+def serve(burst, poll_interval):
+    """Worker process body: run jobs until SIGTERM/SIGINT, finishing the current one first"""
+    stop = threading.Event()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(signum, lambda *args: stop.set())
+    return jobs.work(burst=burst, stop=stop, poll_interval=poll_interval)
+
+
+class Command(BaseCommand):
+    help = 'Run background job workers (alert sweeps, report exports) from the database queue'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=1, help='Worker processes to start')
+        parser.add_argument('--burst', action='store_true',
+                            help='Exit once the queue is empty instead of waiting for new jobs')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds to wait between polls of an empty queue (default: JOB_POLL_INTERVAL)')
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        arguments = (options['burst'], options['poll_interval'])
+        self.stdout.write(f'Starting {workers} job worker{"s" if workers != 1 else ""}')
+        if workers > 1:
+            connections.close_all()
+            context = multiprocessing.get_context('fork')
+            processes = [context.Process(target=serve, args=arguments) for _ in range(workers)]
+            for process in processes:
+                process.start()
+            try:
+                for process in processes:
+                    process.join()
+            except KeyboardInterrupt:
+                for process in processes:
+                    process.terminate()
+                    process.join()
+        else:
+            processed = serve(*arguments)
+            self.stdout.write(f'Processed {processed} job{"s" if processed != 1 else ""}')
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from inventory import notifications
+
+
+class Command(BaseCommand):
+    help = (
+        'Mail pending alert notifications to ALERT_DIGEST_RECIPIENTS now, without waiting for the '
+        'queued digest job. Set EMAIL_BACKEND to the filebased backend or point EMAIL_HOST at a '
+        'local SMTP server to inspect the digests.'
+    )
+
+    def handle(self, *args, **options):
+        if not notifications.recipients():
+            raise CommandError('ALERT_DIGEST_RECIPIENTS is empty; no digests to send')
+        try:
+            result = notifications.send_digests()
+        except notifications.DigestFailed as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(
+            f'Mailed {result["notifications"]} notifications in {result["recipients"]} digests'
+        ))
@@ -0,0 +1,278 @@
+import json
+import logging
+import multiprocessing
+import random
+import threading
+import time
+from collections import Counter
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection, connections
+from django.db.models import Case, F, IntegerField, Sum, When
+from django.test import Client
+from django.urls import reverse
+
+from inventory.management.commands.bench_http import percentile
+from inventory.models import Item, InventoryTransaction
+
+ITEM_PREFIX = '__stress_'
+
+# PostgreSQL SQLSTATEs that mean "retry the transaction"
+DEADLOCK_DETECTED = '40P01'
+SERIALIZATION_FAILURE = '40001'
+
+
+class LockTimer:
+    """Execute wrapper timing the statements where a transaction waits for locks.
+
+    On PostgreSQL that is SELECT ... FOR UPDATE. SQLite ignores FOR UPDATE and
+    takes its database-wide write lock at the first write, so there every
+    INSERT/UPDATE/DELETE is timed instead.
+    """
+
+    def __init__(self):
+        self.seconds = 0.0
+        self.statements = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        if connection.vendor == 'sqlite':
+            waits = sql.lstrip()[:6].upper() in ('INSERT', 'UPDATE', 'DELETE')
+        else:
+            waits = 'FOR UPDATE' in sql
+        if not waits:
+            return execute(sql, params, many, context)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.statements += 1
+
+
+def classify(error):
+    """'deadlock', 'retry' or None for an exception raised by a stock movement"""
+    text = str(error).lower()
+    code = getattr(getattr(error, '__cause__', None), 'pgcode', None)
+    if code == DEADLOCK_DETECTED or 'deadlock' in text:
+        return 'deadlock'
+    if code == SERIALIZATION_FAILURE or 'locked' in text or 'could not serialize' in text:
+        return 'retry'
+    return None
+
+
+class Command(BaseCommand):
+    help = (
+        'Hammer stock movements from many threads and processes, then check every item '
+        'against its ledger and report throughput, lock-wait time, deadlocks and retries'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=1, help='Worker processes')
+        parser.add_argument('--threads', type=int, default=8, help='Threads per process')
+        parser.add_argument('--operations', type=int, default=200, help='Movements per thread')
+        parser.add_argument('--items', type=int, default=100, help='Items in the stress catalog')
+        parser.add_argument('--distribution', choices=('hot', 'cold', 'zipf'), default='hot',
+                            help='hot: all traffic on --hot-items items; cold: uniform; zipf: skewed')
+        parser.add_argument('--hot-items', type=int, default=1)
+        parser.add_argument('--path', choices=('model', 'view', 'api'), default='model',
+                            help='Item.update_stock, the update_stock form view, or api_stock_update')
+        parser.add_argument('--out-ratio', type=float, default=0.6, help='Share of OUT movements')
+        parser.add_argument('--stripes', type=int, default=0, help='stripe_count for the stress items')
+        parser.add_argument('--max-retries', type=int, default=50, help='Retries per movement')
+        parser.add_argument('--seed', type=int, default=1)
+        parser.add_argument('--json', action='store_true', help='Print the report as JSON')
+        parser.add_argument('--keep', action='store_true', help='Keep the stress items afterwards')
+
+    def handle(self, *args, **options):
+        if options['processes'] > 1 and connection.vendor == 'sqlite' and options['path'] != 'model':
+            self.stdout.write(self.style.WARNING('Process workers share one SQLite file lock'))
+        workers = options['processes'] * options['threads']
+        # Enough stock for roughly 80% of the OUT attempts on the hottest item
+        opening = max(10, int(workers * options['operations'] * options['out_ratio'] * 2 * 0.8))
+        run = time.time_ns()
+        Item.objects.bulk_create([
+            Item(name=f'{ITEM_PREFIX}{run}_{n}', quantity=opening, price=1, reorder_level=0,
+                 stripe_count=options['stripes'])
+            for n in range(options['items'])
+        ])
+        items = list(Item.objects.filter(name__startswith=f'{ITEM_PREFIX}{run}_')
+                     .order_by('pk').values_list('pk', flat=True))
+        user, _ = User.objects.get_or_create(username='stress_stock')
+        plan = dict(options, items=items, user=user.pk)
+
+        started = time.perf_counter()
+        if options['processes'] > 1:
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(options['processes']) as pool:
+                results = pool.map(run_process, [(plan, index) for index in range(options['processes'])])
+        else:
+            results = [run_process((plan, 0))]
+        elapsed = time.perf_counter() - started
+
+        totals = Counter()
+        latencies = []
+        for counts, process_latencies in results:
+            totals.update(counts)
+            latencies.extend(process_latencies)
+        latencies.sort()
+
+        mismatches = verify(items, opening)
+        report = {
+            'vendor': connection.vendor,
+            'path': options['path'],
+            'distribution': options['distribution'],
+            'workers': workers,
+            'stripes': options['stripes'],
+            'attempted': workers * options['operations'],
+            'applied': totals['applied'],
+            'rejected': totals['rejected'],
+            'failed': totals['failed'],
+            'retries': totals['retry'],
+            'deadlocks': totals['deadlock'],
+            'movements_per_sec': round(totals['applied'] / elapsed, 1),
+            'p50_ms': round(percentile(latencies, 50) * 1000, 2),
+            'p99_ms': round(percentile(latencies, 99) * 1000, 2),
+            'lock_wait_s': round(totals['lock_wait'], 3),
+            'lock_wait_ms_per_statement': round(totals['lock_wait'] * 1000 / max(1, totals['lock_statements']), 3),
+            'ledger_mismatches': mismatches,
+        }
+        if not options['keep']:
+            stress = Item.objects.filter(pk__in=items)
+            InventoryTransaction.objects.filter(item__in=stress).delete()
+            stress.delete()
+
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            for key, value in report.items():
+                self.stdout.write(f'{key:<28}{value}')
+        if mismatches:
+            raise CommandError(f'{len(mismatches)} items do not match their ledger')
+
+
+def run_process(job):
+    plan, process = job
+    counts = Counter()
+    latencies = []
+    lock = threading.Lock()
+    threads = [
+        threading.Thread(target=run_thread, args=(plan, process * plan['threads'] + n, counts, latencies, lock))
+        for n in range(plan['threads'])
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    connections.close_all()
+    return counts, latencies
+
+
+def run_thread(plan, worker, counts, latencies, lock):
+    rng = random.Random(f'{plan["seed"]}:{worker}')
+    items = plan['items']
+    if plan['distribution'] == 'hot':
+        weights = [1] * min(plan['hot_items'], len(items)) + [0] * max(0, len(items) - plan['hot_items'])
+    elif plan['distribution'] == 'zipf':
+        weights = [1 / rank ** 1.2 for rank in range(1, len(items) + 1)]
+    else:
+        weights = None
+    picks = rng.choices(items, weights=weights, k=plan['operations'])
+
+    timer = LockTimer()
+    local = Counter()
+    local_latencies = []
+    move = make_mover(plan)
+    with connection.execute_wrapper(timer):
+        for item_id in picks:
+            transaction_type = 'OUT' if rng.random() < plan['out_ratio'] else 'IN'
+            quantity = rng.randint(1, 3)
+            started = time.perf_counter()
+            for attempt in range(plan['max_retries'] + 1):
+                try:
+                    outcome = move(item_id, transaction_type, quantity)
+                except (OperationalError, RuntimeError) as e:
+                    kind = classify(e)
+                    if kind is None:
+                        raise
+                    local[kind] += 1
+                    time.sleep(min(0.05, 0.001 * 2 ** attempt) * rng.random())
+                    continue
+                local[outcome] += 1
+                break
+            else:
+                local['failed'] += 1
+            local_latencies.append(time.perf_counter() - started)
+    connection.close()
+
+    local['lock_wait'] = timer.seconds
+    local['lock_statements'] = timer.statements
+    with lock:
+        counts.update(local)
+        latencies.extend(local_latencies)
+
+
+def make_mover(plan):
+    """Return move(item_id, type, quantity) -> 'applied' | 'rejected' for the chosen path"""
+    if plan['path'] == 'model':
+        user = User.objects.get(pk=plan['user'])
+
+        def move(item_id, transaction_type, quantity):
+            item = Item.objects.get(pk=item_id)
+            try:
+                item.update_stock(quantity if transaction_type == 'IN' else -quantity, transaction_type,
+                                  'stress test', user)
+            except ValueError:
+                return 'rejected'
+            return 'applied'
+        return move
+
+    client = Client()
+    client.force_login(User.objects.get(pk=plan['user']))
+
+    if plan['path'] == 'view':
+        # Lock errors are retried here; keep them out of the request error log
+        logging.getLogger('django.request').setLevel(logging.CRITICAL)
+
+        def move(item_id, transaction_type, quantity):
+            response = client.post(reverse('inventory:update_stock', args=[item_id]), {
+                'transaction_type': transaction_type, 'quantity': quantity, 'reason': 'stress test',
+            })
+            # Success redirects to the item page; a rejected movement re-renders the form
+            return 'applied' if response.status_code == 302 else 'rejected'
+        return move
+
+    def move(item_id, transaction_type, quantity):
+        response = client.post(
+            reverse('inventory:api_stock_update', args=[item_id]),
+            json.dumps({'transaction_type': transaction_type, 'quantity': quantity, 'reason': 'stress test'}),
+            content_type='application/json',
+        )
+        data = response.json()
+        if data['success']:
+            return 'applied'
+        if classify(data['error']):
+            # The view swallows database errors into its JSON reply
+            raise RuntimeError(data['error'])
+        return 'rejected'
+    return move
+
+
+def verify(items, opening):
+    """Items whose stock differs from the opening balance plus their ledger"""
+    movements = dict(
+        InventoryTransaction.objects.filter(item_id__in=items).values('item').annotate(
+            net=Sum(Case(
+                When(transaction_type='OUT', then=-F('quantity')),
+                default=F('quantity'),
+                output_field=IntegerField(),
+            ))
+        ).values_list('item', 'net')
+    )
+    mismatches = []
+    for item in Item.objects.filter(pk__in=items):
+        expected = opening + movements.get(item.pk, 0)
+        actual = item.available_quantity
+        if actual != expected:
+            mismatches.append({'item': item.pk, 'expected': expected, 'actual': actual})
+    return mismatches
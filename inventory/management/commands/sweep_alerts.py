@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+
+from inventory import locks, metrics
+from inventory.models import Item
+from inventory.tasks import ALERT_SWEEP_LEASE
+
+# Upper bound of the last range, so items created during the sweep are still covered
+MAX_PK = 2 ** 63 - 1
+
+
+def key_ranges(chunk_size):
+    """Inclusive (first, last) pk ranges holding `chunk_size` items each"""
+    pks = list(Item.objects.order_by('pk').values_list('pk', flat=True))
+    ranges = [
+        (pks[start], pks[min(start + chunk_size, len(pks)) - 1])
+        for start in range(0, len(pks), chunk_size)
+    ]
+    if ranges:
+        ranges[-1] = (ranges[-1][0], MAX_PK)
+    return ranges
+
+
+def sweep_chunk(pk_range):
+    """Sweep one range; returns (pk_range, items alerted, newly alerted, seconds)"""
+    started = time.perf_counter()
+    alerted = [0]
+    generated = Item.sweep_alerts(pk_range=pk_range, progress=lambda checked: alerted.__setitem__(0, checked))
+    return pk_range, alerted[0], generated, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        'Rebuild unresolved stock alerts for every item, splitting the item key space into ranges '
+        'swept in parallel. Holds a database lease so only one sweep runs across all nodes.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=min(4, os.cpu_count() or 1),
+                            help='Processes sweeping ranges in parallel')
+        parser.add_argument('--chunk-size', type=int, default=5000, help='Items per key range')
+        parser.add_argument('--lock-ttl', type=int, default=60,
+                            help='Seconds the sweep lease lasts without renewal')
+        parser.add_argument('--quiet-chunks', action='store_true', help='Only print the summary')
+
+    def handle(self, *args, **options):
+        try:
+            with locks.lease(ALERT_SWEEP_LEASE, ttl=options['lock_ttl']) as held:
+                self.sweep(held, options)
+        except locks.LockHeld as e:
+            raise CommandError(f'Another alert sweep is running: {e}')
+
+    def sweep(self, held, options):
+        started = time.perf_counter()
+        ranges = key_ranges(options['chunk_size'])
+        workers = max(1, min(options['workers'], len(ranges)))
+        if workers > 1 and connection.vendor == 'sqlite':
+            # SQLite has a single writer, and parallel range sweeps fail with "database is locked"
+            self.stdout.write('SQLite allows one writer at a time; sweeping ranges serially')
+            workers = 1
+        self.stdout.write(f'Sweeping {len(ranges)} key ranges with {workers} worker{"s" if workers != 1 else ""}')
+
+        totals = [0, 0]
+        timings = []
+        if workers > 1:
+            connections.close_all()
+            with multiprocessing.get_context('fork').Pool(workers) as pool:
+                for result in pool.imap_unordered(sweep_chunk, ranges):
+                    self.record(result, totals, timings, options)
+                    if held.lost:
+                        pool.terminate()
+                        raise CommandError('Sweep lease was lost; stopping')
+        else:
+            for pk_range in ranges:
+                self.record(sweep_chunk(pk_range), totals, timings, options)
+                if held.lost:
+                    raise CommandError('Sweep lease was lost; stopping')
+
+        elapsed = time.perf_counter() - started
+        metrics.observe_alert_sweep(elapsed)
+        slowest = max(timings, default=0)
+        self.stdout.write(self.style.SUCCESS(
+            f'{totals[0]:,} items alerted, {totals[1]:,} newly alerted in {elapsed:.2f}s '
+            f'(slowest range {slowest:.2f}s)'
+        ))
+
+    def record(self, result, totals, timings, options):
+        (first, last), alerted, generated, seconds = result
+        totals[0] += alerted
+        totals[1] += generated
+        timings.append(seconds)
+        if not options['quiet_chunks']:
+            last = 'end' if last == MAX_PK else last
+            self.stdout.write(f'  pk {first}-{last}: {alerted:,} alerted, {generated:,} new in {seconds:.3f}s')
@@ -0,0 +1,285 @@
+"""
+Process-local metrics shared across gunicorn workers through small files.
+
+Each process keeps its counters and histograms in memory and periodically
+writes a snapshot to ``METRICS_DIR/<pid>-<start>.json``. The /metrics view
+merges every snapshot in the directory and renders the Prometheus text
+exposition format, so no external collector or shared service is needed.
+
+When a worker exits, or /metrics finds that a snapshot's pid is gone, its
+counters and histograms are added to ``dead.json`` and the snapshot is
+removed, the way prometheus_client's mark_process_dead works. Its movement
+rate gauge is dropped with it.
+"""
+
+import atexit
+import glob
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+
+try:
+    import fcntl
+except ImportError:  # Windows, where only the single-process dev server runs
+    fcntl = None
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+RATE_WINDOW = 60
+ARCHIVE = 'dead.json'
+
+HELP = {
+    'inventory_request_duration_seconds': 'Request latency by view',
+    'inventory_request_db_seconds': 'Time spent in SQL per request, by view',
+    'inventory_cache_requests_total': 'Cache lookups by cache and result',
+    'inventory_stock_movements_total': 'Stock movements applied, by transaction type',
+    'inventory_stock_movements_per_second': f'Stock movements per second over the last {RATE_WINDOW}s',
+    'inventory_alert_sweep_duration_seconds': 'Duration of full alert sweeps',
+}
+
+
+class Registry:
+    """In-memory metrics for this process, snapshotted to METRICS_DIR"""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.counters = {}
+        self.histograms = {}
+        self.movement_seconds = deque()
+        self.started = int(time.time())
+        self.last_flush = 0.0
+
+    def inc(self, name, labels=None, amount=1):
+        key = (name, _freeze(labels))
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+        self._maybe_flush()
+
+    def observe(self, name, value, labels=None, buckets=DEFAULT_BUCKETS):
+        key = (name, _freeze(labels))
+        with self.lock:
+            hist = self.histograms.get(key)
+            if hist is None:
+                hist = self.histograms[key] = {'buckets': list(buckets), 'counts': [0] * len(buckets),
+                                               'sum': 0.0, 'count': 0}
+            index = bisect_left(hist['buckets'], value)
+            if index < len(hist['counts']):
+                hist['counts'][index] += 1
+            hist['sum'] += value
+            hist['count'] += 1
+        self._maybe_flush()
+
+    def mark_movement(self, amount=1):
+        now = int(time.time())
+        with self.lock:
+            if self.movement_seconds and self.movement_seconds[-1][0] == now:
+                self.movement_seconds[-1][1] += amount
+            else:
+                self.movement_seconds.append([now, amount])
+            while self.movement_seconds and self.movement_seconds[0][0] <= now - RATE_WINDOW:
+                self.movement_seconds.popleft()
+
+    def snapshot(self):
+        with self.lock:
+            return {
+                'counters': [[name, list(labels), value] for (name, labels), value in self.counters.items()],
+                'histograms': [[name, list(labels), dict(hist, counts=list(hist['counts']))]
+                               for (name, labels), hist in self.histograms.items()],
+                'movement_seconds': [list(entry) for entry in self.movement_seconds],
+            }
+
+    def path(self):
+        return os.path.join(str(settings.METRICS_DIR), f'{os.getpid()}-{self.started}.json')
+
+    def flush(self):
+        """Atomically replace this process's snapshot file"""
+        path = self.path()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp, 'w') as fh:
+            json.dump(self.snapshot(), fh)
+        os.replace(tmp, path)
+        self.last_flush = time.monotonic()
+
+    def retire(self):
+        """Fold this process's totals into the archive, on exit"""
+        if self.counters or self.histograms:
+            self.flush()
+            _retire(self.path())
+
+    def _maybe_flush(self):
+        if time.monotonic() - self.last_flush >= settings.METRICS_FLUSH_INTERVAL:
+            try:
+                self.flush()
+            except OSError:
+                pass  # metrics must never break a request
+
+
+def _freeze(labels):
+    return tuple(sorted((labels or {}).items()))
+
+
+registry = Registry()
+atexit.register(registry.retire)
+
+
+def observe_request(view, duration, db_time):
+    registry.observe('inventory_request_duration_seconds', duration, {'view': view})
+    registry.observe('inventory_request_db_seconds', db_time, {'view': view})
+
+
+def record_cache(cache, hit):
+    registry.inc('inventory_cache_requests_total', {'cache': cache, 'result': 'hit' if hit else 'miss'})
+
+
+def record_stock_movement(transaction_type, amount=1):
+    registry.mark_movement(amount)
+    registry.inc('inventory_stock_movements_total', {'type': transaction_type}, amount)
+
+
+def observe_alert_sweep(duration):
+    registry.observe('inventory_alert_sweep_duration_seconds', duration, buckets=(
+        0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0, 300.0
+    ))
+
+
+@contextmanager
+def _locked(exclusive=False):
+    """Keep snapshots from being retired while they are read"""
+    if fcntl is None:
+        yield
+        return
+    os.makedirs(str(settings.METRICS_DIR), exist_ok=True)
+    with open(os.path.join(str(settings.METRICS_DIR), '.lock'), 'a') as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        yield
+
+
+def _load(path):
+    try:
+        with open(path) as fh:
+            return json.load(fh)
+    except (OSError, ValueError):
+        return None
+
+
+def _merge(counters, histograms, data):
+    for name, labels, value in data['counters']:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        counters[key] = counters.get(key, 0) + value
+    for name, labels, hist in data['histograms']:
+        key = (name, tuple(tuple(pair) for pair in labels))
+        merged = histograms.get(key)
+        if merged is None or merged['buckets'] != hist['buckets']:
+            histograms[key] = merged = {'buckets': hist['buckets'], 'counts': [0] * len(hist['buckets']),
+                                        'sum': 0.0, 'count': 0}
+        merged['counts'] = [a + b for a, b in zip(merged['counts'], hist['counts'])]
+        merged['sum'] += hist['sum']
+        merged['count'] += hist['count']
+
+
+def _alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        return True  # exists, but belongs to someone else
+    return True
+
+
+def _retire(path):
+    """Add a worker's counters and histograms to the archive and remove its snapshot"""
+    archive = os.path.join(str(settings.METRICS_DIR), ARCHIVE)
+    try:
+        with _locked(exclusive=True):
+            data = _load(path)
+            if data is None:
+                return
+            counters, histograms = {}, {}
+            for source in (_load(archive), data):
+                if source:
+                    _merge(counters, histograms, source)
+            tmp = f'{archive}.{os.getpid()}.tmp'
+            with open(tmp, 'w') as fh:
+                json.dump({
+                    'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+                    'histograms': [[name, list(labels), hist] for (name, labels), hist in histograms.items()],
+                }, fh)
+            os.replace(tmp, archive)
+            os.remove(path)
+    except OSError:
+        pass  # left for the next collect()
+
+
+def collect():
+    """Merge the snapshots of every worker that has written one"""
+    registry.flush()
+    pattern = os.path.join(str(settings.METRICS_DIR), '*.json')
+    for path in glob.glob(pattern):
+        pid = os.path.basename(path).split('-')[0]
+        if pid.isdigit() and not _alive(int(pid)):
+            _retire(path)
+
+    counters = {}
+    histograms = {}
+    movements = 0
+    horizon = time.time() - RATE_WINDOW
+    with _locked():
+        for path in glob.glob(pattern):
+            data = _load(path)
+            if data is None:
+                continue
+            _merge(counters, histograms, data)
+            movements += sum(count for second, count in data.get('movement_seconds', []) if second > horizon)
+    return counters, histograms, movements / RATE_WINDOW
+
+
+def render():
+    """Prometheus text exposition of the merged metrics"""
+    counters, histograms, movement_rate = collect()
+    lines = []
+    seen = set()
+
+    def header(name, kind):
+        if name not in seen:
+            seen.add(name)
+            lines.append(f'# HELP {name} {HELP.get(name, name)}')
+            lines.append(f'# TYPE {name} {kind}')
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name, 'counter')
+        lines.append(f'{name}{_labels(labels)} {_number(value)}')
+
+    for (name, labels), hist in sorted(histograms.items()):
+        header(name, 'histogram')
+        cumulative = 0
+        for bound, count in zip(hist['buckets'], hist['counts']):
+            cumulative += count
+            lines.append(f'{name}_bucket{_labels(labels + (("le", _number(bound)),))} {cumulative}')
+        lines.append(f'{name}_bucket{_labels(labels + (("le", "+Inf"),))} {hist["count"]}')
+        lines.append(f'{name}_sum{_labels(labels)} {_number(hist["sum"])}')
+        lines.append(f'{name}_count{_labels(labels)} {hist["count"]}')
+
+    header('inventory_stock_movements_per_second', 'gauge')
+    lines.append(f'inventory_stock_movements_per_second {_number(movement_rate)}')
+    return '\n'.join(lines) + '\n'
+
+
+def _labels(labels):
+    if not labels:
+        return ''
+    body = ','.join(
+        '{}="{}"'.format(key, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for key, value in labels
+    )
+    return '{' + body + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
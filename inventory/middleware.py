@@ -0,0 +1,166 @@
+import hashlib
+import json
+import logging
+import re
+import time
+from collections import Counter
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.db import connections
+
+from . import metrics
+
+logger = logging.getLogger('inventory.sql')
+
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r'\b\d+(?:\.\d+)?\b')
+_IN_LIST = re.compile(r'\bIN\s*\((?:\s*(?:%s|\?)\s*,?)+\)', re.IGNORECASE)
+_WHITESPACE = re.compile(r'\s+')
+
+
+class QueryBudgetExceeded(AssertionError):
+    """Raised in strict mode when a view runs more queries than its budget"""
+
+
+def fingerprint(sql):
+    """Normalize SQL so repeats of the same statement with different values match"""
+    sql = _STRING_LITERAL.sub('?', sql)
+    sql = _NUMBER_LITERAL.sub('?', sql)
+    sql = _IN_LIST.sub('IN (...)', sql)
+    return _WHITESPACE.sub(' ', sql).strip()
+
+
+class QueryStats:
+    """Execute wrapper collecting per-request SQL statistics.
+    
+    Rows are those fetched from result sets plus those written by
+    statements that return none. Drivers report a rowcount of -1 or 0 for
+    SELECTs, so reads are counted as they are fetched.
+    """
+
+    def __init__(self):
+        self.count = 0
+        self.time = 0.0
+        self.rows = 0
+        self.fingerprints = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        cursor = context.get('cursor')
+        self._count_fetches(cursor)
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.time += time.perf_counter() - started
+            self.count += 1
+            self.fingerprints[fingerprint(sql)] += 1
+            if getattr(cursor, 'description', None) is None:
+                rowcount = getattr(cursor, 'rowcount', -1)
+                if rowcount and rowcount > 0:
+                    self.rows += rowcount
+
+    def _count_fetches(self, cursor):
+        """Wrap the fetch methods of Django's cursor wrapper to count the rows they return"""
+        if cursor is None or getattr(cursor, '_sql_stats', None) is self:
+            return
+        cursor._sql_stats = self
+
+        def counting(fetch, single):
+            def counted(*args, **kwargs):
+                result = fetch(*args, **kwargs)
+                self.rows += (result is not None) if single else len(result)
+                return result
+            return counted
+
+        for name in ('fetchone', 'fetchmany', 'fetchall'):
+            setattr(cursor, name, counting(getattr(cursor, name), name == 'fetchone'))
+
+    @property
+    def duplicates(self):
+        """Fingerprints executed more than once, most repeated first"""
+        return [(sql, n) for sql, n in self.fingerprints.most_common() if n > 1]
+
+    def as_dict(self):
+        return {
+            'queries': self.count,
+            'sql_ms': round(self.time * 1000, 2),
+            'rows': self.rows,
+            'duplicates': [
+                {'fingerprint': hashlib.sha1(sql.encode()).hexdigest()[:10], 'count': n, 'sql': sql[:200]}
+                for sql, n in self.duplicates
+            ],
+        }
+
+
+class QueryBudgetMiddleware:
+    """
+    Record query count, SQL time, rows and repeated statements for every request.
+
+    Staff users (or any user when DEBUG is on) get the numbers as X-SQL-* response
+    headers; otherwise they are written as one JSON log line on the inventory.sql
+    logger. Views listed in SQL_QUERY_BUDGETS that exceed their budget are logged
+    as warnings, or raise QueryBudgetExceeded when SQL_BUDGET_STRICT is on.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats()
+        request.sql_stats = stats
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(stats))
+            response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        url_name = match.view_name if match else None
+        report = {
+            'url_name': url_name,
+            'view': match._func_path if match else None,
+            'path': request.path,
+            'method': request.method,
+            'status': response.status_code,
+            **stats.as_dict(),
+        }
+
+        budget = settings.SQL_QUERY_BUDGETS.get(url_name, settings.SQL_QUERY_BUDGET_DEFAULT)
+        if budget is not None and stats.count > budget:
+            message = f'{url_name or request.path} ran {stats.count} queries (budget {budget})'
+            if settings.SQL_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message + f'; repeated: {report["duplicates"]}')
+            logger.warning('%s %s', message, json.dumps(report))
+
+        user = getattr(request, 'user', None)
+        if settings.DEBUG or (user is not None and user.is_staff):
+            response['X-SQL-Queries'] = str(stats.count)
+            response['X-SQL-Time-Ms'] = f'{stats.time * 1000:.2f}'
+            response['X-SQL-Rows'] = str(stats.rows)
+            response['X-SQL-Duplicates'] = ','.join(
+                f'{d["fingerprint"]}x{d["count"]}' for d in report['duplicates']
+            ) or '-'
+            if budget is not None:
+                response['X-SQL-Budget'] = str(budget)
+        else:
+            logger.info(json.dumps(report))
+        return response
+
+
+class MetricsMiddleware:
+    """Feed per-view latency and SQL time into the metrics registry"""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+        match = getattr(request, 'resolver_match', None)
+        stats = getattr(request, 'sql_stats', None)
+        metrics.observe_request(
+            match.view_name if match else 'unresolved',
+            time.perf_counter() - started,
+            stats.time if stats else 0.0,
+        )
+        return response
@@ -0,0 +1,56 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:51
+
+import django.core.validators
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0002_item_category_item_reorder_level_item_supplier_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterModelOptions(
+            name='item',
+            options={'ordering': ['name'], 'verbose_name': 'Inventory Item', 'verbose_name_plural': 'Inventory Items'},
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='stripe_count',
+            field=models.PositiveSmallIntegerField(default=0, help_text='Number of stock counter stripes for hot items (0 disables striping)'),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='name',
+            field=models.CharField(max_length=200, unique=True),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='price',
+            field=models.DecimalField(decimal_places=2, max_digits=10, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='quantity',
+            field=models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='reorder_level',
+            field=models.IntegerField(default=10, help_text='Minimum stock level before reordering', validators=[django.core.validators.MinValueValidator(0)]),
+        ),
+        migrations.CreateModel(
+            name='StockStripe',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('stripe', models.PositiveSmallIntegerField()),
+                ('quantity', models.IntegerField(default=0, validators=[django.core.validators.MinValueValidator(0)])),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='stripes', to='inventory.item')),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('item', 'stripe'), name='unique_item_stripe')],
+            },
+        ),
+    ]
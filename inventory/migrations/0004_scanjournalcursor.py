@@ -0,0 +1,22 @@
+# Generated by Django 5.2.1 on 2026-10-19 12:53
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0003_stockstripe'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScanJournalCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('journal', models.CharField(max_length=64, unique=True)),
+                ('applied_seq', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.1 on 2026-10-19 14:02
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0007_lease'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertRule',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('category', models.CharField(blank=True, default='', help_text='Leave blank with no item for the global rule', max_length=100)),
+                ('min_quantity', models.PositiveIntegerField(blank=True, help_text='Raise LOW_STOCK at or below this quantity', null=True)),
+                ('max_quantity', models.PositiveIntegerField(blank=True, help_text='Raise OVERSTOCK above this quantity', null=True)),
+                ('days_of_cover', models.PositiveSmallIntegerField(blank=True, help_text='Raise LOW_STOCK when stock would last fewer days at the recent OUT rate', null=True)),
+                ('is_active', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('item', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alert_rules', to='inventory.item')),
+            ],
+            options={
+                'ordering': ['category', 'item__name'],
+                'constraints': [models.UniqueConstraint(condition=models.Q(('item__isnull', False)), fields=('item',), name='unique_item_alert_rule'), models.UniqueConstraint(condition=models.Q(('item__isnull', True)), fields=('category',), name='unique_category_alert_rule')],
+            },
+        ),
+    ]
@@ -0,0 +1,39 @@
+# Generated by Django 5.2.1 on 2026-10-19 14:06
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0008_alertrule'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DigestCursor',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('recipient', models.EmailField(max_length=254, unique=True)),
+                ('last_notification_id', models.BigIntegerField(default=0)),
+                ('last_sent_at', models.DateTimeField(blank=True, null=True)),
+                ('failures', models.PositiveIntegerField(default=0, help_text='Consecutive failed sends')),
+                ('last_error', models.TextField(blank=True, default='')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='AlertNotification',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alert_type', models.CharField(choices=[('LOW_STOCK', 'Low Stock'), ('OUT_OF_STOCK', 'Out of Stock'), ('OVERSTOCK', 'Overstock')], max_length=20)),
+                ('message', models.TextField()),
+                ('created_at', models.DateTimeField(default=django.utils.timezone.now)),
+                ('item', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alert_notifications', to='inventory.item')),
+            ],
+            options={
+                'ordering': ['pk'],
+            },
+        ),
+    ]
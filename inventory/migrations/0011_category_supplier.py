@@ -0,0 +1,192 @@
+import django.db.models.deletion
+import django.db.models.functions.text
+from collections import Counter, defaultdict
+
+from django.db import migrations, models
+from django.db.models import Count
+from django.db.models.functions import Coalesce
+
+
+def _normalize(name):
+    return ' '.join(name.split())
+
+
+def _canonical_names(counts):
+    """{spelling: canonical name} from {spelling: rows using it}.
+
+    Spellings that only differ in case or spacing are one name, written the
+    way most rows spell it (ties go to the alphabetically first spelling).
+    """
+    groups = defaultdict(Counter)
+    for spelling, count in counts.items():
+        groups[_normalize(spelling).casefold()][_normalize(spelling)] += count
+    canonical = {}
+    for spelling in counts:
+        variants = groups[_normalize(spelling).casefold()]
+        canonical[spelling] = min(variants, key=lambda name: (-variants[name], name))
+    return canonical
+
+
+def _dimension_ids(model, counts):
+    canonical = _canonical_names(counts)
+    ids = {name: model.objects.create(name=name).pk for name in sorted(set(canonical.values()))}
+    return {spelling: ids[name] for spelling, name in canonical.items()}
+
+
+def split_dimensions(apps, schema_editor):
+    Item = apps.get_model('inventory', 'Item')
+    AlertRule = apps.get_model('inventory', 'AlertRule')
+    Category = apps.get_model('inventory', 'Category')
+    Supplier = apps.get_model('inventory', 'Supplier')
+
+    Item.objects.filter(category__regex=r'^\s*$').update(category='General')
+    categories = Counter(dict(Item.objects.values_list('category').annotate(rows=Count('pk'))))
+    for spelling in AlertRule.objects.exclude(category='').values_list('category', flat=True):
+        categories[spelling] += 0
+    category_ids = _dimension_ids(Category, categories)
+    for spelling, pk in category_ids.items():
+        Item.objects.filter(category=spelling).update(category_ref=pk)
+
+    suppliers = Item.objects.exclude(supplier__isnull=True).exclude(supplier__regex=r'^\s*$')
+    supplier_ids = _dimension_ids(Supplier, dict(suppliers.values_list('supplier').annotate(rows=Count('pk'))))
+    for spelling, pk in supplier_ids.items():
+        Item.objects.filter(supplier=spelling).update(supplier_ref=pk)
+
+    # Category rules that now name the same category are merged into the oldest one
+    kept = {}
+    for rule in AlertRule.objects.filter(item__isnull=True).order_by('pk'):
+        pk = category_ids.get(rule.category)
+        if pk in kept:
+            first = kept[pk]
+            for threshold in ('min_quantity', 'max_quantity', 'days_of_cover'):
+                if getattr(first, threshold) is None:
+                    setattr(first, threshold, getattr(rule, threshold))
+            first.save()
+            rule.delete()
+        else:
+            kept[pk] = rule
+            rule.category_ref_id = pk
+            rule.save()
+
+
+def join_dimensions(apps, schema_editor):
+    Item = apps.get_model('inventory', 'Item')
+    AlertRule = apps.get_model('inventory', 'AlertRule')
+    for category_id, name in apps.get_model('inventory', 'Category').objects.values_list('pk', 'name'):
+        Item.objects.filter(category_ref=category_id).update(category=name)
+        AlertRule.objects.filter(category_ref=category_id).update(category=name)
+    for supplier_id, name in apps.get_model('inventory', 'Supplier').objects.values_list('pk', 'name'):
+        Item.objects.filter(supplier_ref=supplier_id).update(supplier=name)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0010_change_feed'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Category',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+            ],
+            options={
+                'verbose_name_plural': 'categories',
+                'ordering': ['name'],
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(django.db.models.functions.text.Lower('name'), name='unique_category_name')],
+            },
+        ),
+        migrations.CreateModel(
+            name='Supplier',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=200)),
+            ],
+            options={
+                'ordering': ['name'],
+                'abstract': False,
+                'constraints': [models.UniqueConstraint(django.db.models.functions.text.Lower('name'), name='unique_supplier_name')],
+            },
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='category_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='inventory.category'),
+        ),
+        migrations.AddField(
+            model_name='item',
+            name='supplier_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.PROTECT, related_name='+', to='inventory.supplier'),
+        ),
+        migrations.AddField(
+            model_name='alertrule',
+            name='category_ref',
+            field=models.ForeignKey(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventory.category'),
+        ),
+        migrations.RunPython(split_dimensions, join_dimensions),
+        migrations.RemoveConstraint(
+            model_name='alertrule',
+            name='unique_category_alert_rule',
+        ),
+        migrations.AlterModelOptions(
+            name='alertrule',
+            options={'ordering': ['category_ref__name', 'item__name']},
+        ),
+        migrations.RemoveField(
+            model_name='item',
+            name='category',
+        ),
+        migrations.RemoveField(
+            model_name='item',
+            name='supplier',
+        ),
+        migrations.RemoveField(
+            model_name='alertrule',
+            name='category',
+        ),
+        migrations.RenameField(
+            model_name='item',
+            old_name='category_ref',
+            new_name='category',
+        ),
+        migrations.RenameField(
+            model_name='item',
+            old_name='supplier_ref',
+            new_name='supplier',
+        ),
+        migrations.RenameField(
+            model_name='alertrule',
+            old_name='category_ref',
+            new_name='category',
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='category',
+            field=models.ForeignKey(db_index=False, help_text='Item category', on_delete=django.db.models.deletion.PROTECT, related_name='items', to='inventory.category'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['category', 'quantity', 'price'], name='item_category_totals_idx'),
+        ),
+        migrations.AlterField(
+            model_name='item',
+            name='supplier',
+            field=models.ForeignKey(blank=True, help_text='Supplier', null=True, on_delete=django.db.models.deletion.PROTECT, related_name='items', to='inventory.supplier'),
+        ),
+        migrations.AlterField(
+            model_name='alertrule',
+            name='category',
+            field=models.ForeignKey(blank=True, help_text='Leave blank with no item for the global rule', null=True, on_delete=django.db.models.deletion.CASCADE, related_name='alert_rules', to='inventory.category'),
+        ),
+        migrations.AlterModelOptions(
+            name='alertrule',
+            options={'ordering': ['category__name', 'item__name']},
+        ),
+        migrations.AddConstraint(
+            model_name='alertrule',
+            constraint=models.UniqueConstraint(Coalesce('category', models.Value(0)), condition=models.Q(('item__isnull', True)), name='unique_category_alert_rule'),
+        ),
+    ]
@@ -0,0 +1,49 @@
+# Generated by Django 5.2.1 on 2026-10-19 14:33
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0011_category_supplier'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='inventorytransaction',
+            name='item',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transactions', to='inventory.item'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryalert',
+            index=models.Index(fields=['-created_at'], name='alert_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryalert',
+            index=models.Index(condition=models.Q(('is_resolved', False)), fields=['-created_at'], name='alert_open_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventoryalert',
+            index=models.Index(condition=models.Q(('is_resolved', False)), fields=['item', 'alert_type'], name='alert_open_item_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorytransaction',
+            index=models.Index(fields=['-timestamp'], name='transaction_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='inventorytransaction',
+            index=models.Index(fields=['item', '-timestamp'], name='transaction_item_recent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(fields=['quantity', 'reorder_level'], name='item_stock_level_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='item',
+            index=models.Index(condition=models.Q(('quantity__lte', models.F('reorder_level'))), fields=['name'], name='item_low_stock_idx'),
+        ),
+    ]
@@ -0,0 +1,95 @@
+import django.db.models.deletion
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+from django.db.models import F, Max, Min
+
+TABLE = 'inventory_inventorytransaction'
+
+
+def sign_movements(apps, schema_editor):
+    # An adjustment's direction was never stored, so those stay empty
+    InventoryTransaction = apps.get_model('inventory', 'InventoryTransaction')
+    InventoryTransaction.objects.filter(transaction_type='IN').update(quantity_change=F('quantity'))
+    InventoryTransaction.objects.filter(transaction_type='OUT').update(quantity_change=-F('quantity'))
+
+
+def _months(first, last):
+    start = datetime(first.year, first.month, 1, tzinfo=timezone.utc)
+    while start <= last:
+        end = datetime(start.year + start.month // 12, start.month % 12 + 1, 1, tzinfo=timezone.utc)
+        yield start, end
+        start = end
+
+
+def partition_ledger(apps, schema_editor):
+    """Rebuild the ledger as a table partitioned by month on timestamp (PostgreSQL only).
+
+    The primary key becomes (id, timestamp), as a partitioned table's keys
+    must include the partition column; ids still come from one sequence.
+    """
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    InventoryTransaction = apps.get_model('inventory', 'InventoryTransaction')
+    execute = schema_editor.execute
+    now = datetime.now(timezone.utc)
+    bounds = InventoryTransaction.objects.aggregate(first=Min('timestamp'), last=Max('timestamp'), id=Max('pk'))
+
+    execute(f'ALTER TABLE {TABLE} RENAME TO {TABLE}_unpartitioned')
+    execute(f'CREATE SEQUENCE {TABLE}_ledger_id_seq')
+    execute(f'CREATE TABLE {TABLE} (LIKE {TABLE}_unpartitioned INCLUDING DEFAULTS) PARTITION BY RANGE ("timestamp")')
+    execute(f"ALTER TABLE {TABLE} ALTER COLUMN id SET DEFAULT nextval('{TABLE}_ledger_id_seq')")
+    execute(f'ALTER SEQUENCE {TABLE}_ledger_id_seq OWNED BY {TABLE}.id')
+    execute(f'ALTER TABLE {TABLE} ADD PRIMARY KEY (id, "timestamp")')
+    for start, end in _months(bounds['first'] or now, max(bounds['last'] or now, now)):
+        execute(
+            f'CREATE TABLE {TABLE}_p{start:%Y%m} PARTITION OF {TABLE} '
+            f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+        )
+    execute(f'CREATE TABLE {TABLE}_default PARTITION OF {TABLE} DEFAULT')
+    execute(f'INSERT INTO {TABLE} SELECT * FROM {TABLE}_unpartitioned')
+    execute(f"SELECT setval('{TABLE}_ledger_id_seq', %s, false)", [(bounds['id'] or 0) + 1])
+    execute(f'DROP TABLE {TABLE}_unpartitioned')
+
+    # Indexes and foreign keys under the names Django gave them
+    for field_name in ('item', 'user'):
+        field = InventoryTransaction._meta.get_field(field_name)
+        execute(schema_editor._create_fk_sql(InventoryTransaction, field, '_fk_%(to_table)s_%(to_column)s'))
+    execute(schema_editor._create_index_sql(InventoryTransaction, fields=[InventoryTransaction._meta.get_field('user')]))
+    for index in InventoryTransaction._meta.indexes:
+        schema_editor.add_index(InventoryTransaction, index)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0012_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='inventorytransaction',
+            name='quantity_change',
+            field=models.IntegerField(blank=True, help_text='Signed change to stock', null=True),
+        ),
+        migrations.RunPython(sign_movements, migrations.RunPython.noop),
+        migrations.CreateModel(
+            name='TransactionRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField(help_text='UTC day the movements were recorded on')),
+                ('transaction_type', models.CharField(choices=[('IN', 'Stock In'), ('OUT', 'Stock Out'), ('ADJUST', 'Adjustment')], max_length=10)),
+                ('movements', models.PositiveIntegerField(help_text='Ledger rows rolled into this one')),
+                ('quantity', models.IntegerField(help_text='Sum of the movement quantities')),
+                ('quantity_change', models.IntegerField(help_text='Net signed change to stock')),
+                ('item', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='transaction_rollups', to='inventory.item')),
+            ],
+            options={
+                'ordering': ['-day'],
+                'indexes': [models.Index(fields=['-day'], name='rollup_recent_idx')],
+                'constraints': [models.UniqueConstraint(fields=('item', 'day', 'transaction_type'), name='unique_transaction_rollup')],
+            },
+        ),
+        # The partitioned table has the same columns, so going back needs no rebuild
+        migrations.RunPython(partition_ledger, migrations.RunPython.noop),
+    ]
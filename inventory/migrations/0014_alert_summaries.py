@@ -0,0 +1,40 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import F
+
+
+def stamp_resolved(apps, schema_editor):
+    # Compaction goes by resolved_at; alerts resolved without one count from when they were raised
+    InventoryAlert = apps.get_model('inventory', 'InventoryAlert')
+    InventoryAlert.objects.filter(is_resolved=True, resolved_at__isnull=True).update(resolved_at=F('created_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0013_ledger_rollups'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AlertSummary',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('alert_type', models.CharField(choices=[('LOW_STOCK', 'Low Stock'), ('OUT_OF_STOCK', 'Out of Stock'), ('OVERSTOCK', 'Overstock')], max_length=20)),
+                ('resolved_count', models.PositiveIntegerField(help_text='Resolved alerts compacted into this row')),
+                ('first_created_at', models.DateTimeField(help_text='When the earliest of them was raised')),
+                ('last_resolved_at', models.DateTimeField(help_text='When the latest of them was resolved')),
+                ('item', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='alert_summaries', to='inventory.item')),
+            ],
+            options={
+                'verbose_name_plural': 'alert summaries',
+                'ordering': ['item__name', 'alert_type'],
+                'constraints': [models.UniqueConstraint(fields=('item', 'alert_type'), name='unique_alert_summary')],
+            },
+        ),
+        migrations.RunPython(stamp_resolved, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='inventoryalert',
+            index=models.Index(condition=models.Q(('is_resolved', True)), fields=['resolved_at'], name='alert_resolved_idx'),
+        ),
+    ]
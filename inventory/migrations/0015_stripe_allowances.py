@@ -0,0 +1,33 @@
+from django.db import migrations, models
+from django.db.models import F, Sum
+
+
+def fold_shares(apps, schema_editor):
+    # Stripes used to hold stock taken out of the item row; put it back, so the row holds all of it
+    Item = apps.get_model('inventory', 'Item')
+    StockStripe = apps.get_model('inventory', 'StockStripe')
+    held = StockStripe.objects.exclude(quantity=0).values('item_id').annotate(total=Sum('quantity'))
+    for row in held:
+        Item.objects.filter(pk=row['item_id']).update(quantity=F('quantity') + row['total'])
+    StockStripe.objects.update(quantity=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventory', '0014_alert_summaries'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockstripe',
+            name='quantity',
+            field=models.IntegerField(default=0, help_text='Net movement since the last fold'),
+        ),
+        migrations.AddField(
+            model_name='stockstripe',
+            name='allowance',
+            field=models.PositiveIntegerField(default=0, help_text='Stock this stripe may take out of the item row'),
+        ),
+        migrations.RunPython(fold_shares, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,114 @@
-from django.db import models
+import random
+import time
+
+from django.conf import settings
+from django.db import models, transaction
+from django.db.models import F, Sum
+from django.db.models.functions import Coalesce, Lower
 from django.contrib.auth.models import User
 from django.utils import timezone
+from django.core.exceptions import ValidationError
 from django.core.validators import MinValueValidator
 from django.urls import reverse
 
+from . import alert_rules, change_feed, fragments, item_cache, metrics
+
 # Create your models here.
 
-class Item(models.Model):
+# Folds an item's counter stripes back into its quantity (see Item._update_striped_stock)
+STRIPE_COMPACT_JOB = 'compact_stock_stripes'
+
+class SavesAtomically:
+    """Runs save() in a transaction, so the change feed event written by the
+    post_save receiver commits or rolls back with the row (see inventory.change_feed)"""
+    
+    def save(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            super().save(*args, **kwargs)
+
+
+class FeedsDeletes:
+    """Records the change feed event of a single-row delete() (see inventory.change_feed).
+
+    A post_delete receiver would also catch cascades and queryset deletes,
+    but it would stop Django fast-deleting these rows there. Those deletes
+    are covered by the item's delete event or by change_feed.record_rows().
+    """
+    feed_topic = None
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic(savepoint=False):
+            pk = self.pk
+            deleted = super().delete(*args, **kwargs)
+            change_feed.record(self.feed_topic, change_feed.DELETE, pk, self.item_id)
+        return deleted
+
+
+def normalize_name(name):
+    """Trim a dimension name and collapse runs of whitespace"""
+    return ' '.join(name.split())
+
+
+class DimensionQuerySet(models.QuerySet):
+    def resolve(self, name):
+        """The row called `name`, ignoring case and spacing; created if there is none"""
+        name = normalize_name(name)
+        return self.get_or_create(name__iexact=name, defaults={'name': name})[0]
+
+
+class Dimension(models.Model):
+    """A name items are grouped by, stored once and referenced by integer key.
+    
+    Names are unique regardless of case, so "tools" and "Tools " resolve to
+    the same row. Renaming one touches every item that shows it, for the same
+    cache and change feed bookkeeping as editing the items themselves.
+    """
+    name = models.CharField(max_length=200)
+    
+    objects = DimensionQuerySet.as_manager()
+    
+    def __str__(self):
+        return self.name
+    
+    def save(self, *args, **kwargs):
+        self.name = normalize_name(self.name)
+        with transaction.atomic(savepoint=False):
+            renamed = self.pk is not None and type(self).objects.filter(pk=self.pk).exclude(name=self.name).exists()
+            super().save(*args, **kwargs)
+            if renamed:
+                self._touch_items()
+    
+    def _touch_items(self):
+        items = self.items.all()
+        pks = list(items.values_list('pk', flat=True))
+        if not pks:
+            return
+        items.update(updated_at=timezone.now())
+        change_feed.record_rows(change_feed.ITEM, change_feed.UPDATE, items, item='pk')
+        fragments.invalidate_categories(*items.values_list('category', flat=True).distinct())
+        item_cache.invalidate(*pks)
+    
+    class Meta:
+        abstract = True
+        ordering = ['name']
+
+
+class Category(Dimension):
+    class Meta(Dimension.Meta):
+        verbose_name_plural = 'categories'
+        constraints = [
+            models.UniqueConstraint(Lower('name'), name='unique_category_name'),
+        ]
+
+
+class Supplier(Dimension):
+    class Meta(Dimension.Meta):
+        constraints = [
+            models.UniqueConstraint(Lower('name'), name='unique_supplier_name'),
+        ]
+
+
+class Item(SavesAtomically, models.Model):
     name = models.CharField(max_length=200, unique=True)
     quantity = models.IntegerField(default=0, validators=[MinValueValidator(0)])
     price = models.DecimalField(max_digits=10, decimal_places=2, validators=[MinValueValidator(0)])
@@ -14,12 +116,26 @@ class Item(models.Model):
     updated_at = models.DateTimeField(auto_now=True)
       # Analytics fields
     reorder_level = models.IntegerField(default=10, validators=[MinValueValidator(0)], help_text="Minimum stock level before reordering")
-    category = models.CharField(max_length=100, default='General', help_text="Item category")
-    supplier = models.CharField(max_length=200, blank=True, null=True, help_text="Supplier name")
+    # Indexed by the category totals index in Meta, which leads with category
+    category = models.ForeignKey(
+        Category, on_delete=models.PROTECT, db_index=False, related_name='items', help_text="Item category"
+    )
+    supplier = models.ForeignKey(
+        Supplier, on_delete=models.PROTECT, null=True, blank=True, related_name='items', help_text="Supplier"
+    )
+    # Hot item tuning
+    stripe_count = models.PositiveSmallIntegerField(default=0, help_text="Number of stock counter stripes for hot items (0 disables striping)")
+    
+    DEFAULT_CATEGORY = 'General'
     
     def __str__(self):
         return self.name
     
+    def save(self, *args, **kwargs):
+        if self.category_id is None:
+            self.category = Category.objects.resolve(self.DEFAULT_CATEGORY)
+        super().save(*args, **kwargs)
+    
     def get_absolute_url(self):
         """Get URL for item detail view"""
         from django.urls import reverse
@@ -50,63 +166,226 @@ class Item(models.Model):
         else:
             return 'In Stock'
     
+    @property
+    def available_quantity(self):
+        """Stock on hand including any balance held in counter stripes"""
+        held = self.stripes.aggregate(total=Sum('quantity'))['total'] or 0
+        return self.quantity + held
+    
     def update_stock(self, quantity_change, transaction_type, reason="", user=None):
         """Update stock and create transaction record"""
-        old_quantity = self.quantity
-        self.quantity += quantity_change
-        if self.quantity < 0:
+        if self.stripe_count:
+            return self._update_striped_stock(quantity_change, transaction_type, reason, user)
+        
+        with transaction.atomic():
+            # Lock the row so concurrent movements cannot drive stock negative
+            locked = Item.objects.select_for_update(no_key=True).only('quantity').get(pk=self.pk)
+            new_quantity = locked.quantity + quantity_change
+            if new_quantity < 0:
+                raise ValueError("Stock cannot be negative")
+            self._record_stock(new_quantity, quantity_change, transaction_type, reason, user)
+        
+        metrics.record_stock_movement(transaction_type)
+        return self.quantity
+    
+    def adjust_stock(self, new_quantity, reason="", user=None):
+        """Set stock on hand to `new_quantity`, recording the difference as an ADJUST movement.
+        
+        The difference is taken under the item row lock, against the row and
+        every counter stripe (which are folded back into the row first).
+        """
+        if new_quantity < 0:
             raise ValueError("Stock cannot be negative")
-        self.save()
+        with transaction.atomic():
+            locked = Item.objects.select_for_update(no_key=True).only('quantity').get(pk=self.pk)
+            on_hand = locked.quantity + locked._fold_stripes()
+            self._record_stock(new_quantity, new_quantity - on_hand, 'ADJUST', reason, user)
+            self._share_stripes()
+        
+        metrics.record_stock_movement('ADJUST')
+        return self.quantity
+    
+    def _record_stock(self, new_quantity, quantity_change, transaction_type, reason, user):
+        """Write the new quantity, its transaction record and alerts; the row lock must be held"""
+        self.quantity = new_quantity
+        self.save(update_fields=['quantity', 'updated_at'])
         
         # Create transaction record
         InventoryTransaction.objects.create(
             item=self,
             transaction_type=transaction_type,
             quantity=abs(quantity_change),
+            quantity_change=quantity_change,
             reason=reason,
             user=user
         )
         
         # Check for alerts
         self.check_and_create_alerts()
+    
+    def _update_striped_stock(self, quantity_change, transaction_type, reason, user):
+        """Apply a movement to one counter stripe instead of the item row.
         
+        Item.quantity keeps the stock as of the last fold, and each stripe
+        holds the net movement applied to it since then. A stripe may go down
+        to minus its allowance, a share of that stock handed out at the fold,
+        so the stripes can never take out more than the item row holds. A
+        movement its stripe cannot take runs the slow path instead, in its own
+        transaction, so the item row is always locked before any stripe row.
+        Alerts are evaluated when stripes are folded, by a compaction job
+        queued STRIPE_COMPACT_DELAY seconds on.
+        """
+        stripe = random.randrange(self.stripe_count)
+        stripes = StockStripe.objects.filter(item=self, stripe=stripe)
+        
+        with transaction.atomic():
+            if quantity_change < 0:
+                stripes = stripes.filter(quantity__gte=F('allowance') * -1 - quantity_change)
+            applied = stripes.update(quantity=F('quantity') + quantity_change)
+            if applied:
+                InventoryTransaction.objects.create(
+                    item=self,
+                    transaction_type=transaction_type,
+                    quantity=abs(quantity_change),
+                    quantity_change=quantity_change,
+                    reason=reason,
+                    user=user
+                )
+                transaction.on_commit(self._schedule_compaction)
+        if not applied:
+            return self._rebalance_stripes(quantity_change, transaction_type, reason, user)
+        
+        metrics.record_stock_movement(transaction_type)
+        return self.available_quantity
+    
+    def _schedule_compaction(self):
+        """Queue a compaction of this item's stripes, unless one is already queued for the same slot"""
+        from . import jobs  # jobs imports this module
+        
+        # Runs are aligned to STRIPE_COMPACT_DELAY slots. A job that is already
+        # running belongs to an earlier slot, so movements it may have missed
+        # always queue another.
+        now = time.time()
+        slot = int(now // settings.STRIPE_COMPACT_DELAY) + 1
+        jobs.enqueue(STRIPE_COMPACT_JOB, {'item_id': self.pk}, dedupe_key=f'{STRIPE_COMPACT_JOB}:{self.pk}:{slot}',
+                     delay=slot * settings.STRIPE_COMPACT_DELAY - now)
+    
+    def _rebalance_stripes(self, quantity_change, transaction_type, reason, user):
+        """Slow path: fold the stripes into the item row, apply the change there and share the stock out again"""
+        with transaction.atomic():
+            locked = Item.objects.select_for_update(no_key=True).only('quantity').get(pk=self.pk)
+            new_quantity = locked.quantity + locked._fold_stripes() + quantity_change
+            if new_quantity < 0:
+                raise ValueError("Stock cannot be negative")
+            self._record_stock(new_quantity, quantity_change, transaction_type, reason, user)
+            self._share_stripes()
+        
+        metrics.record_stock_movement(transaction_type)
         return self.quantity
     
+    def _fold_stripes(self):
+        """Zero every stripe of this item, withdraw their allowances and return their net movement.
+        
+        Must be called inside a transaction holding the item row lock.
+        """
+        stripes = list(
+            StockStripe.objects.select_for_update().filter(item=self).exclude(quantity=0, allowance=0)
+        )
+        if not stripes:
+            return 0
+        StockStripe.objects.filter(pk__in=[s.pk for s in stripes]).update(quantity=0, allowance=0)
+        return sum(s.quantity for s in stripes)
+    
+    def _share_stripes(self):
+        """Hand each stripe an equal allowance out of self.quantity; the item row lock must be held"""
+        share = self.quantity // self.stripe_count if self.stripe_count else 0
+        if not share:
+            return
+        StockStripe.objects.bulk_create(
+            [StockStripe(item=self, stripe=stripe) for stripe in range(self.stripe_count)], ignore_conflicts=True,
+        )
+        StockStripe.objects.filter(item=self, stripe__lt=self.stripe_count).update(allowance=share)
+    
+    def compact_stripes(self):
+        """Fold counter stripes back into quantity and refresh alerts; returns the net movement folded"""
+        with transaction.atomic():
+            locked = Item.objects.select_for_update(no_key=True).get(pk=self.pk)
+            folded = locked._fold_stripes()
+            if folded:
+                locked.quantity += folded
+                locked.save(update_fields=['quantity', 'updated_at'])
+            locked._share_stripes()
+            self.quantity = locked.quantity
+            self.check_and_create_alerts()
+        return folded
+    
     def check_and_create_alerts(self):
-        """Check stock levels and create alerts if needed"""
-        # Remove existing unresolved alerts for this item
-        InventoryAlert.objects.filter(item=self, is_resolved=False).delete()
+        """Re-evaluate the alert rules for this item, replacing its unresolved alerts"""
+        alert_rules.replace_alerts(Item.objects.filter(pk=self.pk), count_new=False)
+    
+    @classmethod
+    def sweep_alerts(cls, progress=None, pk_range=None):
+        """Run check_and_create_alerts for every item in a fixed number of queries.
         
-        if self.quantity == 0:
-            InventoryAlert.objects.create(
-                item=self,
-                alert_type='OUT_OF_STOCK',
-                message=f'Item "{self.name}" is out of stock. Immediate restocking required.'
-            )
-        elif self.is_low_stock:
-            InventoryAlert.objects.create(
-                item=self,
-                alert_type='LOW_STOCK',
-                message=f'Item "{self.name}" is running low. Current stock: {self.quantity}, Reorder level: {self.reorder_level}'
-            )
+        Returns how many items gained unresolved alerts, counted the same way
+        as comparing each item's unresolved alerts before and after its check.
+        `progress`, if given, is called with the number of items alerted.
+        `pk_range` (first, last) limits the sweep to items whose pk falls in
+        that inclusive range.
+        """
+        items = cls.objects.all() if pk_range is None else cls.objects.filter(pk__range=pk_range)
+        alerted, generated = alert_rules.replace_alerts(items)
+        if progress:
+            progress(alerted)
+        return generated
     
     class Meta:
         ordering = ['name']
         verbose_name = 'Inventory Item'
         verbose_name_plural = 'Inventory Items'
+        indexes = [
+            # Covers the per-category totals, which then never read the item rows
+            models.Index(fields=['category', 'quantity', 'price'], name='item_category_totals_idx'),
+            # Covers the stock status counts and out-of-stock lookups; orders the stock levels report
+            models.Index(fields=['quantity', 'reorder_level'], name='item_stock_level_idx'),
+            # Low stock items only, in listing order
+            models.Index(
+                fields=['name'], condition=models.Q(quantity__lte=F('reorder_level')), name='item_low_stock_idx',
+            ),
+        ]
 
 
-class InventoryTransaction(models.Model):
+class StockStripe(models.Model):
+    """Counter sub-row holding a hot item's net movement since its stripes were last folded"""
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='stripes')
+    stripe = models.PositiveSmallIntegerField()
+    quantity = models.IntegerField(default=0, help_text="Net movement since the last fold")
+    allowance = models.PositiveIntegerField(default=0, help_text="Stock this stripe may take out of the item row")
+    
+    def __str__(self):
+        return f"{self.item.name} stripe {self.stripe} ({self.quantity})"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'stripe'], name='unique_item_stripe'),
+        ]
+
+
+class InventoryTransaction(SavesAtomically, FeedsDeletes, models.Model):
     """Track inventory movements for analytics"""
+    feed_topic = change_feed.TRANSACTION
     TRANSACTION_TYPES = [
         ('IN', 'Stock In'),
         ('OUT', 'Stock Out'),
         ('ADJUST', 'Adjustment'),
     ]
     
-    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='transactions')
+    # Indexed by the item history index in Meta, which leads with item
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, db_index=False, related_name='transactions')
     transaction_type = models.CharField(max_length=10, choices=TRANSACTION_TYPES)
     quantity = models.IntegerField()
+    # Adjustments recorded before the signed change was kept have none
+    quantity_change = models.IntegerField(null=True, blank=True, help_text='Signed change to stock')
     reason = models.CharField(max_length=200, blank=True)
     user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True)
     timestamp = models.DateTimeField(auto_now_add=True)
@@ -116,10 +395,40 @@ class InventoryTransaction(models.Model):
     
     class Meta:
         ordering = ['-timestamp']
+        indexes = [
+            # Latest movements and date ranges across all items
+            models.Index(fields=['-timestamp'], name='transaction_recent_idx'),
+            # One item's history, and its recent OUT movements for days-of-cover rules
+            models.Index(fields=['item', '-timestamp'], name='transaction_item_recent_idx'),
+        ]
 
 
-class InventoryAlert(models.Model):
+class TransactionRollup(models.Model):
+    """Daily totals of archived ledger rows, per item and movement type (see inventory.ledger)"""
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, db_index=False, related_name='transaction_rollups')
+    day = models.DateField(help_text='UTC day the movements were recorded on')
+    transaction_type = models.CharField(max_length=10, choices=InventoryTransaction.TRANSACTION_TYPES)
+    movements = models.PositiveIntegerField(help_text='Ledger rows rolled into this one')
+    quantity = models.IntegerField(help_text='Sum of the movement quantities')
+    quantity_change = models.IntegerField(help_text='Net signed change to stock')
+    
+    def __str__(self):
+        return f"{self.item.name} - {self.transaction_type} on {self.day} ({self.movements})"
+    
+    class Meta:
+        ordering = ['-day']
+        constraints = [
+            # Also serves one item's totals after a given day
+            models.UniqueConstraint(fields=['item', 'day', 'transaction_type'], name='unique_transaction_rollup'),
+        ]
+        indexes = [
+            models.Index(fields=['-day'], name='rollup_recent_idx'),
+        ]
+
+
+class InventoryAlert(SavesAtomically, FeedsDeletes, models.Model):
     """System alerts for inventory management"""
+    feed_topic = change_feed.ALERT
     ALERT_TYPES = [
         ('LOW_STOCK', 'Low Stock'),
         ('OUT_OF_STOCK', 'Out of Stock'),
@@ -144,3 +453,232 @@ class InventoryAlert(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Alerts are mostly resolved; open ones get partial indexes of their own
+            models.Index(fields=['-created_at'], name='alert_recent_idx'),
+            models.Index(fields=['-created_at'], condition=models.Q(is_resolved=False), name='alert_open_recent_idx'),
+            models.Index(
+                fields=['item', 'alert_type'], condition=models.Q(is_resolved=False), name='alert_open_item_idx',
+            ),
+            # Recently resolved alerts, and the oldest ones for compaction
+            models.Index(fields=['resolved_at'], condition=models.Q(is_resolved=True), name='alert_resolved_idx'),
+        ]
+
+
+class AlertSummary(models.Model):
+    """Counts of resolved alerts compacted out of InventoryAlert, per item and type (see inventory.alert_retention)"""
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, db_index=False, related_name='alert_summaries')
+    alert_type = models.CharField(max_length=20, choices=InventoryAlert.ALERT_TYPES)
+    resolved_count = models.PositiveIntegerField(help_text='Resolved alerts compacted into this row')
+    first_created_at = models.DateTimeField(help_text='When the earliest of them was raised')
+    last_resolved_at = models.DateTimeField(help_text='When the latest of them was resolved')
+    
+    def __str__(self):
+        return f"{self.item.name} - {self.alert_type} ({self.resolved_count})"
+    
+    class Meta:
+        verbose_name_plural = 'alert summaries'
+        ordering = ['item__name', 'alert_type']
+        constraints = [
+            models.UniqueConstraint(fields=['item', 'alert_type'], name='unique_alert_summary'),
+        ]
+
+
+class AlertRule(models.Model):
+    """Stock thresholds for one item, one category, or (with neither set) every item.
+    
+    Unset thresholds fall through to the category rule, then the global rule;
+    min_quantity finally defaults to the item's reorder level.
+    """
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, null=True, blank=True, related_name='alert_rules')
+    category = models.ForeignKey(
+        Category, on_delete=models.CASCADE, null=True, blank=True, related_name='alert_rules',
+        help_text="Leave blank with no item for the global rule"
+    )
+    min_quantity = models.PositiveIntegerField(null=True, blank=True, help_text="Raise LOW_STOCK at or below this quantity")
+    max_quantity = models.PositiveIntegerField(null=True, blank=True, help_text="Raise OVERSTOCK above this quantity")
+    days_of_cover = models.PositiveSmallIntegerField(
+        null=True, blank=True,
+        help_text="Raise LOW_STOCK when stock would last fewer days at the recent OUT rate"
+    )
+    is_active = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        if self.item_id:
+            return f"Rule for {self.item}"
+        return f"Rule for category {self.category}" if self.category_id else "Global rule"
+    
+    def clean(self):
+        if self.item_id and self.category_id:
+            raise ValidationError('A rule applies to an item or a category, not both.')
+        if None not in (self.min_quantity, self.max_quantity) and self.max_quantity < self.min_quantity:
+            raise ValidationError('Maximum quantity must not be below minimum quantity.')
+    
+    class Meta:
+        ordering = ['category__name', 'item__name']
+        constraints = [
+            models.UniqueConstraint(fields=['item'], condition=models.Q(item__isnull=False), name='unique_item_alert_rule'),
+            # Coalesce so that NULL (the global rule) is unique too
+            models.UniqueConstraint(
+                Coalesce('category', models.Value(0)), condition=models.Q(item__isnull=True),
+                name='unique_category_alert_rule',
+            ),
+        ]
+
+
+class AlertNotification(models.Model):
+    """Outbox of newly raised alert conditions, mailed to recipients in digests"""
+    item = models.ForeignKey(Item, on_delete=models.CASCADE, related_name='alert_notifications')
+    alert_type = models.CharField(max_length=20, choices=InventoryAlert.ALERT_TYPES)
+    message = models.TextField()
+    created_at = models.DateTimeField(default=timezone.now)
+    
+    def __str__(self):
+        return f"{self.item.name} - {self.alert_type}"
+    
+    class Meta:
+        ordering = ['pk']
+
+
+class DigestCursor(models.Model):
+    """Last outbox notification mailed to each digest recipient"""
+    recipient = models.EmailField(unique=True)
+    last_notification_id = models.BigIntegerField(default=0)
+    last_sent_at = models.DateTimeField(null=True, blank=True)
+    failures = models.PositiveIntegerField(default=0, help_text="Consecutive failed sends")
+    last_error = models.TextField(blank=True, default='')
+    
+    def __str__(self):
+        return f"{self.recipient} @ {self.last_notification_id}"
+
+
+class ChangeEvent(models.Model):
+    """One change to an item, stock movement or alert, in commit order (see inventory.change_feed)"""
+    TOPICS = [
+        ('item', 'Item'),
+        ('transaction', 'Transaction'),
+        ('alert', 'Alert'),
+    ]
+    ACTIONS = [
+        ('create', 'Create'),
+        ('update', 'Update'),
+        ('delete', 'Delete'),
+    ]
+    
+    id = models.BigAutoField(primary_key=True)
+    topic = models.CharField(max_length=20, choices=TOPICS)
+    action = models.CharField(max_length=10, choices=ACTIONS)
+    object_id = models.BigIntegerField()
+    item_id = models.BigIntegerField(help_text="Item the changed row belongs to")
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
+    
+    def __str__(self):
+        return f"#{self.pk} {self.topic} {self.object_id} {self.action}"
+
+
+class ConsumerOffset(models.Model):
+    """Last change event handled by each change feed consumer"""
+    name = models.CharField(max_length=100, unique=True)
+    position = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.name} @ {self.position}"
+
+
+class ScanJournalCursor(models.Model):
+    """Last scan journal sequence applied to the database, per journal file"""
+    journal = models.CharField(max_length=64, unique=True)
+    applied_seq = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    def __str__(self):
+        return f"{self.journal} @ {self.applied_seq}"
+
+
+class IdempotencyKey(models.Model):
+    """Stored result of a keyed API request, replayed when the client retries"""
+    key = models.CharField(max_length=255)
+    scope = models.CharField(max_length=200, help_text="Request path the key was used on")
+    request_hash = models.CharField(max_length=64)
+    status_code = models.PositiveSmallIntegerField()
+    response_body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    
+    def __str__(self):
+        return f"{self.key} ({self.scope})"
+    
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'scope'], name='unique_idempotency_key_scope'),
+        ]
+
+
+class Job(models.Model):
+    """Background work queued by views and run by `manage.py run_jobs` workers"""
+    QUEUED = 'QUEUED'
+    RUNNING = 'RUNNING'
+    SUCCEEDED = 'SUCCEEDED'
+    FAILED = 'FAILED'
+    STATUS_CHOICES = [
+        (QUEUED, 'Queued'),
+        (RUNNING, 'Running'),
+        (SUCCEEDED, 'Succeeded'),
+        (FAILED, 'Failed'),
+    ]
+    ACTIVE = (QUEUED, RUNNING)
+    
+    name = models.CharField(max_length=100)
+    payload = models.JSONField(default=dict, blank=True)
+    priority = models.SmallIntegerField(default=0, help_text="Higher priorities are claimed first")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=QUEUED)
+    dedupe_key = models.CharField(
+        max_length=200, blank=True, default='',
+        help_text="At most one queued or running job may hold a given key"
+    )
+    attempts = models.PositiveSmallIntegerField(default=0)
+    max_attempts = models.PositiveSmallIntegerField(default=3)
+    run_after = models.DateTimeField(default=timezone.now)
+    locked_by = models.CharField(max_length=100, blank=True, default='')
+    heartbeat_at = models.DateTimeField(null=True, blank=True)
+    progress_current = models.PositiveIntegerField(default=0)
+    progress_total = models.PositiveIntegerField(default=0)
+    progress_message = models.CharField(max_length=200, blank=True, default='')
+    result = models.JSONField(null=True, blank=True)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    def __str__(self):
+        return f"{self.name} #{self.pk} ({self.status})"
+    
+    @property
+    def is_finished(self):
+        return self.status in (self.SUCCEEDED, self.FAILED)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['status', '-priority', 'run_after'], name='job_claim_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['dedupe_key'],
+                condition=models.Q(status__in=['QUEUED', 'RUNNING']) & ~models.Q(dedupe_key=''),
+                name='unique_active_job_dedupe_key',
+            ),
+        ]
+
+
+class Lease(models.Model):
+    """Named lock shared by every process using the database (see inventory.locks)"""
+    name = models.CharField(max_length=100, unique=True)
+    holder = models.CharField(max_length=100)
+    acquired_at = models.DateTimeField(default=timezone.now)
+    expires_at = models.DateTimeField()
+    
+    def __str__(self):
+        return f"{self.name} held by {self.holder}"
@@ -0,0 +1,111 @@
+"""
+Batched alert notification digests.
+
+New alert conditions go into the AlertNotification outbox. They are written
+by the same INSERT ... SELECT as the alerts, inside the stock write's
+transaction, and nothing is mailed inline. Once that transaction commits, a
+`send_alert_digests` job is queued to run ALERT_DIGEST_INTERVAL seconds
+later. Notifications that arrive in the meantime are picked up by the same
+job, because it holds the dedupe key. So each recipient gets at most one
+digest per interval, however many alerts fire. A digest stops at a gap in
+the outbox ids until CHANGE_FEED_GAP_SECONDS have passed, as change feed
+reads do, so a notification committed late is not skipped.
+
+The job sends every address in ALERT_DIGEST_RECIPIENTS the notifications
+past that recipient's DigestCursor, all over one SMTP connection. If a send
+fails, that cursor stays put and the job fails, so the job queue retries it
+with backoff. Recipients already mailed are not mailed again. Notifications
+every recipient has received are pruned.
+"""
+
+import logging
+import smtplib
+
+from django.apps import apps
+from django.conf import settings
+from django.core import mail
+from django.db.models import Min
+from django.template.loader import render_to_string
+from django.utils import timezone
+
+from . import change_feed
+
+logger = logging.getLogger(__name__)
+
+DIGEST_JOB = 'send_alert_digests'
+
+
+class DigestFailed(Exception):
+    """Raised after a digest run in which some recipients could not be mailed"""
+
+
+def recipients():
+    return settings.ALERT_DIGEST_RECIPIENTS
+
+
+def schedule():
+    """Queue a digest job ALERT_DIGEST_INTERVAL seconds out, unless one is already pending"""
+    from . import jobs  # jobs imports the models, which import this module
+
+    jobs.enqueue(DIGEST_JOB, dedupe_key=DIGEST_JOB, delay=settings.ALERT_DIGEST_INTERVAL)
+
+
+def _digest(recipient, notifications, total):
+    count = len(notifications)
+    return mail.EmailMessage(
+        subject=f'[Inventory] {total} new stock alert{"s" if total != 1 else ""}',
+        body=render_to_string('inventory/email/alert_digest.txt', {
+            'notifications': notifications, 'total': total, 'more': total - count,
+        }),
+        from_email=settings.DEFAULT_FROM_EMAIL,
+        to=[recipient],
+    )
+
+
+def send_digests(progress=None):
+    """Mail each recipient the notifications past their cursor.
+    
+    Returns how many recipients were mailed and how many notifications
+    those digests covered in total.
+    `progress`, if given, is called with (recipients done, recipients).
+    Raises DigestFailed once every recipient has been tried if any send failed.
+    """
+    AlertNotification = apps.get_model('inventory', 'AlertNotification')
+    DigestCursor = apps.get_model('inventory', 'DigestCursor')
+    addresses = recipients()
+    mailed, covered, failed = 0, 0, []
+    with mail.get_connection() as connection:
+        for done, recipient in enumerate(addresses):
+            cursor, _ = DigestCursor.objects.get_or_create(recipient=recipient)
+            pending = AlertNotification.objects.filter(pk__gt=cursor.last_notification_id).order_by('pk')
+            # Stop short of a lower id still being written, as the change feed does
+            ready = change_feed.settled(pending.only('pk', 'created_at'), cursor.last_notification_id)
+            if ready:
+                last = ready[-1].pk
+                batch = list(pending.filter(pk__lte=last).select_related('item')[:settings.ALERT_DIGEST_MAX_ALERTS])
+                message = _digest(recipient, batch, len(ready))
+                message.connection = connection
+                try:
+                    message.send()
+                except (smtplib.SMTPException, OSError) as e:
+                    logger.warning('Alert digest to %s failed: %s', recipient, e)
+                    failed.append(recipient)
+                    DigestCursor.objects.filter(pk=cursor.pk).update(failures=cursor.failures + 1, last_error=str(e))
+                else:
+                    mailed += 1
+                    covered += len(ready)
+                    DigestCursor.objects.filter(pk=cursor.pk).update(
+                        last_notification_id=last, last_sent_at=timezone.now(),
+                        failures=0, last_error='',
+                    )
+            if progress:
+                progress(done + 1, len(addresses))
+
+    # Drop what every recipient has been sent
+    delivered = DigestCursor.objects.filter(recipient__in=addresses).aggregate(
+        last=Min('last_notification_id'))['last']
+    if delivered is not None and addresses:
+        AlertNotification.objects.filter(pk__lte=delivered).delete()
+    if failed:
+        raise DigestFailed(f'Could not mail {", ".join(failed)}')
+    return {'recipients': mailed, 'notifications': covered}
@@ -0,0 +1,70 @@
+"""
+Deleting items together with long histories.
+
+A plain Item.delete() cascades to the item's movements, alerts, rollups and
+the rest in one DELETE per table, which for a long-lived SKU holds locks on
+hundreds of thousands of rows in a single statement. The admin is worse:
+its confirmation page collects and lists every related row. delete_items()
+removes the history first, ITEM_DELETE_BATCH_SIZE rows per DELETE with the
+ids chosen by a LIMIT subquery, so no rows are loaded into Python and each
+statement commits on its own. The items themselves are deleted last,
+through the ORM, so their delete signals (change feed, page and item
+caches, alert rule cache) still fire, and any movement recorded for them in
+the meantime goes with them.
+
+The history models have no delete signals or dependents of their own, so
+Django deletes them without fetching them. dependent_counts() gives the
+per-model row counts the admin confirmation page shows instead of the rows.
+"""
+
+from django.conf import settings
+from django.db import models, transaction
+
+from .models import (
+    AlertNotification, AlertSummary, InventoryAlert, InventoryTransaction, Item, StockStripe, TransactionRollup,
+)
+
+HISTORY = (InventoryTransaction, TransactionRollup, InventoryAlert, AlertSummary, AlertNotification, StockStripe)
+# Items whose history is cleared before they are deleted together
+ITEMS_PER_PASS = 500
+
+
+def dependent_counts(items):
+    """{model: rows deleted along with the items in queryset `items`}, for models with any"""
+    counts = {}
+    for relation in Item._meta.related_objects:
+        if relation.on_delete is models.CASCADE:
+            count = relation.related_model.objects.filter(**{f'{relation.field.name}__in': items.values('pk')}).count()
+            if count:
+                counts[relation.related_model] = count
+    return counts
+
+
+def delete_history(item_ids, batch_size=None):
+    """Delete the history rows of `item_ids` in batches; returns {model label: rows deleted}"""
+    batch_size = batch_size or settings.ITEM_DELETE_BATCH_SIZE
+    deleted = {}
+    for model in HISTORY:
+        rows = model.objects.filter(item_id__in=item_ids)
+        total = 0
+        while True:
+            count, _ = model.objects.filter(pk__in=rows.order_by().values('pk')[:batch_size]).delete()
+            total += count
+            if count < batch_size:
+                break
+        if total:
+            deleted[model._meta.label] = total
+    return deleted
+
+
+def delete_items(items, batch_size=None):
+    """Delete the items in queryset `items` and everything referencing them; returns items deleted"""
+    item_ids = list(items.order_by().values_list('pk', flat=True))
+    deleted = 0
+    for start in range(0, len(item_ids), ITEMS_PER_PASS):
+        chunk = item_ids[start:start + ITEMS_PER_PASS]
+        delete_history(chunk, batch_size)
+        with transaction.atomic():
+            _, counts = Item.objects.filter(pk__in=chunk).delete()
+        deleted += counts.get(Item._meta.label, 0)
+    return deleted
@@ -0,0 +1,77 @@
+"""
+EXPLAIN plans for executed queries, to catch large tables read without an index.
+
+SQLite's EXPLAIN QUERY PLAN shows a table walked row by row as a bare
+``SCAN table``; walking an index in order (``SCAN table USING INDEX``) or
+searching one is fine. PostgreSQL shows the same thing as a Seq Scan node.
+The test database is tiny, and the PostgreSQL planner rightly prefers
+sequential scans there, so plans are taken with enable_seqscan off. A Seq
+Scan that is still chosen then means no index can serve the query.
+
+Only the tables that grow with the catalog and the ledger count as large.
+"""
+
+import json
+import re
+
+from django.apps import apps
+from django.db import DEFAULT_DB_ALIAS, connections
+
+LARGE_MODELS = (
+    'Item', 'InventoryTransaction', 'TransactionRollup', 'InventoryAlert', 'AlertNotification', 'ChangeEvent',
+    'StockStripe',
+)
+
+# Statements with a plan; transaction control and savepoints have none
+EXPLAINABLE = re.compile(r'^\s*(SELECT|INSERT|UPDATE|DELETE|WITH)\b', re.IGNORECASE)
+# Django aliases tables in subqueries and joins as U0, T3, ...
+TABLE_ALIAS = re.compile(r'(?:FROM|JOIN)\s+"(\w+)"\s+(?:AS\s+)?"?([A-Z]\d+)\b"?', re.IGNORECASE)
+SQLITE_SCAN = re.compile(r'^SCAN (\S+)$')
+
+
+def large_tables():
+    return {apps.get_model('inventory', name)._meta.db_table for name in LARGE_MODELS}
+
+
+def explain(sql, using=DEFAULT_DB_ALIAS):
+    """Plan of an executed statement, one line per step"""
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute('SET enable_seqscan = off')
+            try:
+                cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}')
+                plan = cursor.fetchone()[0]
+            finally:
+                cursor.execute('RESET enable_seqscan')
+            plan = json.loads(plan) if isinstance(plan, str) else plan
+            return list(_pg_lines(plan[0]['Plan']))
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def _pg_lines(node, depth=0):
+    relation = f' on {node["Relation Name"]}' if 'Relation Name' in node else ''
+    index = f' using {node["Index Name"]}' if 'Index Name' in node else ''
+    yield f'{"  " * depth}{node["Node Type"]}{relation}{index}'
+    for child in node.get('Plans', ()):
+        yield from _pg_lines(child, depth + 1)
+
+
+def full_scans(sql, using=DEFAULT_DB_ALIAS, tables=None):
+    """Large tables the statement reads without an index, as (sorted table names, plan lines)"""
+    if not EXPLAINABLE.match(sql):
+        return [], []
+    tables = large_tables() if tables is None else set(tables)
+    plan = explain(sql, using)
+    if connections[using].vendor == 'postgresql':
+        scanned = {
+            match.group(1) for match in (re.match(r'\s*Seq Scan on (\w+)', line) for line in plan) if match
+        }
+    else:
+        aliases = {alias: table for table, alias in TABLE_ALIAS.findall(sql)}
+        scanned = {
+            aliases.get(match.group(1), match.group(1))
+            for match in (SQLITE_SCAN.match(line) for line in plan) if match
+        }
+    return sorted(scanned & tables), plan
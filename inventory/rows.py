@@ -0,0 +1,77 @@
+"""
+Read-only row projections for list and report pages.
+
+Listing paths only print a handful of columns, so instead of building a full
+Item instance per row they fetch a fixed column set with values_list() into
+ItemRow tuples. Total value and stock status are computed by the database,
+with the same rules as Item.total_value and Item.stock_status; the status
+comes back as a small integer code that ItemRow.stock_status maps to its label.
+Category and supplier come back as their names.
+"""
+
+from collections import namedtuple
+
+from django.db.models import Case, DecimalField, ExpressionWrapper, F, IntegerField, Value, When
+
+ITEM_ROW_FIELDS = (
+    'pk', 'name', 'category', 'supplier', 'quantity', 'reorder_level', 'price',
+    'created_at', 'updated_at', 'total_value', 'status_code',
+)
+
+# Small integers are shared objects, unlike a status string per row
+STOCK_STATUS_LABELS = ('In Stock', 'Low Stock', 'Out of Stock')
+
+STOCK_STATUS = Case(
+    When(quantity=0, then=Value(2)),
+    When(quantity__lte=F('reorder_level'), then=Value(1)),
+    default=Value(0),
+    output_field=IntegerField(),
+)
+
+TOTAL_VALUE = ExpressionWrapper(
+    F('quantity') * F('price'),
+    output_field=DecimalField(max_digits=20, decimal_places=2),
+)
+
+
+class ItemRow(namedtuple('ItemRow', ITEM_ROW_FIELDS)):
+    """Display columns of one item; attribute names match the Item model"""
+    __slots__ = ()
+
+    def __getitem__(self, key):
+        # Templates try item['name'] before item.name; answering it directly
+        # avoids raising and catching a TypeError for every variable lookup.
+        if key.__class__ is str:
+            try:
+                return getattr(self, key)
+            except AttributeError:
+                raise KeyError(key)
+        return tuple.__getitem__(self, key)
+
+    @property
+    def stock_status(self):
+        return STOCK_STATUS_LABELS[self.status_code]
+
+    @property
+    def is_low_stock(self):
+        return self.quantity <= self.reorder_level
+
+    @property
+    def is_out_of_stock(self):
+        return self.quantity == 0
+
+
+def item_rows(queryset, chunk_size=2000):
+    """Evaluate an Item queryset as a list of ItemRow tuples.
+    
+    Rows are streamed, so the plain values_list tuples are never all held
+    in memory next to the ItemRow list.
+    """
+    columns = queryset.annotate(
+        row_total_value=TOTAL_VALUE,
+        row_status_code=STOCK_STATUS,
+    ).values_list(
+        'pk', 'name', 'category__name', 'supplier__name', *ITEM_ROW_FIELDS[4:-2],
+        'row_total_value', 'row_status_code',
+    )
+    return list(map(ItemRow._make, columns.iterator(chunk_size=chunk_size)))
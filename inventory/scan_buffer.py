@@ -0,0 +1,288 @@
+"""
+Write-behind buffer for handheld scan events.
+
+Scans are appended to a local SQLite journal and acknowledged as soon as the
+journal commit is durable. A flusher later coalesces pending scans per item
+and applies them to the main database in one transaction, advancing a cursor
+row in that same transaction so every scan is applied exactly once, even if
+the process dies between the database commit and journal cleanup.
+"""
+
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .idempotency import IdempotencyConflict
+from .models import Item, ScanJournalCursor
+
+logger = logging.getLogger(__name__)
+
+SCAN_TYPES = ('IN', 'OUT')
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meta (
+    key TEXT PRIMARY KEY,
+    value TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS events (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    item_id INTEGER NOT NULL,
+    transaction_type TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    reason TEXT NOT NULL DEFAULT '',
+    user_id INTEGER,
+    received_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS requests (
+    key TEXT PRIMARY KEY,
+    fingerprint TEXT NOT NULL,
+    sequence INTEGER NOT NULL,
+    queued INTEGER NOT NULL,
+    created_at REAL NOT NULL
+);
+CREATE TABLE IF NOT EXISTS rejected (
+    seq INTEGER PRIMARY KEY,
+    item_id INTEGER NOT NULL,
+    transaction_type TEXT NOT NULL,
+    quantity INTEGER NOT NULL,
+    reason TEXT NOT NULL DEFAULT '',
+    user_id INTEGER,
+    received_at REAL NOT NULL,
+    error TEXT NOT NULL
+);
+"""
+
+_EVENT_COLUMNS = 'seq, item_id, transaction_type, quantity, reason, user_id, received_at'
+
+AppendResult = namedtuple('AppendResult', ['sequence', 'queued', 'replayed'])
+
+
+class ScanEventError(ValueError):
+    """Raised when a scan event is malformed"""
+
+
+def validate_scan_event(data):
+    """Normalize a scan payload without touching the main database"""
+    try:
+        item_id = int(data['item_id'])
+        quantity = int(data.get('quantity', 1))
+    except (KeyError, TypeError, ValueError):
+        raise ScanEventError('Each scan needs an integer item_id and quantity')
+    transaction_type = data.get('transaction_type', 'OUT')
+    if transaction_type not in SCAN_TYPES:
+        raise ScanEventError('Buffered scans support IN and OUT movements only')
+    if quantity <= 0:
+        raise ScanEventError('Quantity must be greater than 0')
+    return {
+        'item_id': item_id,
+        'transaction_type': transaction_type,
+        'quantity': quantity,
+        'reason': str(data.get('reason', ''))[:200],
+    }
+
+
+class ScanJournal:
+    """Append-only SQLite journal of scan events awaiting a flush"""
+
+    def __init__(self, path=None):
+        self.path = str(path or settings.SCAN_JOURNAL_PATH)
+        self._local = threading.local()
+        self._journal_id = None
+
+    def _connect(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute('PRAGMA journal_mode=WAL')
+            conn.execute('PRAGMA synchronous=FULL')
+            conn.executescript(_SCHEMA)
+            conn.execute(
+                "INSERT OR IGNORE INTO meta (key, value) VALUES ('journal_id', ?)",
+                (uuid.uuid4().hex,)
+            )
+            self._local.conn = conn
+        return conn
+
+    @property
+    def journal_id(self):
+        """Identity of this journal file; the cursor row is keyed on it"""
+        if self._journal_id is None:
+            row = self._connect().execute(
+                "SELECT value FROM meta WHERE key = 'journal_id'"
+            ).fetchone()
+            self._journal_id = row[0]
+        return self._journal_id
+
+    def append(self, events, user_id=None, idempotency_key=None, fingerprint=''):
+        """Durably record events and return an AppendResult.
+        
+        With an idempotency key, the key is stored in the same journal commit
+        as the events, and a retry returns the original result instead of
+        queueing the scans again.
+        """
+        conn = self._connect()
+        now = time.time()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            if idempotency_key:
+                row = conn.execute(
+                    'SELECT fingerprint, sequence, queued FROM requests WHERE key = ? AND created_at >= ?',
+                    (idempotency_key, now - settings.IDEMPOTENCY_KEY_TTL)
+                ).fetchone()
+                if row:
+                    conn.execute('ROLLBACK')
+                    if row[0] != fingerprint:
+                        raise IdempotencyConflict(idempotency_key)
+                    return AppendResult(row[1], row[2], True)
+            
+            conn.executemany(
+                'INSERT INTO events (item_id, transaction_type, quantity, reason, user_id, received_at) '
+                'VALUES (?, ?, ?, ?, ?, ?)',
+                [
+                    (e['item_id'], e['transaction_type'], e['quantity'], e['reason'], user_id, now)
+                    for e in events
+                ]
+            )
+            last_seq = conn.execute('SELECT MAX(seq) FROM events').fetchone()[0]
+            if idempotency_key:
+                conn.execute(
+                    'INSERT OR REPLACE INTO requests (key, fingerprint, sequence, queued, created_at) '
+                    'VALUES (?, ?, ?, ?, ?)',
+                    (idempotency_key, fingerprint, last_seq, len(events), now)
+                )
+            conn.execute('COMMIT')
+        except IdempotencyConflict:
+            raise
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return AppendResult(last_seq, len(events), False)
+
+    def pending(self, after_seq, limit):
+        """Events with a sequence number above after_seq, oldest first"""
+        return self._connect().execute(
+            f'SELECT {_EVENT_COLUMNS} FROM events WHERE seq > ? ORDER BY seq LIMIT ?',
+            (after_seq, limit)
+        ).fetchall()
+
+    def pending_count(self):
+        return self._connect().execute('SELECT COUNT(*) FROM events').fetchone()[0]
+
+    def reject(self, failures):
+        """Move events that could not be applied to the rejected table"""
+        if not failures:
+            return
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        conn.executemany(
+            f'INSERT OR REPLACE INTO rejected ({_EVENT_COLUMNS}, error) VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            [tuple(event) + (error,) for event, error in failures]
+        )
+        conn.execute('COMMIT')
+
+    def prune(self, upto_seq):
+        """Drop applied events and expired idempotency keys"""
+        conn = self._connect()
+        conn.execute('DELETE FROM events WHERE seq <= ?', (upto_seq,))
+        conn.execute(
+            'DELETE FROM requests WHERE created_at < ?',
+            (time.time() - settings.IDEMPOTENCY_KEY_TTL,)
+        )
+
+    def flush(self, batch_size=5000):
+        """Apply pending events to the database; returns (applied, rejected, cursor)"""
+        cursor, _ = ScanJournalCursor.objects.get_or_create(journal=self.journal_id)
+        events = self.pending(cursor.applied_seq, batch_size)
+        if not events:
+            self.prune(cursor.applied_seq)
+            return 0, 0, cursor.applied_seq
+
+        failures = []
+        with transaction.atomic():
+            cursor = ScanJournalCursor.objects.select_for_update().get(pk=cursor.pk)
+            # Another flusher may have got here first
+            events = [e for e in events if e[0] > cursor.applied_seq]
+            if events:
+                users = User.objects.in_bulk({e[5] for e in events if e[5] is not None})
+                for (item_id, user_id), group in _coalesce(events).items():
+                    failures.extend(_apply_group(item_id, users.get(user_id), group))
+                cursor.applied_seq = events[-1][0]
+                cursor.save(update_fields=['applied_seq', 'updated_at'])
+
+        self.reject(failures)
+        self.prune(cursor.applied_seq)
+        for event, error in failures:
+            logger.warning('Rejected scan event %s for item %s: %s', event[0], event[1], error)
+        return len(events) - len(failures), len(failures), cursor.applied_seq
+
+
+def _coalesce(events):
+    """Group events by (item, user), keeping scan order within each group"""
+    groups = OrderedDict()
+    for event in events:
+        groups.setdefault((event[1], event[5]), []).append(event)
+    return groups
+
+
+def _signed(event):
+    return event[3] if event[2] == 'IN' else -event[3]
+
+
+def _apply_group(item_id, user, group):
+    """Apply one coalesced group; returns the events that had to be rejected"""
+    try:
+        item = Item.objects.get(pk=item_id)
+    except Item.DoesNotExist:
+        return [(event, 'Item does not exist') for event in group]
+
+    net = sum(_signed(event) for event in group)
+    try:
+        with transaction.atomic():
+            if net:
+                item.update_stock(
+                    quantity_change=net,
+                    transaction_type='IN' if net > 0 else 'OUT',
+                    reason=f'{len(group)} buffered scan{"s" if len(group) != 1 else ""}',
+                    user=user,
+                )
+        return []
+    except ValueError:
+        pass
+
+    # The net movement would drive stock negative: replay scans one by one so
+    # only the ones that cannot be covered are rejected.
+    failures = []
+    for event in group:
+        try:
+            with transaction.atomic():
+                item.update_stock(
+                    quantity_change=_signed(event),
+                    transaction_type=event[2],
+                    reason=event[4] or 'Buffered scan',
+                    user=user,
+                )
+        except ValueError as e:
+            failures.append((event, str(e)))
+    return failures
+
+
+_journals = {}
+_journals_lock = threading.Lock()
+
+
+def get_journal():
+    """Process-wide journal for the configured SCAN_JOURNAL_PATH"""
+    path = str(settings.SCAN_JOURNAL_PATH)
+    with _journals_lock:
+        if path not in _journals:
+            _journals[path] = ScanJournal(path)
+        return _journals[path]
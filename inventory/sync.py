@@ -0,0 +1,85 @@
+"""
+Incremental sync for offline clients, read from the change feed.
+
+A client with no cursor pages through a snapshot of every item. The cursor
+it gets back is the change feed position taken before the first page: the
+furthest point change_feed.read() gets to, so events of transactions still
+open then are not skipped. After that it asks for deltas: the items changed
+or deleted, and the stock movements recorded, after its cursor. Each page
+reads one batch of change events, by primary key, and loads the rows they
+name with one query per table. A sync after a few minutes therefore moves
+only what changed. Changes made while a snapshot is being paged through
+show up again in the first delta. Rows are sent as full records, so
+applying one twice is harmless.
+
+A cursor older than the oldest retained event (see
+CHANGE_FEED_RETENTION_DAYS) raises CursorExpired. The client must then take
+a fresh snapshot.
+"""
+
+from django.db.models import Max, Min
+
+from . import change_feed
+from .models import ChangeEvent, InventoryTransaction, Item
+
+ITEM_FIELDS = ('id', 'name', 'quantity', 'price', 'reorder_level', 'category', 'supplier', 'updated_at')
+# Category and supplier are sent by name, as clients had them before they became tables
+ITEM_COLUMNS = {field: f'{field}__name' if field in ('category', 'supplier') else field for field in ITEM_FIELDS}
+TRANSACTION_FIELDS = ('id', 'item_id', 'transaction_type', 'quantity', 'reason', 'timestamp')
+
+
+class CursorExpired(Exception):
+    """Raised when the events after a cursor have been pruned"""
+
+
+def _items(queryset):
+    return [
+        {field: str(value) if field == 'price' else value for field, value in zip(ITEM_FIELDS, row)}
+        for row in queryset.values_list(*ITEM_COLUMNS.values())
+    ]
+
+
+def snapshot(after=0, limit=500, cursor=None):
+    """One page of every item with pk > `after`, plus the cursor to take deltas from"""
+    if cursor is None:
+        # Not the newest id: a lower one may still belong to an open transaction
+        cursor = change_feed.settled_position()
+    items = _items(Item.objects.filter(pk__gt=after).order_by('pk')[:limit])
+    return {
+        'cursor': cursor,
+        'items': items,
+        'deleted_items': [],
+        'transactions': [],
+        'has_more': len(items) == limit,
+        'after': items[-1]['id'] if items else after,
+    }
+
+
+def delta(since, limit=500):
+    """Items changed or deleted and movements recorded in the next `limit` events after `since`"""
+    bounds = ChangeEvent.objects.aggregate(first=Min('pk'), last=Max('pk'))
+    if bounds['first'] is not None and not bounds['first'] - 1 <= since <= bounds['last']:
+        raise CursorExpired(f'Cursor {since} is outside the retained change feed')
+    events = change_feed.read(since, limit)
+
+    changed, deleted, movements = set(), set(), []
+    for event in events:
+        if event.topic == change_feed.ITEM:
+            if event.action == change_feed.DELETE:
+                deleted.add(event.object_id)
+                changed.discard(event.object_id)
+            else:
+                changed.add(event.object_id)
+                deleted.discard(event.object_id)
+        elif event.topic == change_feed.TRANSACTION and event.action == change_feed.CREATE:
+            movements.append(event.object_id)
+
+    return {
+        'cursor': events[-1].pk if events else since,
+        'items': _items(Item.objects.filter(pk__in=changed).order_by('pk')) if changed else [],
+        'deleted_items': sorted(deleted),
+        'transactions': list(
+            InventoryTransaction.objects.filter(pk__in=movements).order_by('pk').values(*TRANSACTION_FIELDS)
+        ) if movements else [],
+        'has_more': len(events) == limit,
+    }
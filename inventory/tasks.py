@@ -0,0 +1,82 @@
+"""
+Background tasks run by `manage.py run_jobs` (see inventory.jobs).
+"""
+
+import csv
+import os
+import time
+
+from django.conf import settings
+from django.db.models import F
+
+from . import locks, metrics, notifications
+from .jobs import task
+from .models import STRIPE_COMPACT_JOB, Item
+from .rows import item_rows
+
+# Shared with `manage.py sweep_alerts`, so queued and command-line sweeps never overlap
+ALERT_SWEEP_LEASE = 'alert-sweep'
+
+EXPORT_REPORTS = {
+    'stock_levels': lambda: Item.objects.order_by('quantity'),
+    'low_stock': lambda: Item.objects.filter(quantity__lte=F('reorder_level')).order_by('name'),
+    'all_items': lambda: Item.objects.order_by('category__name', 'name'),
+}
+
+EXPORT_COLUMNS = ('name', 'category', 'quantity', 'price', 'total_value', 'stock_status', 'supplier', 'updated_at')
+
+
+@task('sweep_alerts')
+def sweep_alerts(progress):
+    """Rebuild unresolved stock alerts for every item.
+    
+    Raises LockHeld while another sweep runs, so the job is retried later.
+    """
+    started = time.perf_counter()
+    progress.report(0, 1, 'Checking stock levels')
+    with locks.lease(ALERT_SWEEP_LEASE):
+        generated_count = Item.sweep_alerts()
+    metrics.observe_alert_sweep(time.perf_counter() - started)
+    progress.report(1, 1, f'{generated_count} new alerts generated.')
+    return {'generated_count': generated_count}
+
+
+@task('export_report')
+def export_report(progress, report_type='stock_levels'):
+    """Write an item report to a CSV file under JOB_OUTPUT_DIR"""
+    if report_type not in EXPORT_REPORTS:
+        raise ValueError(f'Unknown report {report_type!r}')
+    items = EXPORT_REPORTS[report_type]()
+    total = items.count()
+    progress.report(0, total, f'Exporting {report_type}')
+    
+    os.makedirs(settings.JOB_OUTPUT_DIR, exist_ok=True)
+    filename = f'report-{report_type}-{progress.job.pk}.csv'
+    path = os.path.join(settings.JOB_OUTPUT_DIR, filename)
+    with open(path, 'w', newline='') as output:
+        writer = csv.writer(output)
+        writer.writerow(EXPORT_COLUMNS)
+        for written, row in enumerate(item_rows(items), 1):
+            writer.writerow([
+                row.name, row.category, row.quantity, row.price, f'{row.total_value:.2f}',
+                row.stock_status, row.supplier, row.updated_at.isoformat(),
+            ])
+            if written % 1000 == 0:
+                progress.report(written)
+    progress.report(total, total, f'{total} items exported.')
+    return {'file': filename, 'rows': total}
+
+
+@task(notifications.DIGEST_JOB)
+def send_alert_digests(progress):
+    """Mail the pending alert notifications to each digest recipient"""
+    return notifications.send_digests(progress=progress.report)
+
+
+@task(STRIPE_COMPACT_JOB)
+def compact_stock_stripes(progress, item_id):
+    """Fold one item's counter stripes back into its quantity and refresh its alerts"""
+    item = Item.objects.filter(pk=item_id).first()
+    folded = item.compact_stripes() if item else 0
+    progress.report(1, 1, f'{folded} units folded back.')
+    return {'folded': folded}
@@ -0,0 +1,44 @@
+from django import template
+from django.utils.safestring import mark_safe
+
+from inventory import fragments
+
+register = template.Library()
+
+
+class CachedFragmentNode(template.Node):
+    def __init__(self, nodelist, name, vary_on):
+        self.nodelist = nodelist
+        self.name = name
+        self.vary_on = vary_on
+
+    def render(self, context):
+        vary_on = [var.resolve(context) for var in self.vary_on]
+        html = fragments.get_fragment(self.name, vary_on)
+        if html is None:
+            html = fragments.set_fragment(self.name, vary_on, self.nodelist.render(context))
+        return mark_safe(html)
+
+
+@register.tag
+def cachedfragment(parser, token):
+    """Cache the enclosed markup in the fragments cache.
+
+    Usage::
+
+        {% cachedfragment 'item_row' item.pk item.updated_at %}
+            ...
+        {% endcachedfragment %}
+
+    The first argument names the fragment (and its hit/miss metrics); the
+    rest are the values it varies on.
+    """
+    bits = token.split_contents()
+    if len(bits) < 2:
+        raise template.TemplateSyntaxError(f"'{bits[0]}' tag requires a fragment name")
+    name = bits[1]
+    if not (name[0] == name[-1] and name[0] in ('"', "'")):
+        raise template.TemplateSyntaxError(f"'{bits[0]}' fragment name must be a quoted string")
+    nodelist = parser.parse(('endcachedfragment',))
+    parser.delete_first_token()
+    return CachedFragmentNode(nodelist, name[1:-1], [parser.compile_filter(bit) for bit in bits[2:]])
@@ -0,0 +1,19 @@
+import shutil
+import tempfile
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class InventoryTestRunner(DiscoverRunner):
+    """Test runner that fails SQL budget overruns and keeps metrics out of the tree"""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.SQL_BUDGET_STRICT = True
+        self.metrics_dir = tempfile.mkdtemp(prefix='inventory-metrics-')
+        settings.METRICS_DIR = self.metrics_dir
+
+    def teardown_test_environment(self, **kwargs):
+        super().teardown_test_environment(**kwargs)
+        shutil.rmtree(self.metrics_dir, ignore_errors=True)
@@ -1,3 +1,1802 @@
-from django.test import TestCase
+import json
+import multiprocessing
+import os
+import shutil
+import smtplib
+import tempfile
+from datetime import date, datetime, time, timedelta
+from importlib import import_module
+from io import StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import OperationalError, connection
+from django.db.models import F, Sum
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from . import (
+    alert_retention, alert_rules, bulk_api, change_feed, item_cache, jobs, ledger, locks, metrics, notifications, purge,
+    query_plans,
+)
+from .forms import ItemForm
+from .fragments import category_versions, fragment_cache, fragment_key, set_fragment
+from .management.commands.bench_http import SCENARIOS, percentile
+from .management.commands.stress_stock import classify, verify
+from .management.commands.sweep_alerts import MAX_PK, key_ranges
+from .middleware import QueryBudgetExceeded, QueryStats, fingerprint
+from .models import (
+    STRIPE_COMPACT_JOB, AlertNotification, AlertRule, AlertSummary, Category, ChangeEvent, ConsumerOffset, DigestCursor, Item, InventoryTransaction,
+    InventoryAlert, Job, Lease, StockStripe, Supplier, TransactionRollup,
+)
+from .rows import item_rows
+from .scan_buffer import ScanJournal, get_journal
+from .tasks import ALERT_SWEEP_LEASE
+from .tiered_cache import FileBus, LocalLRU, TieredCache
+from .urls import urlpatterns
+
+
+class StripedStockTests(TestCase):
+    """Counter-stripe mode for hot items"""
+
+    def setUp(self):
+        self.item = Item.objects.create(
+            name='Hot Widget', quantity=20, price=5, reorder_level=2, stripe_count=4
+        )
+
+    def test_movements_preserve_available_quantity(self):
+        self.item.update_stock(-3, 'OUT')
+        self.item.update_stock(5, 'IN')
+        self.item.update_stock(-7, 'OUT')
+
+        self.assertEqual(self.item.available_quantity, 15)
+        self.assertEqual(InventoryTransaction.objects.filter(item=self.item).count(), 3)
+        self.assertFalse(StockStripe.objects.filter(quantity__lt=-F('allowance')).exists())
+
+    def test_out_movement_can_draw_on_every_stripe(self):
+        for _ in range(20):
+            self.item.update_stock(-1, 'OUT')
+
+        self.assertEqual(self.item.available_quantity, 0)
+        with self.assertRaises(ValueError):
+            self.item.update_stock(-1, 'OUT')
+        self.assertEqual(InventoryTransaction.objects.filter(item=self.item).count(), 20)
+
+    def test_compaction_folds_stripes_and_raises_alerts(self):
+        self.item.update_stock(-19, 'OUT')
+        self.item.update_stock(1, 'IN')
+
+        self.item.compact_stripes()
+        self.item.refresh_from_db()
+
+        self.assertEqual(self.item.quantity, 2)
+        self.assertFalse(StockStripe.objects.filter(item=self.item).exclude(quantity=0).exists())
+        self.assertTrue(InventoryAlert.objects.filter(item=self.item, alert_type='LOW_STOCK').exists())
+
+    def test_slow_path_keeps_stock_in_the_item_row(self):
+        item = Item.objects.create(name='Single Stripe', quantity=20, price=5, reorder_level=2, stripe_count=1)
+        item.update_stock(-3, 'OUT')
+        item.update_stock(-5, 'OUT')
+
+        # Set-based readers see the stock as of the last fold, never an emptied row
+        self.assertEqual(Item.objects.filter(pk=item.pk).values_list('quantity', flat=True).get(), 17)
+        self.assertEqual(item.available_quantity, 12)
+        Item.sweep_alerts()
+        self.assertFalse(InventoryAlert.objects.filter(item=item).exists())
+
+        with self.assertRaises(ValueError):
+            item.update_stock(-13, 'OUT')
+        item.update_stock(-12, 'OUT')
+        self.assertEqual(item.available_quantity, 0)
+        item.compact_stripes()
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 0)
+        self.assertTrue(InventoryAlert.objects.filter(item=item, alert_type='OUT_OF_STOCK').exists())
+
+    def test_compaction_locks_the_item_row_before_stripes(self):
+        self.item.update_stock(-1, 'OUT')
+        self.item.update_stock(-1, 'OUT')
+        with CaptureQueriesContext(connection) as queries:
+            self.item.compact_stripes()
+        tables = [query['sql'].split(' FROM ')[1].split()[0].strip('"') for query in queries
+                  if query['sql'].startswith('SELECT')]
+        self.assertEqual(tables[:2], [Item._meta.db_table, StockStripe._meta.db_table])
+
+    def test_adjust_counts_stock_held_in_stripes(self):
+        self.item.update_stock(-3, 'OUT')
+        self.item.update_stock(2, 'IN')
+        self.assertEqual(StockStripe.objects.filter(item=self.item).aggregate(held=Sum('quantity'))['held'], 2)
+
+        response = self.client.post(
+            reverse('inventory:api_stock_update', args=[self.item.pk]),
+            data=json.dumps({'transaction_type': 'ADJUST', 'quantity': 10}), content_type='application/json',
+        )
+
+        self.assertEqual(response.json()['new_quantity'], 10)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.available_quantity, 10)
+        adjustment = InventoryTransaction.objects.get(item=self.item, transaction_type='ADJUST')
+        self.assertEqual(adjustment.quantity_change, -9)
+
+    def test_movements_queue_one_delayed_compaction(self):
+        # The first movement hands out the stripe allowances; later ones stay on the stripes
+        self.item.update_stock(-3, 'OUT')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.update_stock(-1, 'OUT')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.update_stock(-1, 'OUT')
+
+        job = Job.objects.get(name=STRIPE_COMPACT_JOB)
+        self.assertEqual(job.payload, {'item_id': self.item.pk})
+        self.assertFalse(jobs.work(burst=True))
+        Job.objects.update(run_after=timezone.now())
+        jobs.work(burst=True)
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 15)
+        self.assertFalse(StockStripe.objects.filter(item=self.item).exclude(quantity=0).exists())
+
+    def test_movement_during_a_running_compaction_queues_another(self):
+        self.item.update_stock(-3, 'OUT')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.update_stock(-1, 'OUT')
+        Job.objects.update(status=Job.RUNNING)
+
+        later = timezone.now().timestamp() + settings.STRIPE_COMPACT_DELAY
+        with mock.patch('inventory.models.time.time', return_value=later):
+            with self.captureOnCommitCallbacks(execute=True):
+                self.item.update_stock(-1, 'OUT')
+
+        self.assertEqual(Job.objects.filter(name=STRIPE_COMPACT_JOB, status=Job.QUEUED).count(), 1)
+
+    def test_unstriped_item_rejects_negative_stock(self):
+        item = Item.objects.create(name='Cold Widget', quantity=1, price=5)
+
+        with self.assertRaises(ValueError):
+            item.update_stock(-2, 'OUT')
+        item.refresh_from_db()
+        self.assertEqual(item.quantity, 1)
+        self.assertFalse(InventoryTransaction.objects.filter(item=item).exists())
+
+
+class ScanBufferTests(TestCase):
+    """Write-behind ingestion of scanner events"""
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmpdir, ignore_errors=True)
+        self.journal = ScanJournal(Path(self.tmpdir) / 'journal.sqlite3')
+        self.item = Item.objects.create(name='Scanned Widget', quantity=10, price=2, reorder_level=0)
+
+    def scan(self, transaction_type, quantity=1):
+        return {'item_id': self.item.pk, 'transaction_type': transaction_type,
+                'quantity': quantity, 'reason': ''}
+
+    def test_endpoint_acknowledges_before_applying(self):
+        with override_settings(SCAN_JOURNAL_PATH=str(Path(self.tmpdir) / 'api.sqlite3')):
+            response = self.client.post(
+                reverse('inventory:api_scan_events'),
+                data=json.dumps({'events': [self.scan('OUT'), self.scan('OUT', 2)]}),
+                content_type='application/json',
+            )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.json()['queued'], 2)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 10)
+
+    def test_flush_coalesces_per_item(self):
+        self.journal.append([self.scan('OUT'), self.scan('OUT'), self.scan('IN', 5)])
+
+        applied, rejected, _ = self.journal.flush()
+
+        self.item.refresh_from_db()
+        self.assertEqual((applied, rejected), (3, 0))
+        self.assertEqual(self.item.quantity, 13)
+        self.assertEqual(InventoryTransaction.objects.filter(item=self.item).count(), 1)
+        self.assertEqual(self.journal.pending_count(), 0)
+
+    def test_replay_after_crash_applies_once(self):
+        self.journal.append([self.scan('OUT', 4)])
+        # Simulate dying after the database commit but before journal cleanup
+        with mock.patch.object(ScanJournal, 'prune'):
+            self.journal.flush()
+        self.assertEqual(self.journal.pending_count(), 1)
+
+        applied, _, _ = self.journal.flush()
+
+        self.item.refresh_from_db()
+        self.assertEqual(applied, 0)
+        self.assertEqual(self.item.quantity, 6)
+        self.assertEqual(self.journal.pending_count(), 0)
+
+    def test_uncoverable_scans_are_rejected_individually(self):
+        self.journal.append([self.scan('OUT', 8), self.scan('OUT', 5), self.scan('OUT', 2)])
+
+        applied, rejected, _ = self.journal.flush()
+
+        self.item.refresh_from_db()
+        self.assertEqual((applied, rejected), (2, 1))
+        self.assertEqual(self.item.quantity, 0)
+
+
+class IdempotencyKeyTests(TestCase):
+    """Retried stock API requests are applied once"""
+
+    def setUp(self):
+        self.item = Item.objects.create(name='Retried Widget', quantity=10, price=2, reorder_level=0)
+        self.url = reverse('inventory:api_stock_update', args=[self.item.pk])
+
+    def post(self, body, key):
+        return self.client.post(self.url, data=json.dumps(body), content_type='application/json',
+                                HTTP_IDEMPOTENCY_KEY=key)
+
+    def test_retry_returns_original_response(self):
+        first = self.post({'transaction_type': 'OUT', 'quantity': 3}, 'scan-1')
+        retry = self.post({'transaction_type': 'OUT', 'quantity': 3}, 'scan-1')
+
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 7)
+        self.assertEqual(retry.content, first.content)
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        self.assertEqual(InventoryTransaction.objects.filter(item=self.item).count(), 1)
+
+    def test_key_reuse_with_different_body_is_rejected(self):
+        self.post({'transaction_type': 'OUT', 'quantity': 3}, 'scan-2')
+        response = self.post({'transaction_type': 'OUT', 'quantity': 4}, 'scan-2')
+
+        self.item.refresh_from_db()
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(self.item.quantity, 7)
+
+    def test_retry_after_server_error_runs_again(self):
+        with mock.patch.object(Item, 'update_stock', side_effect=OperationalError('database is locked')):
+            with self.assertRaises(OperationalError), self.assertLogs('django.request', 'ERROR'):
+                self.post({'transaction_type': 'OUT', 'quantity': 3}, 'scan-3')
+        retry = self.post({'transaction_type': 'OUT', 'quantity': 3}, 'scan-3')
+
+        self.item.refresh_from_db()
+        self.assertEqual(retry.status_code, 200)
+        self.assertNotIn('Idempotent-Replayed', retry)
+        self.assertEqual(self.item.quantity, 7)
+
+    def test_rejected_movement_is_a_client_error(self):
+        response = self.post({'transaction_type': 'OUT', 'quantity': 30}, 'scan-4')
+        retry = self.post({'transaction_type': 'OUT', 'quantity': 30}, 'scan-4')
+
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(retry.json(), {'success': False, 'error': 'Stock cannot be negative'})
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+        unknown = self.post({'transaction_type': 'RETURN', 'quantity': 3}, 'scan-5')
+        self.assertEqual(unknown.status_code, 400)
+        self.assertEqual(self.post(['OUT', 3], 'scan-6').status_code, 400)
+        self.item.refresh_from_db()
+        self.assertEqual(self.item.quantity, 10)
+        missing = self.client.post(reverse('inventory:api_stock_update', args=[0]), data='{}',
+                                   content_type='application/json')
+        self.assertEqual(missing.status_code, 404)
+
+    def test_buffered_scan_retry_is_not_queued_twice(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        body = json.dumps({'item_id': self.item.pk, 'transaction_type': 'OUT', 'quantity': 1})
+        with override_settings(SCAN_JOURNAL_PATH=str(Path(tmpdir) / 'journal.sqlite3')):
+            url = reverse('inventory:api_scan_events')
+            first = self.client.post(url, data=body, content_type='application/json',
+                                     HTTP_IDEMPOTENCY_KEY='batch-1')
+            retry = self.client.post(url, data=body, content_type='application/json',
+                                     HTTP_IDEMPOTENCY_KEY='batch-1')
+
+            self.assertEqual(get_journal().pending_count(), 1)
+        self.assertEqual(retry.json()['sequence'], first.json()['sequence'])
+        self.assertEqual(retry['Idempotent-Replayed'], 'true')
+
+
+class QueryBudgetMiddlewareTests(TestCase):
+    """Per-request SQL instrumentation"""
+
+    def setUp(self):
+        self.staff = User.objects.create_user('auditor', password='pw', is_staff=True)
+        Item.objects.create(name='Budget Widget', quantity=5, price=1)
+
+    def test_staff_responses_carry_sql_headers(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse('inventory:home'))
+
+        self.assertGreater(int(response['X-SQL-Queries']), 0)
+        self.assertIn('X-SQL-Time-Ms', response)
+        self.assertEqual(response['X-SQL-Budget'], '5')
+
+    def test_rows_count_what_reads_fetch(self):
+        category = Category.objects.resolve('Budget')
+        Item.objects.bulk_create([Item(name=f'Budget {n}', quantity=n, price=1, category=category) for n in range(7)])
+        stats = QueryStats()
+        with connection.execute_wrapper(stats):
+            self.assertEqual(len(list(Item.objects.all())), 8)
+        self.assertEqual(stats.rows, 8)
+        with connection.execute_wrapper(stats):
+            Item.objects.filter(name__startswith='Budget ').update(reorder_level=3)
+            Item.objects.filter(quantity=0).exists()
+        self.assertEqual(stats.rows, 8 + 8 + 1)
+
+    def test_anonymous_responses_are_logged_instead(self):
+        with self.assertLogs('inventory.sql', level='INFO') as logs:
+            response = self.client.get(reverse('inventory:home'))
+
+        self.assertNotIn('X-SQL-Queries', response)
+        report = json.loads(logs.records[-1].getMessage())
+        self.assertEqual(report['url_name'], 'inventory:home')
+
+    @override_settings(SQL_QUERY_BUDGETS={'inventory:home': 0})
+    def test_exceeding_budget_fails_under_test_runner(self):
+        with self.assertRaises(QueryBudgetExceeded):
+            self.client.get(reverse('inventory:home'))
+
+    def test_fingerprint_ignores_literal_values(self):
+        self.assertEqual(
+            fingerprint("SELECT * FROM t WHERE id = 1 AND name = 'a' AND x IN (%s, %s)"),
+            fingerprint("SELECT * FROM t WHERE id = 22 AND name = 'b' AND x IN (%s)"),
+        )
+
+
+class MetricsEndpointTests(TestCase):
+    """File-backed metrics exposed on /metrics"""
+
+    def test_reports_view_latency_and_stock_movements(self):
+        item = Item.objects.create(name='Metered Widget', quantity=5, price=1)
+        self.client.get(reverse('inventory:home'))
+        item.update_stock(-1, 'OUT')
+
+        body = self.client.get(reverse('inventory:metrics')).content.decode()
+
+        self.assertIn('inventory_request_duration_seconds_count{view="inventory:home"}', body)
+        self.assertRegex(body, r'inventory_stock_movements_total\{type="OUT"\} \d+')
+        self.assertIn('# TYPE inventory_stock_movements_per_second gauge', body)
+
+    def test_merges_snapshots_from_other_workers(self):
+        metrics.registry.inc('inventory_cache_requests_total', {'cache': 'test', 'result': 'hit'}, 2)
+        other_worker = Path(settings.METRICS_DIR) / f'{os.getppid()}-1.json'
+        other_worker.write_text(json.dumps({
+            'counters': [['inventory_cache_requests_total', [['cache', 'test'], ['result', 'hit']], 3]],
+            'histograms': [],
+            'movement_seconds': [],
+        }))
+        self.addCleanup(other_worker.unlink)
+
+        counters, _, _ = metrics.collect()
+        own = metrics.registry.counters[('inventory_cache_requests_total', (('cache', 'test'), ('result', 'hit')))]
+        self.assertEqual(
+            counters[('inventory_cache_requests_total', (('cache', 'test'), ('result', 'hit')))],
+            own + 3,
+        )
+
+    def test_dead_workers_keep_counters_but_not_gauges(self):
+        key = ('inventory_cache_requests_total', (('cache', 'gone'), ('result', 'hit')))
+        snapshot = {
+            'counters': [['inventory_cache_requests_total', [['cache', 'gone'], ['result', 'hit']], 3]],
+            'histograms': [],
+            'movement_seconds': [[int(timezone.now().timestamp()), 120]],
+        }
+        dead_workers = [Path(settings.METRICS_DIR) / f'99999{n}-1.json' for n in (8, 9)]
+        for path in dead_workers:
+            path.write_text(json.dumps(snapshot))
+        archive = Path(settings.METRICS_DIR) / metrics.ARCHIVE
+        self.addCleanup(archive.unlink)
+
+        with mock.patch.object(metrics, '_alive', lambda pid: pid != 999998):
+            counters, _, live_rate = metrics.collect()
+            self.assertEqual(counters[key], 6)
+        self.assertFalse(dead_workers[0].exists())
+
+        counters, _, rate = metrics.collect()
+        self.assertEqual(counters[key], 6)
+        # Only the worker still alive then added to the rate
+        self.assertAlmostEqual(live_rate - rate, 2, delta=0.1)
+        self.assertEqual(sorted(p.name for p in Path(settings.METRICS_DIR).glob('99999*')), [])
+
+    def test_remote_anonymous_clients_are_refused(self):
+        response = self.client.get(reverse('inventory:metrics'), REMOTE_ADDR='203.0.113.9')
+        self.assertEqual(response.status_code, 403)
+
+
+class HttpBenchmarkTests(TestCase):
+    """Coverage and statistics of the bench_http command"""
+
+    def test_every_inventory_url_has_a_scenario(self):
+        self.assertEqual({pattern.name for pattern in urlpatterns}, set(SCENARIOS))
+
+    def test_percentile_uses_nearest_rank(self):
+        values = list(range(1, 101))
+        self.assertEqual(percentile(values, 50), 50)
+        self.assertEqual(percentile(values, 95), 95)
+        self.assertEqual(percentile([7], 99), 7)
+
+
+class StressHarnessTests(TestCase):
+    """Ledger verification and error classification of stress_stock"""
+
+    def test_verify_reconciles_quantity_with_ledger(self):
+        item = Item.objects.create(name='Stressed Widget', quantity=10, price=1, reorder_level=0)
+        item.update_stock(-3, 'OUT')
+        item.update_stock(5, 'IN')
+        self.assertEqual(verify([item.pk], opening=10), [])
+
+        Item.objects.filter(pk=item.pk).update(quantity=F('quantity') - 1)
+        self.assertEqual(verify([item.pk], opening=10), [{'item': item.pk, 'expected': 12, 'actual': 11}])
+
+    def test_classify_lock_errors(self):
+        self.assertEqual(classify(Exception('deadlock detected')), 'deadlock')
+        self.assertEqual(classify(Exception('database is locked')), 'retry')
+        self.assertIsNone(classify(Exception('Stock cannot be negative')))
+
+
+class GenerateDataTests(TestCase):
+    """Reproducibility of generate_inventory_data"""
+
+    def generate(self):
+        call_command('generate_inventory_data', items=20, transactions=300, days=30, seed=7,
+                     end_date=date(2026, 3, 31), prefix='REPRO', clear=True, stdout=StringIO())
+        items = list(Item.objects.filter(name__startswith='REPRO-').order_by('name').values_list(
+            'name', 'quantity', 'price', 'reorder_level', 'category__name', 'supplier__name', 'created_at',
+        ))
+        ledger = list(InventoryTransaction.objects.filter(item__name__startswith='REPRO-').order_by(
+            'timestamp', 'item__name',
+        ).values_list('item__name', 'transaction_type', 'quantity', 'quantity_change', 'reason', 'timestamp'))
+        return items, ledger
+
+    def test_same_seed_gives_same_data(self):
+        items, ledger = self.generate()
+        self.assertEqual(len(ledger), 300)
+        self.assertEqual(ledger[-1][-1].date(), date(2026, 3, 31))
+        self.assertEqual(ledger[0][-1].date(), date(2026, 3, 2))
+        self.assertEqual(self.generate(), (items, ledger))
+
+
+class QueryCountTests(TestCase):
+    """Pinned query counts per view; they must not grow with the data"""
+
+    SIZES = (3, 40)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('qc_admin', 'qc@example.com', 'pw')
+        cls.item = Item.objects.create(name='Anchor Widget', quantity=50, price=1, reorder_level=5)
+        cls.item.update_stock(-1, 'OUT', user=cls.admin)
+        cls.alert = InventoryAlert.objects.create(item=cls.item, alert_type='LOW_STOCK', message='x')
+        cls.populated = 0
+
+    def grow_to(self, size):
+        """Add items, ledger rows and alerts until there are `size` generated items"""
+        if size <= self.populated:
+            return
+        categories = [Category.objects.resolve(f'Category {n}') for n in range(4)]
+        suppliers = [Supplier.objects.resolve(f'Supplier {n}') for n in range(5)]
+        items = Item.objects.bulk_create([
+            Item(name=f'QC {n}', quantity=(0, 3, 50)[n % 3], price=n + 1, reorder_level=5,
+                 category=categories[n % 4], supplier=suppliers[n % 5])
+            for n in range(self.populated, size)
+        ])
+        self.populated = size
+        InventoryTransaction.objects.bulk_create([
+            InventoryTransaction(item=item, transaction_type=kind, quantity=2, user=self.admin)
+            for item in items for kind in ('IN', 'OUT')
+        ])
+        InventoryAlert.objects.bulk_create([
+            InventoryAlert(item=item, alert_type='LOW_STOCK', message='x', is_resolved=resolved)
+            for item in items for resolved in (False, True)
+        ])
+
+    def assertStableQueries(self, expected, request):
+        for size in self.SIZES:
+            self.grow_to(size)
+            # Measure the cold path; cached fragments, items and rules would skip queries
+            fragment_cache().clear()
+            item_cache.clear()
+            alert_rules.forget_rules()
+            with self.subTest(size=size), self.assertNumQueries(expected):
+                response = request()
+            self.assertLess(response.status_code, 400)
+
+    def get(self, name, *args, **params):
+        return lambda: self.client.get(reverse(name, args=args), params)
+
+    def post_json(self, name, data, *args):
+        return lambda: self.client.post(reverse(name, args=args), json.dumps(data), content_type='application/json')
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+
+    def test_home(self):
+        self.assertStableQueries(3, self.get('inventory:home'))
+
+    def test_home_search(self):
+        self.assertStableQueries(3, self.get('inventory:home', search='QC'))
+
+    def test_item_detail(self):
+        self.assertStableQueries(3, self.get('inventory:item_detail', self.item.pk))
+
+    def test_item_create(self):
+        self.assertStableQueries(2, self.get('inventory:item_create'))
+
+    def test_item_update(self):
+        self.assertStableQueries(3, self.get('inventory:item_update', self.item.pk))
+
+    def test_item_delete(self):
+        self.assertStableQueries(3, self.get('inventory:item_delete', self.item.pk))
+
+    def test_register(self):
+        self.client.logout()
+        self.assertStableQueries(0, self.get('inventory:register'))
+
+    def test_update_stock_form(self):
+        self.assertStableQueries(4, self.get('inventory:update_stock', self.item.pk))
+
+    def test_update_stock_post(self):
+        url = reverse('inventory:update_stock', args=[self.item.pk])
+        self.assertStableQueries(17, lambda: self.client.post(url, {'transaction_type': 'IN', 'quantity': 1}))
+
+    def test_analytics(self):
+        self.assertStableQueries(17, self.get('inventory:analytics'))
+
+    def test_reports(self):
+        expected = {'stock_levels': 4, 'low_stock': 4, 'category_summary': 4, 'all_items': 5}
+        for report_type, queries in expected.items():
+            with self.subTest(report_type=report_type):
+                self.assertStableQueries(queries, self.get('inventory:reports_filtered', report_type))
+
+    def test_reports_default(self):
+        self.assertStableQueries(4, self.get('inventory:reports'))
+
+    def test_manage_alerts(self):
+        self.assertStableQueries(7, self.get('inventory:manage_alerts'))
+
+    def test_resolve_alert(self):
+        self.assertStableQueries(6, self.get('inventory:resolve_alert', self.alert.pk))
+
+    def test_api_stock_update(self):
+        self.assertStableQueries(17, self.post_json(
+            'inventory:api_stock_update', {'transaction_type': 'IN', 'quantity': 1}, self.item.pk
+        ))
+
+    def test_api_scan_events(self):
+        self.assertStableQueries(2, self.post_json('inventory:api_scan_events', {'item_id': self.item.pk}))
+
+    def test_api_generate_alerts(self):
+        def queue_sweep():
+            response = self.client.post(reverse('inventory:api_generate_alerts'))
+            Job.objects.all().delete()
+            return response
+        self.assertStableQueries(6, queue_sweep)
+
+    def test_api_job_status(self):
+        job = jobs.enqueue('sweep_alerts')
+        self.assertStableQueries(3, self.get('inventory:api_job_status', job.pk))
+
+    def test_api_sync(self):
+        since = ChangeEvent.objects.earliest('pk').pk - 1
+        self.assertStableQueries(6, self.get('inventory:api_sync', since=since))
+        # The snapshot cursor: the newest settled event (none here, so the oldest), then the events after it
+        self.assertStableQueries(6, self.get('inventory:api_sync', limit=20))
+
+    def test_bulk_read_api(self):
+        self.assertStableQueries(3, self.get('inventory:api_items', fields='id,name,status,total_value'))
+        self.assertStableQueries(3, self.get('inventory:api_transactions', fields='id,item_name,quantity'))
+        self.assertStableQueries(3, self.get('inventory:api_alerts', resolved='false'))
+
+    def test_job_download(self):
+        job = jobs.enqueue('export_report', {'report_type': 'low_stock'})
+        with override_settings(JOB_OUTPUT_DIR=tempfile.mkdtemp()):
+            self.addCleanup(shutil.rmtree, settings.JOB_OUTPUT_DIR, ignore_errors=True)
+            jobs.run(jobs.claim('test'))
+            self.assertStableQueries(3, self.get('inventory:job_download', job.pk))
+
+    def test_api_dashboard_data(self):
+        self.assertStableQueries(7, self.get('inventory:api_dashboard_data'))
+
+    def test_metrics(self):
+        self.assertStableQueries(2, self.get('inventory:metrics'))
+
+    def test_admin_changelists(self):
+        for model in ('item', 'inventorytransaction', 'inventoryalert'):
+            with self.subTest(model=model):
+                self.assertStableQueries(
+                    {'item': 7, 'inventorytransaction': 8, 'inventoryalert': 8}[model],
+                    self.get(f'admin:inventory_{model}_changelist'),
+                )
+
+
+class FragmentCacheTests(TestCase):
+    """Per-item and per-category fragment caching on list pages"""
+
+    def setUp(self):
+        fragment_cache().clear()
+        self.user = User.objects.create_user('fragments', password='pw')
+        self.client.force_login(self.user)
+        self.tools = Category.objects.resolve('Tools')
+        self.items = [
+            Item.objects.create(name=f'Cached {n}', quantity=20, price=1, category=self.tools) for n in range(3)
+        ]
+
+    def lookups(self, fragment):
+        counters = metrics.registry.counters
+        return tuple(
+            counters.get(('inventory_cache_requests_total', (('cache', f'fragment:{fragment}'), ('result', result))), 0)
+            for result in ('hit', 'miss')
+        )
+
+    def test_list_rerenders_only_changed_rows(self):
+        self.client.get(reverse('inventory:home'))
+        hits, misses = self.lookups('item_card')
+        self.client.get(reverse('inventory:home'))
+        self.assertEqual(self.lookups('item_card'), (hits + 3, misses))
+
+        self.items[1].update_stock(-5, 'OUT')
+        response = self.client.get(reverse('inventory:home'))
+        self.assertEqual(self.lookups('item_card'), (hits + 5, misses + 1))
+        self.assertContains(response, 'Qty: 15')
+
+    def test_category_block_follows_item_changes(self):
+        url = reverse('inventory:reports_filtered', args=['all_items'])
+        self.client.get(url)
+        hits, misses = self.lookups('report_category')
+        self.assertContains(self.client.get(url), 'Cached 2')
+        self.assertEqual(self.lookups('report_category'), (hits + 1, misses))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.items[2].update_stock(-7, 'OUT')
+        self.assertContains(self.client.get(url), '13')
+        self.assertEqual(self.lookups('report_category'), (hits + 1, misses + 1))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            garden = Category.objects.resolve('Garden')
+            self.items[2].category = garden
+            self.items[2].save()
+        versions = category_versions([self.tools.pk, garden.pk])
+        self.client.get(url)
+        self.assertEqual(self.lookups('report_category'), (hits + 1, misses + 3))
+        self.assertEqual(category_versions([self.tools.pk, garden.pk]), versions)
+
+    @override_settings(FRAGMENT_VERSION_LOCAL_TTL=10)
+    def test_process_local_versions_expire_to_fresh_ones(self):
+        versions = category_versions([self.tools.pk])
+        later = timezone.now().timestamp() + 11
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            expired = category_versions([self.tools.pk])
+            self.assertGreater(expired[self.tools.pk], versions[self.tools.pk])
+            self.assertEqual(category_versions([self.tools.pk]), expired)
+
+    @override_settings(FRAGMENT_CACHE_MAX_BYTES=10)
+    def test_oversized_fragments_are_not_stored(self):
+        self.client.get(reverse('inventory:home'))
+        self.client.get(reverse('inventory:home'))
+        hits, misses = self.lookups('item_card')
+        self.client.get(reverse('inventory:home'))
+        self.assertEqual(self.lookups('item_card'), (hits, misses + 3))
+
+
+    @override_settings(FRAGMENT_CACHE_MAX_BYTES=8)
+    def test_fragment_size_is_counted_in_bytes(self):
+        set_fragment('test', ['ascii'], 'a' * 8)
+        set_fragment('test', ['wide'], '\u20ac' * 3)
+        self.assertEqual(fragment_cache().get(fragment_key('test', ['ascii'])), 'a' * 8)
+        self.assertIsNone(fragment_cache().get(fragment_key('test', ['wide'])))
+
+
+class ItemRowTests(TestCase):
+    """SQL-computed row projections match the model properties"""
+
+    def test_rows_match_model_properties(self):
+        for name, quantity in (('Empty', 0), ('Low', 4), ('Plenty', 40)):
+            Item.objects.create(name=name, quantity=quantity, price='2.50', reorder_level=5)
+
+        rows = {row.name: row for row in item_rows(Item.objects.all())}
+        for item in Item.objects.all():
+            row = rows[item.name]
+            self.assertEqual(row.pk, item.pk)
+            self.assertEqual(row.stock_status, item.stock_status)
+            self.assertEqual(row.total_value, item.total_value)
+            self.assertEqual(row.is_low_stock, item.is_low_stock)
+
+
+def shared_l2(directory):
+    """Settings with the items cache's L2 on a file cache, which other processes can read"""
+    return override_settings(CACHES={**settings.CACHES, 'items-shared': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache', 'LOCATION': directory,
+    }})
+
+
+def _set_in_child(name, bus, key, value):
+    TieredCache(name, {'OPTIONS': {'L2': 'items-shared', 'BUS': bus}}).set(key, value)
+
+
+class ItemCacheTests(TestCase):
+    """Read-through item cache and its invalidation"""
+
+    def setUp(self):
+        item_cache.clear()
+        self.user = User.objects.create_user('cached', password='pw')
+        self.client.force_login(self.user)
+        self.item = Item.objects.create(name='Hot Widget', quantity=30, price=1, reorder_level=5)
+
+    def test_warm_detail_skips_item_query(self):
+        url = reverse('inventory:item_detail', args=[self.item.pk])
+        with self.assertNumQueries(3):
+            self.client.get(url)
+        with self.assertNumQueries(2):
+            response = self.client.get(url)
+        self.assertContains(response, 'Hot Widget')
+
+    def test_shared_tier_refills_local_tier(self):
+        tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp, ignore_errors=True)
+        self.enterContext(shared_l2(tmp))
+        item_cache.clear()
+        item_cache.get_item(self.item.pk)
+        item_cache.item_cache().clear_local()
+        with self.assertNumQueries(0):
+            self.assertEqual(item_cache.get_item(self.item.pk).name, 'Hot Widget')
+
+    def test_stock_movement_invalidates(self):
+        item_cache.get_item(self.item.pk).update_stock(-4, 'OUT')
+        self.assertEqual(item_cache.get_item(self.item.pk).quantity, 26)
+
+        self.client.post(reverse('inventory:api_stock_update', args=[self.item.pk]),
+                         json.dumps({'transaction_type': 'ADJUST', 'quantity': 12}),
+                         content_type='application/json')
+        self.assertEqual(item_cache.get_item(self.item.pk).quantity, 12)
+
+    def test_queryset_update_needs_explicit_invalidation(self):
+        item_cache.get_item(self.item.pk)
+        Item.objects.filter(pk=self.item.pk).update(quantity=1)
+        self.assertEqual(item_cache.get_item(self.item.pk).quantity, 30)
+        item_cache.invalidate(self.item.pk)
+        self.assertEqual(item_cache.get_item(self.item.pk).quantity, 1)
+
+    def test_delete_invalidates(self):
+        item_cache.get_item(self.item.pk)
+        self.item.delete()
+        with self.assertRaises(Item.DoesNotExist):
+            item_cache.get_item(self.item.pk)
+
+    def test_fill_that_raced_an_invalidation_is_never_read(self):
+        stale = Item.objects.select_related('category', 'supplier').get(pk=self.item.pk)
+        key = item_cache.item_key(self.item.pk, item_cache._generation(self.item.pk))
+        self.item.update_stock(-4, 'OUT')
+        # The reader loaded its row before the write and fills in afterwards
+        self.assertTrue(item_cache.item_cache().add(key, stale))
+        self.assertEqual(item_cache.get_item(self.item.pk).quantity, 26)
+
+    def test_callers_get_private_copies(self):
+        item_cache.get_item(self.item.pk).quantity = 999
+        self.assertEqual(item_cache.get_item(self.item.pk).quantity, 30)
+
+
+class TieredCacheTests(TestCase):
+    """L1/L2 cache backend with a file bus standing in for pub/sub"""
+
+    def setUp(self):
+        self.tmp = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp, ignore_errors=True)
+        self.bus = f'file:{self.tmp}/bus'
+        self.enterContext(shared_l2(f'{self.tmp}/l2'))
+        # Two names give two independent L1 tiers, like two gunicorn workers
+        self.workers = [self.worker(name) for name in (f'worker-a-{id(self)}', f'worker-b-{id(self)}')]
+        self.workers[0].clear()
+
+    def worker(self, name):
+        return TieredCache(name, {'OPTIONS': {'L2': 'items-shared', 'L1_TIMEOUT': 60, 'BUS': self.bus}})
+
+    def lookups(self, cache, tier):
+        counters = metrics.registry.counters
+        return tuple(
+            counters.get(('inventory_cache_requests_total', (('cache', f'{cache.name}:{tier}'), ('result', result))), 0)
+            for result in ('hit', 'miss')
+        )
+
+    def test_reads_fill_l1_from_l2(self):
+        a, b = self.workers
+        a.set('k', {'v': 1})
+        self.assertEqual(b.get('k'), {'v': 1})
+        self.assertEqual(self.lookups(b, 'l1'), (0, 1))
+        self.assertEqual(self.lookups(b, 'l2'), (1, 0))
+
+        value = b.get('k')
+        value['v'] = 2
+        self.assertEqual(b.get('k'), {'v': 1})
+        self.assertEqual(self.lookups(b, 'l1'), (2, 1))
+
+    def test_writes_invalidate_other_workers(self):
+        a, b = self.workers
+        a.set('k', 1)
+        b.get('k')
+        a.set('k', 2)
+        self.assertEqual(b.get('k'), 2)
+        a.delete('k')
+        self.assertIsNone(b.get('k'))
+
+        b.set_many({'x': 1, 'y': 2})
+        a.get_many(['x', 'y'])
+        b.clear()
+        self.assertEqual(a.get_many(['x', 'y']), {})
+
+    def test_write_in_another_process_is_seen(self):
+        a, b = self.workers
+        self.assertIsNone(b.get('k'))
+        b.set('k', 'old')
+        child = multiprocessing.get_context('fork').Process(target=_set_in_child, args=(a.name, self.bus, 'k', 'new'))
+        child.start()
+        child.join()
+        self.assertEqual(child.exitcode, 0)
+        self.assertEqual(b.get('k'), 'new')
+        self.assertEqual(self.worker(f'worker-c-{id(self)}').get('k'), 'new')
+
+    def test_process_local_l2_is_left_out(self):
+        with override_settings(CACHES={**settings.CACHES, 'items-shared': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': f'tiered-{id(self)}',
+        }}):
+            a, b = self.workers
+            a.set('k', 1)
+            self.assertEqual(a.get('k'), 1)
+            self.assertIsNone(b.get('k'))
+            self.assertIsNone(caches['items-shared'].get('k'))
+
+    def test_add_fills_without_broadcasting(self):
+        a, b = self.workers
+        self.assertIsNone(b.get('k'))
+        listener = FileBus(self.bus[len('file:'):])
+        self.assertTrue(a.add('k', 1))
+        self.assertFalse(a.add('k', 2))
+        self.assertEqual(listener.poll(), [])
+        self.assertEqual(b.get('k'), 1)
+
+    def test_incr_invalidates_other_workers(self):
+        a, b = self.workers
+        a.set('n', 1)
+        b.get('n')
+        self.assertEqual(a.incr('n'), 2)
+        self.assertEqual(b.get('n'), 2)
+
+    def test_file_bus_follows_rotation(self):
+        writer = FileBus(f'{self.tmp}/rotating', max_bytes=200)
+        reader = FileBus(f'{self.tmp}/rotating', max_bytes=200)
+        sent = [{'origin': 'w', 'keys': [f'key-{n}']} for n in range(20)]
+        received = []
+        for message in sent:
+            writer.publish(message)
+            received += reader.poll()
+        self.assertEqual(received, sent)
+        self.assertGreater(reader.generation, 1)
+
+    def test_file_bus_reader_that_falls_behind_clears(self):
+        writer = FileBus(f'{self.tmp}/rotating', max_bytes=200)
+        reader = FileBus(f'{self.tmp}/rotating', max_bytes=200)
+        for n in range(20):
+            writer.publish({'origin': 'w', 'keys': [f'key-{n}']})
+        self.assertIn({'origin': None, 'clear': True}, reader.poll())
+
+    def test_local_lru_is_bounded_and_expires(self):
+        lru = LocalLRU(max_entries=2)
+        for key in 'abc':
+            lru.set(key, key, 60)
+        self.assertIsNone(lru.get('a'))
+        self.assertEqual(len(lru), 2)
+
+        with mock.patch('inventory.tiered_cache.time.monotonic', return_value=10 ** 9):
+            self.assertIsNone(lru.get('b'))
+
+
+class JobQueueTests(TestCase):
+    """Database job queue: claiming, retries, leases and the job APIs"""
+
+    def setUp(self):
+        self.output_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.output_dir, ignore_errors=True)
+        self.enterContext(override_settings(JOB_OUTPUT_DIR=self.output_dir))
+        self.calls = []
+        self.enterContext(mock.patch.dict(jobs.tasks, {'flaky': self.flaky}))
+
+    def flaky(self, progress, fail_times=0):
+        self.calls.append(progress.job.attempts)
+        progress.report(1, 2, 'halfway')
+        if len(self.calls) <= fail_times:
+            raise RuntimeError('boom')
+        return {'calls': len(self.calls)}
+
+    def test_claims_by_priority_then_age(self):
+        low = jobs.enqueue('flaky')
+        high = jobs.enqueue('flaky', priority=5)
+        later = jobs.enqueue('flaky')
+        self.assertEqual([jobs.claim('w').pk for _ in range(3)], [high.pk, low.pk, later.pk])
+        self.assertIsNone(jobs.claim('w'))
+
+    def test_claimed_job_is_not_claimed_twice(self):
+        job = jobs.enqueue('flaky')
+        self.assertEqual(jobs.claim('a').locked_by, 'a')
+        self.assertIsNone(jobs.claim('b'))
+        self.assertEqual(Job.objects.get(pk=job.pk).attempts, 1)
+
+    def test_dedupe_key_shares_active_job(self):
+        first = jobs.enqueue('flaky', dedupe_key='same')
+        self.assertEqual(jobs.enqueue('flaky', dedupe_key='same').pk, first.pk)
+        jobs.work(worker='w', burst=True)
+        self.assertNotEqual(jobs.enqueue('flaky', dedupe_key='same').pk, first.pk)
+
+    def test_failures_retry_with_backoff_then_fail(self):
+        job = jobs.enqueue('flaky', {'fail_times': 5}, max_attempts=2)
+        with self.assertLogs('inventory.jobs', 'WARNING'):
+            job = jobs.run(jobs.claim('w'))
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertGreater(job.run_after, timezone.now())
+        self.assertIsNone(jobs.claim('w'))
+
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        with self.assertLogs('inventory.jobs', 'WARNING'):
+            job = jobs.run(jobs.claim('w'))
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertIn('RuntimeError: boom', job.error)
+        self.assertEqual(self.calls, [1, 2])
+
+    def test_success_records_result_and_progress(self):
+        jobs.enqueue('flaky', {'fail_times': 1}, max_attempts=3)
+        with self.assertLogs('inventory.jobs', 'WARNING'):
+            job = jobs.run(jobs.claim('w'))
+        Job.objects.filter(pk=job.pk).update(run_after=timezone.now())
+        job = jobs.run(jobs.claim('w'))
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result, {'calls': 2})
+        self.assertEqual((job.progress_current, job.progress_total, job.progress_message), (1, 2, 'halfway'))
+
+    def test_expired_lease_goes_back_to_queue(self):
+        job = jobs.enqueue('flaky', max_attempts=2)
+        jobs.claim('dead-worker')
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(jobs.requeue_stale(), 1)
+        self.assertEqual(jobs.claim('w').attempts, 2)
+
+        Job.objects.filter(pk=job.pk).update(heartbeat_at=timezone.now() - timedelta(hours=1))
+        jobs.requeue_stale()
+        self.assertEqual(Job.objects.get(pk=job.pk).status, Job.FAILED)
+
+    def test_alert_sweep_runs_in_background(self):
+        anonymous = self.client.post(reverse('inventory:api_generate_alerts'))
+        self.assertEqual(anonymous.status_code, 302)
+        self.assertFalse(Job.objects.exists())
+        self.client.force_login(User.objects.create_user('sweeper', password='pw'))
+        Item.objects.create(name='Nearly Out', quantity=1, reorder_level=5, price=1)
+        response = self.client.post(reverse('inventory:api_generate_alerts'))
+        self.assertEqual(response.status_code, 202)
+        status_url = response.json()['status_url']
+        self.assertEqual(self.client.get(status_url).json()['job']['status'], Job.QUEUED)
+        self.assertFalse(InventoryAlert.objects.exists())
+
+        call_command('run_jobs', burst=True, stdout=StringIO())
+        job = self.client.get(status_url).json()['job']
+        self.assertEqual(job['status'], Job.SUCCEEDED)
+        self.assertEqual(job['result'], {'generated_count': 1})
+        self.assertEqual(job['progress']['current'], 1)
+        self.assertTrue(InventoryAlert.objects.filter(item__name='Nearly Out').exists())
+
+    def test_report_export_download(self):
+        user = User.objects.create_user('exporter', password='pw')
+        self.client.force_login(user)
+        Item.objects.create(name='Exported Widget', quantity=2, reorder_level=5, price=3)
+        response = self.client.post(reverse('inventory:api_export_report', args=['low_stock']))
+        jobs.work(worker='w', burst=True)
+
+        job = self.client.get(response.json()['status_url']).json()['job']
+        self.assertEqual(job['result']['rows'], 1)
+        download = self.client.get(job['download_url'])
+        self.client.logout()
+        self.assertEqual(self.client.get(response.json()['status_url']).status_code, 302)
+        content = b''.join(download.streaming_content).decode()
+        self.assertIn('Exported Widget,General,2,3.00,6.00,Low Stock', content)
+
+
+class AlertRuleTests(TestCase):
+    """Alert rules compiled into set-based alert sweeps"""
+
+    def setUp(self):
+        # Rolled-back rules never fire post_delete, so the cached rule list would outlive the test
+        alert_rules.forget_rules()
+        self.addCleanup(alert_rules.forget_rules)
+        self.user = User.objects.create_user('rules', password='x')
+        self.hardware = Category.objects.resolve('Hardware')
+        self.bolts = Item.objects.create(name='Bolts', quantity=400, reorder_level=5, price=1, category=self.hardware)
+        self.nuts = Item.objects.create(name='Nuts', quantity=30, reorder_level=5, price=1, category=self.hardware)
+        self.glue = Item.objects.create(
+            name='Glue', quantity=8, reorder_level=5, price=1, category=Category.objects.resolve('Supplies'),
+        )
+
+    def open_alerts(self):
+        return dict(InventoryAlert.objects.filter(is_resolved=False).values_list('item__name', 'alert_type'))
+
+    @override_settings(ALERT_RULES_CACHE_TIMEOUT=60)
+    def test_cached_rules_expire(self):
+        alert_rules.active_rules()
+        # Written without signals, as by a worker whose cache is not shared with this one
+        AlertRule.objects.bulk_create([AlertRule(category=self.hardware, max_quantity=100)])
+        self.assertEqual(alert_rules.active_rules(), [])
+        later = timezone.now().timestamp() + 61
+        with mock.patch('django.core.cache.backends.locmem.time.time', return_value=later):
+            self.assertEqual([rule['max_quantity'] for rule in alert_rules.active_rules()], [100])
+
+    def test_rule_changes_move_to_a_new_version(self):
+        alert_rules.active_rules()
+        version = cache.get(alert_rules.RULES_VERSION_KEY)
+        rule = AlertRule.objects.create(category=self.hardware, max_quantity=100)
+        self.assertNotEqual(cache.get(alert_rules.RULES_VERSION_KEY), version)
+        self.assertEqual([r['max_quantity'] for r in alert_rules.active_rules()], [100])
+        rule.delete()
+        self.assertEqual(alert_rules.active_rules(), [])
+
+    def test_reorder_level_applies_without_rules(self):
+        Item.objects.filter(pk=self.glue.pk).update(quantity=4)
+        self.assertEqual(Item.sweep_alerts(), 1)
+        self.assertEqual(self.open_alerts(), {'Glue': 'LOW_STOCK'})
+        self.assertIn('Reorder level: 5', InventoryAlert.objects.get().message)
+
+    def test_category_max_raises_overstock(self):
+        AlertRule.objects.create(category=self.hardware, max_quantity=100)
+        self.assertEqual(Item.sweep_alerts(), 1)
+        self.assertEqual(self.open_alerts(), {'Bolts': 'OVERSTOCK'})
+        self.assertIn('Maximum: 100', InventoryAlert.objects.get().message)
+
+    def test_item_rule_overrides_category_and_global(self):
+        AlertRule.objects.create(min_quantity=10)
+        AlertRule.objects.create(category=self.hardware, min_quantity=50, max_quantity=100)
+        AlertRule.objects.create(item=self.bolts, max_quantity=500)
+        Item.sweep_alerts()
+        # Bolts keeps the category minimum but takes its own maximum
+        self.assertEqual(self.open_alerts(), {'Nuts': 'LOW_STOCK', 'Glue': 'LOW_STOCK'})
+        self.assertIn('Reorder level: 10', InventoryAlert.objects.get(item=self.glue).message)
+
+    def test_days_of_cover_uses_recent_out_movements(self):
+        AlertRule.objects.create(category=self.hardware, days_of_cover=14)
+        # 60 out over a 30-day window is 2 a day: 30 left covers 15 days, 20 covers 10
+        InventoryTransaction.objects.create(item=self.nuts, transaction_type='OUT', quantity=60, user=self.user)
+        old = InventoryTransaction.objects.create(item=self.bolts, transaction_type='OUT', quantity=9000, user=self.user)
+        InventoryTransaction.objects.filter(pk=old.pk).update(timestamp=timezone.now() - timedelta(days=45))
+        Item.sweep_alerts()
+        self.assertEqual(self.open_alerts(), {})
+
+        Item.objects.filter(pk=self.nuts.pk).update(quantity=20)
+        Item.sweep_alerts()
+        self.assertEqual(self.open_alerts(), {'Nuts': 'LOW_STOCK'})
+        self.assertIn('less than 14 days of cover', InventoryAlert.objects.get().message)
+
+    def test_sweep_queries_do_not_grow_with_rules(self):
+        AlertRule.objects.create(category=self.hardware, max_quantity=100)
+        alert_rules.forget_rules()
+        with self.assertNumQueries(8):
+            Item.sweep_alerts()
+        for n in range(20):
+            category = Category.objects.resolve(f'C{n}')
+            item = Item.objects.create(name=f'Ruled {n}', quantity=n, reorder_level=5, price=1, category=category)
+            AlertRule.objects.create(item=item, min_quantity=10, days_of_cover=7)
+            AlertRule.objects.create(category=category, max_quantity=15)
+        alert_rules.forget_rules()
+        with self.assertNumQueries(8):
+            Item.sweep_alerts()
+        self.assertEqual(InventoryAlert.objects.filter(item__name__startswith='Ruled').count(), 15)
+
+    def test_saving_a_rule_refreshes_stock_checks(self):
+        self.nuts.update_stock(5, 'IN', self.user)
+        self.assertEqual(self.open_alerts(), {})
+        AlertRule.objects.create(item=self.nuts, max_quantity=20)
+        self.nuts.update_stock(1, 'IN', self.user)
+        self.assertEqual(self.open_alerts(), {'Nuts': 'OVERSTOCK'})
+
+
+@override_settings(ALERT_DIGEST_RECIPIENTS=['ops@example.com', 'buyer@example.com'], ALERT_DIGEST_INTERVAL=0)
+class AlertDigestTests(TestCase):
+    """Outbox-based alert digests sent from the job queue"""
+
+    def setUp(self):
+        alert_rules.forget_rules()
+        self.user = User.objects.create_user('digest', password='x')
+        self.item = Item.objects.create(name='Washers', quantity=20, reorder_level=5, price=1)
+
+    def run_digest_job(self):
+        job = jobs.claim('test-worker', Job.objects.filter(name=notifications.DIGEST_JOB))
+        self.assertIsNotNone(job)
+        return jobs.run(job)
+
+    def test_stock_write_queues_digest_without_mailing(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.update_stock(-17, 'OUT', self.user)
+        self.assertEqual(AlertNotification.objects.count(), 1)
+        self.assertEqual(mail.outbox, [])
+        self.assertEqual(Job.objects.get().dedupe_key, notifications.DIGEST_JOB)
+
+        # Re-checking a condition that is already alerted queues nothing new
+        with self.captureOnCommitCallbacks(execute=True):
+            self.item.update_stock(1, 'IN', self.user)
+            Item.sweep_alerts()
+        self.assertEqual(AlertNotification.objects.count(), 1)
+
+        job = self.run_digest_job()
+        self.assertEqual(job.status, Job.SUCCEEDED)
+        self.assertEqual(job.result, {'recipients': 2, 'notifications': 2})
+        self.assertEqual(sorted(message.to[0] for message in mail.outbox), ['buyer@example.com', 'ops@example.com'])
+        self.assertIn('Washers', mail.outbox[0].body)
+        self.assertFalse(AlertNotification.objects.exists())
+
+    def test_alerts_are_batched_into_one_digest(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(3):
+                Item.objects.create(name=f'Batch {n}', quantity=0, reorder_level=5, price=1)
+            Item.sweep_alerts()
+        with override_settings(ALERT_DIGEST_MAX_ALERTS=2):
+            self.run_digest_job()
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertEqual(mail.outbox[0].subject, '[Inventory] 3 new stock alerts')
+        self.assertIn('and 1 more', mail.outbox[0].body)
+        self.assertEqual(Job.objects.filter(name=notifications.DIGEST_JOB).count(), 1)
+
+    def test_failed_recipient_is_retried_alone(self):
+        Item.objects.filter(pk=self.item.pk).update(quantity=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            Item.sweep_alerts()
+        sent = []
+
+        def send_messages(backend, messages):
+            if messages[0].to == ['buyer@example.com']:
+                raise smtplib.SMTPRecipientsRefused({'buyer@example.com': (550, b'mailbox busy')})
+            sent.extend(messages)
+            return len(messages)
+
+        with mock.patch('django.core.mail.backends.locmem.EmailBackend.send_messages', send_messages):
+            with self.assertLogs('inventory', 'WARNING'):
+                job = self.run_digest_job()
+        self.assertEqual(job.status, Job.QUEUED)
+        self.assertIn('DigestFailed', job.error)
+        self.assertEqual(DigestCursor.objects.get(recipient='buyer@example.com').failures, 1)
+        self.assertEqual(len(sent), 1)
+        self.assertTrue(AlertNotification.objects.exists())
+
+        Job.objects.update(run_after=timezone.now())
+        self.assertEqual(self.run_digest_job().status, Job.SUCCEEDED)
+        self.assertEqual([message.to for message in mail.outbox], [['buyer@example.com']])
+        self.assertFalse(AlertNotification.objects.exists())
+
+    def test_digest_waits_for_a_lower_id_still_being_written(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for n in range(3):
+                Item.objects.create(name=f'Late {n}', quantity=0, reorder_level=5, price=1)
+            Item.sweep_alerts()
+        first, late, last = AlertNotification.objects.order_by('pk')
+        # A notification whose transaction has not committed yet looks like a gap
+        AlertNotification.objects.filter(pk=late.pk).delete()
+        self.assertEqual(self.run_digest_job().result, {'recipients': 2, 'notifications': 2})
+        self.assertEqual(set(DigestCursor.objects.values_list('last_notification_id', flat=True)), {first.pk})
+        self.assertEqual(list(AlertNotification.objects.values_list('pk', flat=True)), [last.pk])
+
+        late.save(force_insert=True)
+        with override_settings(ALERT_DIGEST_MAX_ALERTS=1):
+            notifications.send_digests()
+        self.assertEqual(mail.outbox[-1].subject, '[Inventory] 2 new stock alerts')
+        self.assertFalse(AlertNotification.objects.exists())
+
+    def test_send_command_uses_configured_backend(self):
+        Item.objects.filter(pk=self.item.pk).update(quantity=0)
+        Item.sweep_alerts()
+        output = StringIO()
+        call_command('send_alert_digests', stdout=output)
+        self.assertIn('Mailed 2 notifications in 2 digests', output.getvalue())
+        self.assertEqual(len(mail.outbox), 2)
+        with override_settings(ALERT_DIGEST_RECIPIENTS=[]):
+            with self.assertRaisesMessage(CommandError, 'ALERT_DIGEST_RECIPIENTS is empty'):
+                call_command('send_alert_digests', stdout=StringIO())
+
+
+class ChangeFeedTests(TestCase):
+    """Change events written with each change and read by consumers"""
+
+    def setUp(self):
+        alert_rules.forget_rules()
+        self.user = User.objects.create_user('feed', password='x')
+        self.item = Item.objects.create(name='Hinges', quantity=10, reorder_level=5, price=1)
+        self.handled = []
+        patcher = mock.patch.dict(change_feed.consumers, {'test': self.handled.extend})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def feed(self, **filters):
+        return list(ChangeEvent.objects.filter(**filters).order_by('pk').values_list('topic', 'action', 'object_id'))
+
+    def test_stock_movement_records_events_atomically(self):
+        start = ChangeEvent.objects.latest('pk').pk
+        self.item.update_stock(-7, 'OUT', user=self.user)
+        movement = InventoryTransaction.objects.get()
+        alert = InventoryAlert.objects.get()
+        self.assertEqual(self.feed(pk__gt=start), [
+            ('item', 'update', self.item.pk),
+            ('transaction', 'create', movement.pk),
+            ('alert', 'create', alert.pk),
+        ])
+
+        start = ChangeEvent.objects.latest('pk').pk
+        with self.assertRaises(ValueError):
+            self.item.update_stock(-50, 'OUT', user=self.user)
+        self.assertEqual(self.feed(pk__gt=start), [])
+
+        self.item.update_stock(-1, 'OUT', user=self.user)
+        self.assertIn(('alert', 'delete', alert.pk), self.feed(pk__gt=start))
+
+    def test_single_row_deletes_are_recorded_but_not_cascades(self):
+        self.item.update_stock(-7, 'OUT', user=self.user)
+        movement = InventoryTransaction.objects.get()
+        alert = InventoryAlert.objects.get()
+        expected = [('alert', 'delete', alert.pk), ('transaction', 'delete', movement.pk)]
+        start = ChangeEvent.objects.latest('pk').pk
+        alert.delete()
+        movement.delete()
+        self.assertEqual(self.feed(pk__gt=start), expected)
+
+        self.item.update_stock(-1, 'OUT', user=self.user)
+        start = ChangeEvent.objects.latest('pk').pk
+        item_pk = self.item.pk
+        self.item.delete()
+        self.assertEqual(self.feed(pk__gt=start), [('item', 'delete', item_pk)])
+
+    def test_consumer_offset_is_durable(self):
+        self.item.update_stock(5, 'IN', user=self.user)
+        total = ChangeEvent.objects.count()
+        self.assertEqual(change_feed.consume('test', batch_size=2), 2)
+        self.assertEqual(change_feed.consume('test', batch_size=100), total - 2)
+        self.assertEqual(change_feed.consume('test'), 0)
+        self.assertEqual([event.pk for event in self.handled], list(ChangeEvent.objects.order_by('pk').values_list('pk', flat=True)))
+        self.assertEqual(ConsumerOffset.objects.get(name='test').position, self.handled[-1].pk)
+
+        def broken(events):
+            raise RuntimeError('downstream unavailable')
+
+        self.item.update_stock(5, 'IN', user=self.user)
+        with mock.patch.dict(change_feed.consumers, {'test': broken}), self.assertRaises(RuntimeError):
+            change_feed.consume('test')
+        self.assertEqual(ConsumerOffset.objects.get(name='test').position, self.handled[-1].pk)
+        self.assertEqual(change_feed.consume('test'), 2)
+
+    def test_reads_stop_at_recent_gaps(self):
+        events = [change_feed.record('item', 'update', self.item.pk, self.item.pk) for _ in range(3)]
+        position = events[0].pk - 1
+        # An id whose transaction has not committed yet looks like a gap
+        ChangeEvent.objects.filter(pk=events[1].pk).delete()
+        self.assertEqual([e.pk for e in change_feed.read(position)], [events[0].pk])
+
+        with override_settings(CHANGE_FEED_GAP_SECONDS=0):
+            self.assertEqual([e.pk for e in change_feed.read(position)], [events[0].pk, events[2].pk])
+
+    def test_prune_keeps_unread_events(self):
+        change_feed.consume('test', batch_size=1)
+        ChangeEvent.objects.update(created_at=timezone.now() - timedelta(days=30))
+        recent = change_feed.record('item', 'update', self.item.pk, self.item.pk)
+        self.assertEqual(change_feed.prune(), 1)
+        output = StringIO()
+        call_command('run_consumers', once=True, stdout=output)
+        self.assertIn('test:', output.getvalue())
+        self.assertEqual(list(ChangeEvent.objects.values_list('pk', flat=True)), [recent.pk])
+
+
+class SyncApiTests(TestCase):
+    """Snapshot and delta sync for offline clients"""
+
+    def setUp(self):
+        alert_rules.forget_rules()
+        self.user = User.objects.create_user('handheld', password='x')
+        self.client.force_login(self.user)
+        self.items = [
+            Item.objects.create(name=f'Sync {n}', quantity=20, reorder_level=5, price=n + 1) for n in range(3)
+        ]
+
+    def sync(self, url=None, **params):
+        response = self.client.get(url or reverse('inventory:api_sync'), params)
+        return response, response.json()
+
+    def full_sync(self):
+        _, page = self.sync(limit=2)
+        names = [item['name'] for item in page['items']]
+        while page['has_more']:
+            _, page = self.sync(page['next'])
+            names += [item['name'] for item in page['items']]
+        return names, page['cursor']
+
+    def test_snapshot_then_delta(self):
+        names, cursor = self.full_sync()
+        self.assertEqual(names, ['Sync 0', 'Sync 1', 'Sync 2'])
+
+        self.items[0].update_stock(-3, 'OUT', user=self.user)
+        deleted = self.items[1].pk
+        self.items[1].delete()
+        Item.objects.create(name='Sync new', quantity=1, reorder_level=0, price=1)
+        _, page = self.sync(since=cursor)
+        self.assertEqual([(item['name'], item['quantity']) for item in page['items']], [('Sync 0', 17), ('Sync new', 1)])
+        self.assertEqual(page['deleted_items'], [deleted])
+        self.assertEqual([(t['item_id'], t['quantity']) for t in page['transactions']], [(self.items[0].pk, 3)])
+        self.assertFalse(page['has_more'])
+
+        _, page = self.sync(since=page['cursor'])
+        self.assertEqual((page['items'], page['deleted_items'], page['transactions']), ([], [], []))
+
+    def test_snapshot_cursor_stops_below_open_transactions(self):
+        ChangeEvent.objects.update(created_at=timezone.now() - timedelta(minutes=5))
+        for item in self.items:
+            item.update_stock(1, 'IN', user=self.user)
+        recent = list(ChangeEvent.objects.filter(created_at__gt=timezone.now() - timedelta(minutes=1)).order_by('pk'))
+        # An event still in an open transaction looks like a gap in the ids
+        position = next(n for n, event in enumerate(recent) if n and event.topic == change_feed.ITEM)
+        pending = recent[position]
+        ChangeEvent.objects.filter(pk=pending.pk).delete()
+        _, page = self.sync(limit=10)
+        self.assertEqual(page['cursor'], recent[position - 1].pk)
+
+        ChangeEvent.objects.create(pk=pending.pk, topic=pending.topic, action=pending.action,
+                                   object_id=pending.object_id, item_id=pending.item_id)
+        _, page = self.sync(since=page['cursor'])
+        self.assertIn(pending.object_id, [item['id'] for item in page['items']])
+        self.assertEqual(page['cursor'], recent[-1].pk)
+
+    def test_delta_pages_follow_next(self):
+        _, cursor = self.full_sync()
+        for item in self.items:
+            item.update_stock(1, 'IN', user=self.user)
+        _, page = self.sync(since=cursor, limit=2)
+        seen = {item['id'] for item in page['items']}
+        while page['has_more']:
+            _, page = self.sync(page['next'])
+            seen |= {item['id'] for item in page['items']}
+        self.assertEqual(seen, {item.pk for item in self.items})
+
+    def test_response_is_gzipped(self):
+        response = self.client.get(reverse('inventory:api_sync'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+
+    def test_expired_cursor_is_gone(self):
+        _, cursor = self.full_sync()
+        self.items[0].update_stock(1, 'IN', user=self.user)
+        ChangeEvent.objects.update(created_at=timezone.now() - timedelta(days=30))
+        change_feed.prune()
+        response, body = self.sync(since=cursor)
+        self.assertEqual(response.status_code, 410)
+        self.assertEqual(body['snapshot_url'], reverse('inventory:api_sync'))
+        self.assertEqual(self.sync(since='soon')[0].status_code, 400)
+
+
+class BulkApiTests(TestCase):
+    """Bulk read API for items, transactions and alerts"""
+
+    def setUp(self):
+        alert_rules.forget_rules()
+        self.user = User.objects.create_user('reader', password='x')
+        self.client.force_login(self.user)
+        acme = Supplier.objects.resolve('Acme')
+        self.items = [
+            Item.objects.create(name=name, quantity=quantity, reorder_level=5, price='2.50',
+                                category=Category.objects.resolve(category), supplier=acme)
+            for name, quantity, category in [
+                ('Anvil', 0, 'Tools'), ('Bellows', 3, 'Tools'), ('Chisel', 40, 'Tools'), ('Dowel', 90, 'Wood'),
+            ]
+        ]
+        self.items[3].update_stock(-10, 'OUT', user=self.user)
+
+    def get(self, name, **params):
+        response = self.client.get(reverse(f'inventory:{name}'), params)
+        return response, response.json()
+
+    def test_sparse_fields_and_status_filter(self):
+        _, body = self.get('api_items', fields='name,status,total_value', status='low_stock,out_of_stock')
+        self.assertEqual(body['results'], [
+            {'name': 'Anvil', 'status': 'out_of_stock', 'total_value': '0.00'},
+            {'name': 'Bellows', 'status': 'low_stock', 'total_value': '7.50'},
+        ])
+        _, body = self.get('api_items', fields='name', category='Wood', supplier='Acme')
+        self.assertEqual(body['results'], [{'name': 'Dowel'}])
+
+    def test_keyset_pages_cover_every_row(self):
+        response, body = self.get('api_items', fields='id', limit=3)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        ids = [row['id'] for row in body['results']]
+        while body['next']:
+            body = self.client.get(body['next']).json()
+            ids += [row['id'] for row in body['results']]
+        self.assertEqual(ids, sorted(item.pk for item in self.items))
+
+    def test_batch_lookup_by_ids_and_names(self):
+        wanted = [self.items[1].pk, self.items[3].pk]
+        _, body = self.get('api_items', fields='name', ids=','.join(map(str, wanted)))
+        self.assertEqual([row['name'] for row in body['results']], ['Bellows', 'Dowel'])
+        response = self.client.get(reverse('inventory:api_items'), {'name': ['Chisel', 'Anvil'], 'fields': 'id'})
+        self.assertEqual([row['id'] for row in response.json()['results']], [self.items[0].pk, self.items[2].pk])
+
+    def test_transactions_and_alerts(self):
+        _, body = self.get('api_transactions', fields='item_name,transaction_type,quantity',
+                           since=(timezone.now() - timedelta(hours=1)).isoformat())
+        self.assertEqual(body['results'], [{'item_name': 'Dowel', 'transaction_type': 'OUT', 'quantity': 10}])
+        InventoryAlert.objects.create(item=self.items[0], alert_type='OUT_OF_STOCK', message='empty')
+        _, body = self.get('api_alerts', fields='item_id,alert_type', resolved='false', type='OUT_OF_STOCK')
+        self.assertEqual(body['results'], [{'item_id': self.items[0].pk, 'alert_type': 'OUT_OF_STOCK'}])
+
+    def test_stdlib_encoder_gives_the_same_rows(self):
+        _, fast = self.get('api_items', fields='id,name,price,quantity')
+        with mock.patch.object(bulk_api, 'orjson', None):
+            _, plain = self.get('api_items', fields='id,name,price,quantity')
+        self.assertEqual(fast, plain)
+
+    def test_bad_requests(self):
+        for params in ({'fields': 'name,secret'}, {'colour': 'red'}, {'limit': '0'}, {'ids': 'a,b'},
+                       {'status': 'lost'}):
+            with self.subTest(params=params):
+                self.assertEqual(self.client.get(reverse('inventory:api_items'), params).status_code, 400)
+        self.assertEqual(self.client.get(reverse('inventory:api_alerts'), {'name': 'Anvil'}).status_code, 400)
+
+
+class AlertSweepCommandTests(TestCase):
+    """Range-partitioned sweep_alerts command and the lease that guards it"""
+
+    def setUp(self):
+        for n in range(7):
+            Item.objects.create(name=f'Sweep {n}', quantity=(0, 3, 50)[n % 3], reorder_level=5, price=1)
+
+    def test_ranges_cover_every_item(self):
+        ranges = key_ranges(3)
+        self.assertEqual(len(ranges), 3)
+        self.assertEqual(ranges[-1][1], MAX_PK)
+        covered = sum(Item.objects.filter(pk__range=pk_range).count() for pk_range in ranges)
+        self.assertEqual(covered, Item.objects.count())
+
+    def test_range_sweep_matches_full_sweep(self):
+        InventoryAlert.objects.create(item=Item.objects.get(name='Sweep 0'), alert_type='LOW_STOCK', message='stale')
+        output = StringIO()
+        call_command('sweep_alerts', workers=1, chunk_size=2, stdout=output)
+        self.assertIn('5 items alerted, 4 newly alerted', output.getvalue())
+        ranged = sorted(InventoryAlert.objects.filter(is_resolved=False).values_list('item__name', 'alert_type'))
+
+        self.assertEqual(Item.sweep_alerts(), 0)
+        full = sorted(InventoryAlert.objects.filter(is_resolved=False).values_list('item__name', 'alert_type'))
+        self.assertEqual(ranged, full)
+        self.assertEqual(len(full), 5)
+
+    def test_only_one_sweep_holds_the_lease(self):
+        with locks.lease(ALERT_SWEEP_LEASE, holder='other-node'):
+            with self.assertRaisesMessage(CommandError, 'held by other-node'):
+                call_command('sweep_alerts', stdout=StringIO())
+        call_command('sweep_alerts', stdout=StringIO())
+        self.assertFalse(Lease.objects.exists())
+
+    def test_expired_lease_can_be_taken_over(self):
+        self.assertTrue(locks.acquire('sweep', 'a', ttl=60))
+        self.assertFalse(locks.acquire('sweep', 'b', ttl=60))
+        Lease.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertTrue(locks.acquire('sweep', 'b', ttl=60))
+        self.assertFalse(locks.renew('sweep', 'a', ttl=60))
+
+
+class DimensionTests(TestCase):
+    """Category and supplier names stored once and referenced by key"""
+
+    def setUp(self):
+        self.user = User.objects.create_user('dimensions', password='pw')
+        self.client.force_login(self.user)
+        self.tools = Category.objects.resolve('Tools')
+
+    def test_names_resolve_regardless_of_case_and_spacing(self):
+        self.assertEqual(Category.objects.resolve('  tools '), self.tools)
+        self.assertEqual(Category.objects.resolve('Hand  Tools').name, 'Hand Tools')
+        self.assertEqual(Category.objects.count(), 2)
+        item = Item.objects.create(name='Unfiled', quantity=1, price=1)
+        self.assertEqual(item.category.name, Item.DEFAULT_CATEGORY)
+
+    def test_item_form_takes_names(self):
+        self.client.post(reverse('inventory:item_create'), {
+            'name': 'Saw', 'quantity': 3, 'price': '9.99', 'category': 'TOOLS', 'supplier': ' Acme ',
+            'reorder_level': 1,
+        })
+        saw = Item.objects.get(name='Saw')
+        self.assertEqual((saw.category, saw.supplier.name), (self.tools, 'Acme'))
+        self.assertEqual(ItemForm(instance=saw).initial['category'], 'Tools')
+
+        # The edit page only posts the basic fields; category and supplier stay as they were
+        self.client.post(reverse('inventory:item_update', args=[saw.pk]), {
+            'name': 'Saw', 'quantity': 2, 'price': '9.99', 'reorder_level': 1,
+        })
+        saw.refresh_from_db()
+        self.assertEqual((saw.quantity, saw.category, saw.supplier.name), (2, self.tools, 'Acme'))
+
+    def test_invalid_item_form_adds_no_names(self):
+        form = ItemForm({'name': 'Saw', 'quantity': -1, 'price': '9.99', 'category': 'Brand New', 'supplier': 'Nobody',
+                         'reorder_level': 1})
+        self.assertFalse(form.is_valid())
+        self.assertFalse(Category.objects.filter(name='Brand New').exists())
+        self.assertFalse(Supplier.objects.filter(name='Nobody').exists())
+
+    def test_rename_refreshes_items(self):
+        item = Item.objects.create(name='Hammer', quantity=4, price=1, category=self.tools)
+        self.assertEqual(item_cache.get_item(item.pk).category.name, 'Tools')
+        last = ChangeEvent.objects.latest('pk').pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.tools.name = 'Hand tools'
+            self.tools.save()
+        self.assertEqual(item_cache.get_item(item.pk).category.name, 'Hand tools')
+        self.assertEqual(
+            list(ChangeEvent.objects.filter(pk__gt=last).values_list('topic', 'action', 'object_id')),
+            [(change_feed.ITEM, change_feed.UPDATE, item.pk)],
+        )
+
+    def test_migration_merges_spellings(self):
+        migration = import_module('inventory.migrations.0011_category_supplier')
+        self.assertEqual(migration._canonical_names({'Tools': 3, 'tools ': 1, 'TOOLS': 5, 'Garden': 1}), {
+            'Tools': 'TOOLS', 'tools ': 'TOOLS', 'TOOLS': 'TOOLS', 'Garden': 'Garden',
+        })
+
+
+class LedgerArchiveTests(TestCase):
+    """Old movements rolled into daily totals without changing past stock levels"""
+
+    def setUp(self):
+        self.item = Item.objects.create(name='Archived', quantity=0, price=1)
+        self.now = timezone.now()
+
+    def move(self, days_ago, quantity_change, transaction_type):
+        self.item.update_stock(quantity_change, transaction_type)
+        InventoryTransaction.objects.filter(pk=self.item.transactions.latest('pk').pk).update(
+            timestamp=self.now - timedelta(days=days_ago),
+        )
+
+    def test_movements_keep_their_sign(self):
+        self.item.update_stock(5, 'IN')
+        self.item.update_stock(-2, 'ADJUST')
+        self.assertEqual(sorted(self.item.transactions.values_list('quantity', 'quantity_change')), [(2, -2), (5, 5)])
+
+    def test_archive_rolls_up_old_days(self):
+        self.move(400, 10, 'IN')
+        self.move(400, -3, 'OUT')
+        self.move(400, -1, 'OUT')
+        self.move(399, -2, 'ADJUST')
+        self.move(5, 6, 'IN')
+        moments = [self.now - timedelta(days=days) for days in (401, 399.5, 398, 10, 1)]
+        # Within an archived day the answer becomes the stock at the end of it
+        end_of_day = datetime.combine(moments[1].date(), time.max, tzinfo=moments[1].tzinfo)
+        before = [ledger.stock_at(self.item, moment) for moment in moments + [end_of_day]]
+        self.assertEqual(before[:3], [0, 6, 4])
+
+        archived = ledger.archive(retention_days=365)
+        self.assertEqual(archived, {'rows': 4, 'partitions': []})
+        self.assertEqual(self.item.transactions.count(), 1)
+        day = (self.now - timedelta(days=400)).date()
+        out = TransactionRollup.objects.get(item=self.item, day=day, transaction_type='OUT')
+        self.assertEqual((out.movements, out.quantity, out.quantity_change), (2, 4, -4))
+        after = [ledger.stock_at(self.item, moment) for moment in moments]
+        self.assertEqual(after, before[:1] + before[-1:] + before[2:-1])
+        self.assertEqual(ledger.archive(retention_days=365)['rows'], 0)
+
+        # Movements backdated into an archived day are added to its totals
+        self.move(400, -1, 'OUT')
+        ledger.archive(retention_days=365)
+        out.refresh_from_db()
+        self.assertEqual((out.movements, out.quantity_change), (3, -5))
+
+    def test_retention_covers_raw_history(self):
+        with self.assertRaisesMessage(CommandError, 'at least 180 days'):
+            call_command('archive_ledger', retention_days=30, stdout=StringIO())
+        out = StringIO()
+        call_command('archive_ledger', stdout=out)
+        self.assertIn('0 movements rolled up', out.getvalue())
+
+
+class AlertCompactionTests(TestCase):
+    """Resolved alerts past retention folded into per-item counts"""
+
+    def setUp(self):
+        self.item = Item.objects.create(name='Compacted', quantity=50, price=1, reorder_level=5)
+        self.now = now = timezone.now()
+        # (type, days since raised, days since resolved)
+        self.ages = {'old': ('LOW_STOCK', 210, 200), 'older_raised': ('LOW_STOCK', 300, 120),
+                     'out': ('OUT_OF_STOCK', 105, 100), 'recent': ('LOW_STOCK', 400, 10)}
+        for key, (alert_type, raised, resolved) in self.ages.items():
+            alert = InventoryAlert.objects.create(item=self.item, alert_type=alert_type, message=key)
+            InventoryAlert.objects.filter(pk=alert.pk).update(
+                is_resolved=True, created_at=now - timedelta(days=raised), resolved_at=now - timedelta(days=resolved),
+            )
+        self.open_alert = InventoryAlert.objects.create(item=self.item, alert_type='OVERSTOCK', message='x')
+
+    def summaries(self):
+        return {
+            summary.alert_type: (summary.resolved_count, summary.first_created_at, summary.last_resolved_at)
+            for summary in AlertSummary.objects.filter(item=self.item)
+        }
+
+    def test_old_resolved_alerts_become_counts(self):
+        days = lambda n: self.now - timedelta(days=n)
+        batches = []
+        self.assertEqual(alert_retention.compact(retention_days=90, batch_size=1, progress=batches.append), 3)
+        self.assertEqual(batches, [1, 2, 3])
+        self.assertEqual(
+            sorted(InventoryAlert.objects.values_list('alert_type', 'is_resolved')),
+            [('LOW_STOCK', True), ('OVERSTOCK', False)],
+        )
+        # The two LOW_STOCK alerts went in separate batches and were merged
+        self.assertEqual(self.summaries(), {
+            'LOW_STOCK': (2, days(300), days(120)),
+            'OUT_OF_STOCK': (1, days(105), days(100)),
+        })
+        self.assertEqual(ChangeEvent.objects.filter(topic=change_feed.ALERT, action=change_feed.DELETE).count(), 3)
+
+        # A later run adds to the counts and widens the time span at both ends
+        out = StringIO()
+        call_command('compact_alerts', retention_days=1, stdout=out)
+        self.assertIn('1 resolved alerts compacted', out.getvalue())
+        self.assertEqual(self.summaries(), {
+            'LOW_STOCK': (3, days(400), days(10)),
+            'OUT_OF_STOCK': (1, days(105), days(100)),
+        })
+        self.assertTrue(InventoryAlert.objects.filter(pk=self.open_alert.pk).exists())
+
+
+@override_settings(ITEM_DELETE_BATCH_SIZE=2)
+class ItemPurgeTests(TestCase):
+    """Items deleted with their history in batches, without loading it"""
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser('purger', 'purge@example.com', 'pw')
+        self.client.force_login(self.admin)
+        self.items = [Item.objects.create(name=f'Purged {n}', quantity=0, price=1) for n in range(2)]
+        for item in self.items:
+            for _ in range(5):
+                item.update_stock(1, 'IN')
+            InventoryAlert.objects.create(item=item, alert_type='OVERSTOCK', message='x', is_resolved=True)
+            AlertRule.objects.create(item=item, max_quantity=100)
+        self.kept = Item.objects.create(name='Kept', quantity=1, price=1)
+        self.kept.update_stock(1, 'IN')
+
+    def assertPurged(self, *items):
+        ids = [item.pk for item in items]
+        self.assertFalse(Item.objects.filter(pk__in=ids).exists())
+        for model in purge.HISTORY + (AlertRule,):
+            self.assertFalse(model.objects.filter(item__in=ids).exists(), model)
+        self.assertEqual(self.kept.transactions.count(), 1)
+        self.assertEqual(
+            set(ChangeEvent.objects.filter(topic=change_feed.ITEM, action=change_feed.DELETE).values_list('object_id', flat=True)),
+            set(ids),
+        )
+
+    def test_view_deletes_history_in_batches(self):
+        item = self.items[0]
+        # Tiny batches take more statements than the view's budget allows for
+        budgets = {**settings.SQL_QUERY_BUDGETS, 'inventory:item_delete': None}
+        with override_settings(SQL_QUERY_BUDGETS=budgets), CaptureQueriesContext(connection) as captured:
+            self.client.post(reverse('inventory:item_delete', args=[item.pk]))
+        self.assertPurged(item)
+        ledger_table = InventoryTransaction._meta.db_table
+        batches = [q['sql'] for q in captured.captured_queries if q['sql'].startswith(f'DELETE FROM "{ledger_table}"')]
+        # Three batches of two, then the collector's (now empty) cascade
+        self.assertEqual(len(batches), 4)
+        self.assertFalse([q for q in captured.captured_queries if f'"{ledger_table}"."reason"' in q['sql']])
+
+    @override_settings(ITEM_DELETE_BATCH_SIZE=5000)
+    def test_view_stays_in_budget_with_one_batch(self):
+        response = self.client.post(reverse('inventory:item_delete', args=[self.items[1].pk]))
+        self.assertRedirects(response, reverse('inventory:home'))
+        self.assertPurged(self.items[1])
+
+    def test_admin_bulk_delete_counts_instead_of_listing(self):
+        url = reverse('admin:inventory_item_changelist')
+        selected = {'action': 'delete_selected', '_selected_action': [item.pk for item in self.items]}
+        response = self.client.post(url, selected)
+        self.assertContains(response, '10 inventory transactions')
+        self.assertContains(response, '2 alert rules')
+        self.assertNotContains(response, 'Purged 0 - IN')
+        self.client.post(url, {**selected, 'post': 'yes'})
+        self.assertPurged(*self.items)
+
+
+class QueryPlanTests(TestCase):
+    """EXPLAIN every statement a view runs; large tables must be read through an index"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.admin = User.objects.create_superuser('plan_admin', 'plan@example.com', 'pw')
+        categories = [Category.objects.resolve(f'Plan {n}') for n in range(3)]
+        cls.items = Item.objects.bulk_create([
+            Item(name=f'Plan {n}', quantity=(0, 3, 50)[n % 3], price=n + 1, reorder_level=5,
+                 category=categories[n % 3])
+            for n in range(30)
+        ])
+        InventoryTransaction.objects.bulk_create([
+            InventoryTransaction(item=item, transaction_type=kind, quantity=2, user=cls.admin)
+            for item in cls.items for kind in ('IN', 'OUT')
+        ])
+        InventoryAlert.objects.bulk_create([
+            InventoryAlert(item=item, alert_type='LOW_STOCK', message='x', is_resolved=resolved)
+            for item in cls.items for resolved in (False, True)
+        ])
+        cls.items[0].update_stock(1, 'IN', user=cls.admin)
+        cls.alert = InventoryAlert.objects.filter(is_resolved=False).first()
+
+    def setUp(self):
+        self.client.force_login(self.admin)
+        fragment_cache().clear()
+        item_cache.clear()
+        alert_rules.forget_rules()
+
+    def assertIndexedPlans(self, run, allow=()):
+        """Run `run` and check the plan of every statement it executed.
+        
+        `allow` names tables the caller reads in full on purpose.
+        """
+        with CaptureQueriesContext(connection) as captured:
+            result = run()
+        tables = query_plans.large_tables() - set(allow)
+        for query in captured.captured_queries:
+            scanned, plan = query_plans.full_scans(query['sql'], tables=tables)
+            self.assertFalse(scanned, 'Full scan of {} in:\n{}\nPlan:\n{}'.format(
+                ', '.join(scanned), query['sql'], '\n'.join(plan)
+            ))
+        return result
+
+    def assertIndexedView(self, name, *args, allow=(), method='get', **params):
+        response = self.assertIndexedPlans(
+            lambda: getattr(self.client, method)(reverse(f'inventory:{name}', args=args), params), allow,
+        )
+        self.assertLess(response.status_code, 400)
+
+    def test_unindexed_reads_are_reported(self):
+        scanned, plan = query_plans.full_scans(str(Item.objects.filter(price__gt=1).order_by().query))
+        self.assertEqual(scanned, ['inventory_item'], plan)
+        scanned, _ = query_plans.full_scans(str(Item.objects.filter(quantity=0).query))
+        self.assertEqual(scanned, [])
+
+    def test_item_pages(self):
+        item = self.items[4]
+        self.assertIndexedView('item_detail', item.pk)
+        self.assertIndexedView('item_update', item.pk)
+        self.assertIndexedView('item_delete', item.pk)
+        self.assertIndexedView('update_stock', item.pk)
+        self.assertIndexedView('update_stock', item.pk, method='post', transaction_type='OUT', quantity=1)
+
+    def test_item_lists(self):
+        # Listing every item walks the name index rather than the table
+        self.assertIndexedView('home')
+        self.assertIndexedView('api_items', limit=10)
+        self.assertIndexedView('api_items', status='low_stock')
+
+    def test_dashboards(self):
+        self.assertIndexedView('analytics')
+        self.assertIndexedView('api_dashboard_data')
+
+    def test_reports(self):
+        for report_type in ('stock_levels', 'low_stock', 'category_summary', 'all_items'):
+            with self.subTest(report_type=report_type):
+                self.assertIndexedView('reports_filtered', report_type)
+
+    def test_alerts(self):
+        # Raising missing alerts evaluates the rules against every item by design
+        self.assertIndexedView('manage_alerts', allow=['inventory_item'])
+        self.assertIndexedView('resolve_alert', self.alert.pk)
+        self.assertIndexedView('api_alerts', resolved='false')
+
+    def test_ledger_and_sync(self):
+        self.assertIndexedView('api_transactions', limit=10, since='2000-01-01T00:00:00+00:00')
+        self.assertIndexedView('api_sync', since=ChangeEvent.objects.earliest('pk').pk)
+        self.assertIndexedView('api_sync', limit=10)
+
+    def test_stock_api(self):
+        self.assertIndexedPlans(lambda: self.client.post(
+            reverse('inventory:api_stock_update', args=[self.items[2].pk]),
+            json.dumps({'transaction_type': 'OUT', 'quantity': 1}), content_type='application/json',
+        ))
+
+    def test_background_work(self):
+        self.assertIndexedPlans(lambda: change_feed.read(0, 100))
+        self.assertIndexedPlans(change_feed.prune)
+        self.assertIndexedPlans(lambda: self.items[5].check_and_create_alerts())
+        self.assertIndexedPlans(lambda: ledger.stock_at(self.items[0], timezone.now() - timedelta(days=1)))
+        self.assertIndexedPlans(ledger.archive)
+        self.assertIndexedPlans(alert_retention.compact)
+        self.assertIndexedPlans(lambda: purge.delete_items(Item.objects.filter(pk=self.items[6].pk)))
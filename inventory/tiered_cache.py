@@ -0,0 +1,387 @@
+"""
+Two-tier cache backend: an in-process LRU (L1) in front of a shared cache (L2).
+
+Reads that hit L1 never leave the process. Writes go to both tiers, and the
+changed keys are broadcast on an invalidation bus so every other process
+drops its L1 copy. add() is not broadcast: it is meant for read-through
+fills, and a fill does not make other copies stale. It cannot stop a reader
+from filling in a value loaded before a writer's invalidation, though, so
+callers whose values change key them by a version or generation that the
+writer moves on (see item_cache and fragments). The L2 alias is expected to be shared (Redis in
+production); the bus only ever touches L1. A process-local L2 (LocMemCache)
+would keep a copy per worker that writes in other workers never reach, so
+it is not used at all: the cache is then L1 only, and stale for at most
+L1_TIMEOUT. Configure it like any other backend::
+
+    'items': {
+        'BACKEND': 'inventory.tiered_cache.TieredCache',
+        'LOCATION': 'items',             # names the L1 tier and the metrics
+        'OPTIONS': {
+            'L2': 'items-shared',        # another CACHES alias
+            'L1_MAX_ENTRIES': 1000,
+            'L1_TIMEOUT': 60,            # upper bound on a missed invalidation
+            'BUS': 'redis',              # or 'file:/path/to/bus', or '' for none
+        },
+    }
+
+The ``redis`` bus uses pub/sub on the L2 client and so needs django-redis.
+The file bus is an append-only log that every process on one host tails; it
+needs no server and is what the tests use. Lookups are counted per tier in
+inventory_cache_requests_total as ``<LOCATION>:l1`` and ``<LOCATION>:l2``.
+"""
+
+import json
+import os
+import pickle
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT, BaseCache
+from django.core.cache.backends.dummy import DummyCache
+from django.core.cache.backends.locmem import LocMemCache
+
+from . import metrics
+
+_MISSING = object()
+# Stands in for an L2 that is not shared between processes
+_NO_L2 = DummyCache('', {})
+
+
+class LocalLRU:
+    """Thread-safe bounded LRU whose entries expire after their own timeout"""
+
+    def __init__(self, max_entries):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+            value, expires = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return default
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl):
+        if self.max_entries <= 0 or ttl <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (value, time.monotonic() + ttl)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class FileBus:
+    """Invalidation bus over an append-only file shared by local processes.
+
+    Messages are single JSON lines written with O_APPEND, and every
+    subscriber tails the file from where it joined. Once the file passes
+    `max_bytes` a publisher atomically replaces it with a new one whose first
+    line carries the next generation number. Readers finish the old file
+    through their open handle before following the path; a reader that finds
+    it skipped a generation emits a clear message, since it may have missed
+    invalidations.
+    """
+
+    def __init__(self, path, max_bytes=1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.generation = None
+        self._reader = None
+        self._pending = b''
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self._follow(from_start=False)
+
+    @staticmethod
+    def _read_generation(reader):
+        """Generation from the header line, leaving the reader after it"""
+        first = reader.readline()
+        if first.endswith(b'\n'):
+            generation = json.loads(first).get('generation')
+            if generation is not None:
+                return generation
+        # Files created on demand have no header
+        reader.seek(0)
+        return 0
+
+    def _follow(self, from_start=True):
+        previous = self.generation
+        fd = os.open(self.path, os.O_RDONLY | os.O_CREAT, 0o644)
+        if self._reader is not None:
+            self._reader.close()
+        self._reader = os.fdopen(fd, 'rb')
+        self.generation = self._read_generation(self._reader)
+        if not from_start:
+            self._reader.seek(0, os.SEEK_END)
+        self._pending = b''
+        return previous is None or self.generation == previous + 1
+
+    def _inode(self):
+        try:
+            return os.stat(self.path).st_ino
+        except FileNotFoundError:
+            return None
+
+    def publish(self, message):
+        line = (json.dumps(message) + '\n').encode()
+        while True:
+            fd = os.open(self.path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+                written = os.fstat(fd)
+            finally:
+                os.close(fd)
+            # Rotated while we wrote: readers may have moved on, so say it again
+            if self._inode() == written.st_ino:
+                break
+        if written.st_size > self.max_bytes:
+            self._rotate(written.st_ino)
+
+    def _rotate(self, inode):
+        try:
+            with open(self.path, 'rb') as current:
+                if os.fstat(current.fileno()).st_ino != inode:
+                    return
+                generation = self._read_generation(current)
+        except FileNotFoundError:
+            return
+        staging = f'{self.path}.{os.getpid()}.{threading.get_ident()}.tmp'
+        with open(staging, 'wb') as new:
+            new.write((json.dumps({'generation': generation + 1}) + '\n').encode())
+        os.replace(staging, self.path)
+
+    def poll(self):
+        """Messages published since the last poll"""
+        messages = self._drain()
+        if self._inode() != os.fstat(self._reader.fileno()).st_ino:
+            if not self._follow():
+                messages.append({'origin': None, 'clear': True})
+            messages += self._drain()
+        return messages
+
+    def _drain(self):
+        data = self._pending + self._reader.read()
+        complete, _, self._pending = data.rpartition(b'\n')
+        return [json.loads(line) for line in complete.split(b'\n') if line]
+
+
+class RedisBus:
+    """Invalidation bus over Redis pub/sub, shared by every host"""
+
+    def __init__(self, client, channel):
+        self.client = client
+        self.channel = channel
+        self.pubsub = client.pubsub(ignore_subscribe_messages=True)
+        self.pubsub.subscribe(channel)
+
+    def publish(self, message):
+        self.client.publish(self.channel, json.dumps(message))
+
+    def poll(self):
+        messages = []
+        while (message := self.pubsub.get_message()) is not None:
+            messages.append(json.loads(message['data']))
+        return messages
+
+
+class _Tier:
+    """Per-process L1 state shared by every thread's backend instance"""
+
+    def __init__(self, max_entries, bus):
+        self.lru = LocalLRU(max_entries)
+        self.bus = bus
+        self.origin = uuid.uuid4().hex
+        self.lock = threading.Lock()
+
+
+_tiers = {}
+_tiers_lock = threading.Lock()
+
+
+class TieredCache(BaseCache):
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self.name = location
+        self.l2_alias = options['L2']
+        self.l1_max_entries = options.get('L1_MAX_ENTRIES', 1000)
+        self.l1_timeout = options.get('L1_TIMEOUT', 60)
+        self.bus_url = options.get('BUS', '')
+
+    @property
+    def l2(self):
+        l2 = caches[self.l2_alias]
+        return _NO_L2 if isinstance(l2, LocMemCache) else l2
+
+    @property
+    def tier(self):
+        # Keyed by pid as well, so a forked worker never reuses its parent's bus
+        key = (self.name, os.getpid())
+        tier = _tiers.get(key)
+        if tier is None:
+            with _tiers_lock:
+                tier = _tiers.get(key)
+                if tier is None:
+                    tier = _tiers[key] = _Tier(self.l1_max_entries, self._connect_bus())
+        return tier
+
+    def _connect_bus(self):
+        if not self.bus_url:
+            return None
+        if self.bus_url.startswith('file:'):
+            return FileBus(self.bus_url[len('file:'):])
+        if self.bus_url == 'redis':
+            return RedisBus(self.l2.client.get_client(), f'cache-invalidation:{self.name}')
+        raise ValueError(f'Unknown cache bus {self.bus_url!r}')
+
+    def sync(self):
+        """Apply invalidations published by other processes"""
+        tier = self.tier
+        if tier.bus is None:
+            return tier
+        with tier.lock:
+            for message in tier.bus.poll():
+                if message['origin'] == tier.origin:
+                    continue
+                if message.get('clear'):
+                    tier.lru.clear()
+                for key in message.get('keys', ()):
+                    tier.lru.delete(key)
+        return tier
+
+    def _broadcast(self, tier, keys=(), clear=False):
+        if tier.bus is not None:
+            tier.bus.publish({'origin': tier.origin, 'keys': list(keys), 'clear': clear})
+
+    def _l1_timeout(self, timeout):
+        timeout = self.get_backend_timeout(timeout)
+        if timeout is None:
+            return self.l1_timeout
+        return min(timeout - time.time(), self.l1_timeout)
+
+    def _remember(self, tier, key, value, timeout=DEFAULT_TIMEOUT):
+        # Pickled like LocMemCache, so callers can never mutate the cached copy
+        tier.lru.set(key, pickle.dumps(value, pickle.HIGHEST_PROTOCOL), self._l1_timeout(timeout))
+
+    def get(self, key, default=None, version=None):
+        tier = self.sync()
+        local_key = self.make_and_validate_key(key, version=version)
+        pickled = tier.lru.get(local_key)
+        metrics.record_cache(f'{self.name}:l1', pickled is not None)
+        if pickled is not None:
+            return pickle.loads(pickled)
+        value = self.l2.get(key, _MISSING, version=version)
+        metrics.record_cache(f'{self.name}:l2', value is not _MISSING)
+        if value is _MISSING:
+            return default
+        self._remember(tier, local_key, value)
+        return value
+
+    def get_many(self, keys, version=None):
+        tier = self.sync()
+        found, remote = {}, []
+        for key in keys:
+            local_key = self.make_and_validate_key(key, version=version)
+            pickled = tier.lru.get(local_key)
+            metrics.record_cache(f'{self.name}:l1', pickled is not None)
+            if pickled is None:
+                remote.append(key)
+            else:
+                found[key] = pickle.loads(pickled)
+        if remote:
+            fetched = self.l2.get_many(remote, version=version)
+            for key in remote:
+                metrics.record_cache(f'{self.name}:l2', key in fetched)
+            for key, value in fetched.items():
+                self._remember(tier, self.make_and_validate_key(key, version=version), value)
+            found.update(fetched)
+        return found
+
+    def has_key(self, key, version=None):
+        tier = self.sync()
+        if tier.lru.get(self.make_and_validate_key(key, version=version)) is not None:
+            return True
+        return self.l2.has_key(key, version=version)
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        tier = self.sync()
+        local_key = self.make_and_validate_key(key, version=version)
+        self.l2.set(key, value, timeout, version=version)
+        self._remember(tier, local_key, value, timeout)
+        self._broadcast(tier, [local_key])
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        tier = self.sync()
+        failed = self.l2.set_many(data, timeout, version=version)
+        local_keys = []
+        for key, value in data.items():
+            local_key = self.make_and_validate_key(key, version=version)
+            local_keys.append(local_key)
+            if key not in failed:
+                self._remember(tier, local_key, value, timeout)
+        self._broadcast(tier, local_keys)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        tier = self.sync()
+        added = self.l2.add(key, value, timeout, version=version)
+        if added:
+            self._remember(tier, self.make_and_validate_key(key, version=version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        return self.l2.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        tier = self.sync()
+        value = self.l2.incr(key, delta, version=version)
+        self._forget(tier, [key], version)
+        return value
+
+    def delete(self, key, version=None):
+        tier = self.sync()
+        deleted = self.l2.delete(key, version=version)
+        self._forget(tier, [key], version)
+        return deleted
+
+    def delete_many(self, keys, version=None):
+        keys = list(keys)
+        tier = self.sync()
+        self.l2.delete_many(keys, version=version)
+        self._forget(tier, keys, version)
+
+    def _forget(self, tier, keys, version):
+        local_keys = [self.make_and_validate_key(key, version=version) for key in keys]
+        for local_key in local_keys:
+            tier.lru.delete(local_key)
+        self._broadcast(tier, local_keys)
+
+    def clear(self):
+        tier = self.sync()
+        self.l2.clear()
+        tier.lru.clear()
+        self._broadcast(tier, clear=True)
+
+    def clear_local(self):
+        """Drop this process's L1 copies only"""
+        self.tier.lru.clear()
@@ -23,6 +23,19 @@ urlpatterns = [
     
     # API endpoints for AJAX calls
     path('api/stock-update/<int:item_id>/', views.api_stock_update, name='api_stock_update'),
+    path('api/scan-events/', views.api_scan_events, name='api_scan_events'),
     path('api/alerts/generate/', views.api_generate_alerts, name='api_generate_alerts'),
     path('api/dashboard-data/', views.api_dashboard_data, name='api_dashboard_data'),
+    path('api/reports/<str:report_type>/export/', views.api_export_report, name='api_export_report'),
+    path('api/jobs/<int:job_id>/', views.api_job_status, name='api_job_status'),
+    path('api/sync/', views.api_sync, name='api_sync'),
+    path('api/items/', views.api_items, name='api_items'),
+    path('api/transactions/', views.api_transactions, name='api_transactions'),
+    path('api/alerts/', views.api_alerts, name='api_alerts'),
+    
+    # Background job output
+    path('jobs/<int:job_id>/download/', views.job_download, name='job_download'),
+    
+    # Operations
+    path('metrics', views.metrics, name='metrics'),
 ]
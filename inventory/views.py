@@ -1,15 +1,30 @@
+from django.conf import settings
 from django.shortcuts import render, get_object_or_404, redirect
+from django.template.loader import render_to_string
+from django.utils.safestring import mark_safe
 from django.contrib.auth import login
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from django.db.models import Q, Sum, Count, Avg, F
+from django.urls import reverse
 from django.utils import timezone
-from django.http import JsonResponse
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseForbidden, JsonResponse
 from django.views.decorators.http import require_http_methods
 from django.views.decorators.csrf import csrf_exempt
+from django.views.decorators.gzip import gzip_page
 from datetime import datetime, timedelta
-from .models import Item, InventoryTransaction, InventoryAlert
+from urllib.parse import urlencode
+import os
+from . import alert_rules, bulk_api, fragments, item_cache, jobs, metrics as inventory_metrics, purge, sync
+from .models import Category, Item, InventoryTransaction, InventoryAlert, Job
 from .forms import ItemForm, CustomUserCreationForm, StockUpdateForm, ReportFilterForm
+from .idempotency import (
+    REPLAY_HEADER, IdempotencyConflict, conflict_response, idempotent,
+    key_from_request, request_fingerprint,
+)
+from .rows import item_rows
+from .scan_buffer import ScanEventError, get_journal, validate_scan_event
+from .tasks import EXPORT_REPORTS
 import json
 
 
@@ -25,7 +40,7 @@ def home(request):
         )
     
     context = {
-        'items': items,
+        'items': item_rows(items),
         'search_query': search_query,
     }
     return render(request, 'inventory/item_list.html', context)
@@ -34,7 +49,7 @@ def home(request):
 @login_required
 def item_detail(request, pk):
     """Display detailed view of a specific item"""
-    item = get_object_or_404(Item, pk=pk)
+    item = item_cache.get_item_or_404(pk)
     return render(request, 'inventory/item_detail.html', {'item': item})
 
 
@@ -60,7 +75,8 @@ def item_create(request):
 @login_required
 def item_update(request, pk):
     """Update an existing inventory item"""
-    item = get_object_or_404(Item, pk=pk)
+    # Edits start from the database row so the form never saves cached values
+    item = item_cache.get_item_or_404(pk, fresh=request.method == 'POST')
     
     if request.method == 'POST':
         form = ItemForm(request.POST, instance=item)
@@ -82,11 +98,11 @@ def item_update(request, pk):
 @login_required
 def item_delete(request, pk):
     """Delete an inventory item"""
-    item = get_object_or_404(Item, pk=pk)
+    item = item_cache.get_item_or_404(pk, fresh=request.method == 'POST')
     
     if request.method == 'POST':
         item_name = item.name
-        item.delete()
+        purge.delete_items(Item.objects.filter(pk=item.pk))
         messages.success(request, f'Item "{item_name}" deleted successfully!')
         return redirect('inventory:home')
     
@@ -124,10 +140,11 @@ def analytics_dashboard(request):
     out_of_stock_items = Item.objects.filter(quantity=0).count()
     
     # Category breakdown
-    category_data = Item.objects.values('category').annotate(
+    category_data = _category_totals(
+        '-total_value',
         count=Count('id'),
         total_value=Sum(F('quantity') * F('price'))
-    ).order_by('-total_value')
+    )
     
     # Stock status distribution
     stock_status_data = {
@@ -172,9 +189,9 @@ def analytics_dashboard(request):
 
 
 @login_required
-def inventory_reports(request):
+def inventory_reports(request, report_type=None):
     """Generate various inventory reports"""
-    report_type = request.GET.get('type', 'stock_levels')
+    report_type = report_type or request.GET.get('type', 'stock_levels')
     
     if report_type == 'stock_levels':
         # Stock levels report
@@ -196,12 +213,12 @@ def inventory_reports(request):
     
     elif report_type == 'category_summary':
         # Category summary report
-        categories = Item.objects.values('category').annotate(
+        categories = sorted(_category_totals(
             item_count=Count('id'),
             total_quantity=Sum('quantity'),
             total_value=Sum(F('quantity') * F('price')),
             avg_price=Avg('price')
-        ).order_by('category')
+        ), key=lambda category: category['name'])
         context = {
             'report_title': 'Category Summary Report',
             'categories': categories,
@@ -209,60 +226,69 @@ def inventory_reports(request):
         }
     
     else:
-        # Default to stock levels
+        # Default to all items, grouped by category so unchanged categories come from cache
         items = Item.objects.all()
         context = {
             'report_title': 'All Items Report',
             'items': items,
+            'category_blocks': _category_blocks(items),
             'report_type': 'all_items',
         }
     
+    if 'items' in context:
+        items = context['items']
+        context['summary'] = items.aggregate(
+            item_count=Count('id'),
+            total_quantity=Sum('quantity'),
+            total_value=Sum(F('quantity') * F('price'))
+        )
+        if 'category_blocks' not in context:
+            context['items'] = item_rows(items)
+    
     return render(request, 'inventory/reports.html', context)
 
 
+def _category_totals(*ordering, **aggregates):
+    """Item aggregates grouped on the integer category key, each row given its category's name"""
+    rows = list(Item.objects.values('category').annotate(**aggregates).order_by(*ordering))
+    names = dict(Category.objects.filter(pk__in=[row['category'] for row in rows]).values_list('pk', 'name'))
+    for row in rows:
+        row['name'] = names[row['category']]
+    return rows
+
+
+def _category_blocks(items):
+    """Report rows rendered per category, re-rendering only categories whose version changed"""
+    names = dict(Category.objects.filter(pk__in=items.values('category')).values_list('pk', 'name'))
+    versions = fragments.category_versions(names)
+    vary_ons = [(category, versions[category]) for category in names]
+    cached = fragments.get_fragments('report_category', vary_ons)
+    
+    stale = {}
+    missing = [category for category, version in vary_ons if (category, version) not in cached]
+    if missing:
+        for item in item_rows(items.filter(category__in=missing).order_by('category__name', 'name')):
+            stale.setdefault(item.category, []).append(item)
+    
+    blocks = []
+    for vary_on in vary_ons:
+        html = cached.get(vary_on)
+        if html is None:
+            html = fragments.set_fragment('report_category', vary_on, render_to_string(
+                'inventory/partials/report_category_rows.html', {'items': stale.get(names[vary_on[0]], [])}
+            ))
+        blocks.append(mark_safe(html))
+    return blocks
+
+
 @login_required
 def manage_alerts(request):
     """Manage inventory alerts"""
     active_alerts = InventoryAlert.objects.filter(is_resolved=False).select_related('item')
-    resolved_alerts = InventoryAlert.objects.filter(is_resolved=True).select_related('item')[:20]
+    resolved_alerts = InventoryAlert.objects.filter(is_resolved=True).select_related('item').order_by('-resolved_at')[:20]
     
-    # Generate new alerts for low stock items
-    low_stock_items = Item.objects.filter(
-        quantity__lte=F('reorder_level'),
-        quantity__gt=0
-    )
-    
-    for item in low_stock_items:
-        # Check if alert already exists
-        existing_alert = InventoryAlert.objects.filter(
-            item=item,
-            alert_type='LOW_STOCK',
-            is_resolved=False
-        ).exists()
-        
-        if not existing_alert:
-            InventoryAlert.objects.create(
-                item=item,
-                alert_type='LOW_STOCK',
-                message=f'Item "{item.name}" is running low. Current stock: {item.quantity}, Reorder level: {item.reorder_level}'
-            )
-    
-    # Generate alerts for out of stock items
-    out_of_stock_items = Item.objects.filter(quantity=0)
-    
-    for item in out_of_stock_items:
-        existing_alert = InventoryAlert.objects.filter(
-            item=item,
-            alert_type='OUT_OF_STOCK',
-            is_resolved=False
-        ).exists()
-        
-        if not existing_alert:
-            InventoryAlert.objects.create(
-                item=item,
-                alert_type='OUT_OF_STOCK',
-                message=f'Item "{item.name}" is out of stock. Immediate restocking required.'
-            )
+    # Raise alerts for items whose rules call for one that is not open yet
+    alert_rules.raise_missing_alerts(Item.objects.all())
     
     context = {
         'active_alerts': active_alerts,
@@ -284,7 +310,7 @@ def resolve_alert(request, alert_id):
 @login_required
 def update_stock(request, pk):
     """Update stock levels for an item"""
-    item = get_object_or_404(Item, pk=pk)
+    item = item_cache.get_item_or_404(pk)
     
     if request.method == 'POST':
         form = StockUpdateForm(request.POST)
@@ -295,21 +321,19 @@ def update_stock(request, pk):
             
             try:
                 # Calculate quantity change based on transaction type
-                if transaction_type == 'IN':
-                    quantity_change = quantity
-                elif transaction_type == 'OUT':
-                    quantity_change = -quantity
-                else:  # ADJUST
+                if transaction_type == 'ADJUST':
                     # For adjustment, the quantity is the new total quantity
-                    quantity_change = quantity - item.quantity
-                
-                # Update stock using the model method
-                new_quantity = item.update_stock(
-                    quantity_change=quantity_change,
-                    transaction_type=transaction_type,
-                    reason=reason,
-                    user=request.user
-                )
+                    new_quantity = item.adjust_stock(quantity, reason=reason, user=request.user)
+                else:
+                    quantity_change = quantity if transaction_type == 'IN' else -quantity
+                    
+                    # Update stock using the model method
+                    new_quantity = item.update_stock(
+                        quantity_change=quantity_change,
+                        transaction_type=transaction_type,
+                        reason=reason,
+                        user=request.user
+                    )
                 
                 messages.success(
                     request, 
@@ -325,35 +349,38 @@ def update_stock(request, pk):
     context = {
         'item': item,
         'form': form,
+        'recent_transactions': item.transactions.select_related('user')[:5],
         'title': f'Update Stock - {item.name}'
     }
     return render(request, 'inventory/stock_update.html', context)
 
 
+@idempotent
 def api_stock_update(request, item_id):
     """API endpoint for updating stock via AJAX"""
     if request.method == 'POST':
         try:
-            item = get_object_or_404(Item, pk=item_id)
+            item = item_cache.get_item_or_404(item_id)
             data = json.loads(request.body)
+            if not isinstance(data, dict):
+                raise ValueError('Expected a JSON object')
             
             transaction_type = data.get('transaction_type')
+            if transaction_type not in ('IN', 'OUT', 'ADJUST'):
+                raise ValueError('transaction_type must be IN, OUT or ADJUST')
             quantity = int(data.get('quantity', 0))
             reason = data.get('reason', '')
             
-            if transaction_type == 'IN':
-                quantity_change = quantity
-            elif transaction_type == 'OUT':
-                quantity_change = -quantity
+            user = request.user if request.user.is_authenticated else None
+            if transaction_type in ('IN', 'OUT'):
+                new_quantity = item.update_stock(
+                    quantity_change=quantity if transaction_type == 'IN' else -quantity,
+                    transaction_type=transaction_type,
+                    reason=reason,
+                    user=user
+                )
             else:
-                quantity_change = quantity - item.quantity
-            
-            new_quantity = item.update_stock(
-                quantity_change=quantity_change,
-                transaction_type=transaction_type,
-                reason=reason,
-                user=request.user if request.user.is_authenticated else None
-            )
+                new_quantity = item.adjust_stock(quantity, reason=reason, user=user)
             
             return JsonResponse({
                 'success': True,
@@ -361,41 +388,58 @@ def api_stock_update(request, item_id):
                 'message': f'Stock updated successfully. New quantity: {new_quantity}'
             })
             
-        except Exception as e:
-            return JsonResponse({
-                'success': False,
-                'error': str(e)
-            })
+        except Http404 as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=404)
+        except (ValueError, TypeError) as e:
+            # Bad input or a rejected movement; anything else is a server error, so a retry runs again
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
     
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
 
+def api_scan_events(request):
+    """API endpoint that queues scanner events for a batched write-behind flush"""
+    if request.method == 'POST':
+        try:
+            data = json.loads(request.body)
+            raw_events = data.get('events', [data]) if isinstance(data, dict) else data
+            events = [validate_scan_event(event) for event in raw_events]
+            if not events:
+                raise ScanEventError('No scan events supplied')
+            idempotency_key = key_from_request(request)
+        except (ValueError, TypeError, AttributeError) as e:
+            return JsonResponse({'success': False, 'error': str(e)}, status=400)
+        
+        try:
+            result = get_journal().append(
+                events,
+                user_id=request.user.pk if request.user.is_authenticated else None,
+                idempotency_key=idempotency_key,
+                fingerprint=request_fingerprint(request),
+            )
+        except IdempotencyConflict:
+            return conflict_response()
+        
+        response = JsonResponse({
+            'success': True,
+            'queued': result.queued,
+            'sequence': result.sequence,
+            'message': f'{result.queued} scan event{"s" if result.queued != 1 else ""} queued.'
+        }, status=202)
+        if result.replayed:
+            response[REPLAY_HEADER] = 'true'
+        return response
+    
+    return JsonResponse({'success': False, 'error': 'Invalid request method'})
+
+
+@login_required
 def api_generate_alerts(request):
-    """API endpoint to generate alerts for all items"""
+    """API endpoint that queues an alert sweep for all items"""
     if request.method == 'POST':
         try:
-            generated_count = 0
-            items = Item.objects.all()
-            
-            for item in items:
-                old_alerts_count = InventoryAlert.objects.filter(
-                    item=item, is_resolved=False
-                ).count()
-                
-                item.check_and_create_alerts()
-                
-                new_alerts_count = InventoryAlert.objects.filter(
-                    item=item, is_resolved=False
-                ).count()
-                
-                if new_alerts_count > old_alerts_count:
-                    generated_count += (new_alerts_count - old_alerts_count)
-            
-            return JsonResponse({
-                'success': True,
-                'generated_count': generated_count,
-                'message': f'{generated_count} new alerts generated.'
-            })
+            job = jobs.enqueue('sweep_alerts', priority=10, dedupe_key='sweep_alerts')
+            return _job_accepted(job, 'Alert sweep queued.')
             
         except Exception as e:
             return JsonResponse({
@@ -406,6 +450,129 @@ def api_generate_alerts(request):
     return JsonResponse({'success': False, 'error': 'Invalid request method'})
 
 
+@login_required
+def api_export_report(request, report_type):
+    """API endpoint that queues a CSV export of a report"""
+    if request.method != 'POST':
+        return JsonResponse({'success': False, 'error': 'Invalid request method'})
+    if report_type not in EXPORT_REPORTS:
+        return JsonResponse({'success': False, 'error': f'Unknown report {report_type}'}, status=404)
+    job = jobs.enqueue('export_report', {'report_type': report_type}, dedupe_key=f'export_report:{report_type}')
+    return _job_accepted(job, 'Report export queued.')
+
+
+def _job_accepted(job, message):
+    return JsonResponse({
+        'success': True,
+        'job_id': job.pk,
+        'status': job.status,
+        'status_url': reverse('inventory:api_job_status', args=[job.pk]),
+        'message': message,
+    }, status=202)
+
+
+@login_required
+def api_job_status(request, job_id):
+    """API endpoint for polling a background job"""
+    job = get_object_or_404(Job, pk=job_id)
+    data = {
+        'id': job.pk,
+        'name': job.name,
+        'status': job.status,
+        'attempts': job.attempts,
+        'progress': {
+            'current': job.progress_current,
+            'total': job.progress_total,
+            'message': job.progress_message,
+        },
+        'result': job.result,
+        'error': job.error.strip().splitlines()[-1] if job.error else '',
+    }
+    if job.status == Job.SUCCEEDED and (job.result or {}).get('file'):
+        data['download_url'] = reverse('inventory:job_download', args=[job.pk])
+    return JsonResponse({'success': True, 'job': data})
+
+
+@login_required
+def job_download(request, job_id):
+    """Download the file written by a finished export job"""
+    job = get_object_or_404(Job, pk=job_id, status=Job.SUCCEEDED)
+    filename = (job.result or {}).get('file')
+    path = os.path.join(settings.JOB_OUTPUT_DIR, filename or '')
+    if not filename or not os.path.isfile(path):
+        raise Http404('Export file not found')
+    return FileResponse(open(path, 'rb'), as_attachment=True, filename=filename)
+
+
+@gzip_page
+@login_required
+def api_sync(request):
+    """API endpoint for offline clients: a snapshot page, or changes since a cursor.
+    
+    Without `since`, pages through every item (`after`, `cursor` carry the
+    paging state). With `since`, returns the items changed or deleted and the
+    movements recorded after that cursor. Follow `next` while `has_more`,
+    then keep `cursor` for the next sync. 410 means the cursor has expired
+    and the client must take a fresh snapshot.
+    """
+    try:
+        limit = min(int(request.GET.get('limit', settings.SYNC_PAGE_SIZE)), settings.SYNC_MAX_PAGE_SIZE)
+        if limit < 1:
+            raise ValueError('limit must be positive')
+        if 'since' in request.GET:
+            page = sync.delta(int(request.GET['since']), limit)
+            next_query = {'since': page['cursor']}
+        else:
+            cursor = request.GET.get('cursor')
+            page = sync.snapshot(int(request.GET.get('after', 0)), limit, int(cursor) if cursor else None)
+            next_query = {'after': page.pop('after'), 'cursor': page['cursor']}
+    except ValueError as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    except sync.CursorExpired as e:
+        return JsonResponse({'success': False, 'error': str(e), 'snapshot_url': reverse('inventory:api_sync')},
+                            status=410)
+    
+    next_query['limit'] = limit
+    page['next'] = f"{reverse('inventory:api_sync')}?{urlencode(next_query)}" if page['has_more'] else None
+    return JsonResponse({'success': True, **page})
+
+
+def _bulk_read(request, resource):
+    try:
+        page = bulk_api.read(resource, request.GET)
+    except bulk_api.BadRequest as e:
+        return JsonResponse({'success': False, 'error': str(e)}, status=400)
+    
+    next_after = page.pop('next_after')
+    page['next'] = None
+    if next_after is not None:
+        query = request.GET.copy()
+        query['after'] = next_after
+        page['next'] = f'{request.path}?{query.urlencode()}'
+    return HttpResponse(bulk_api.dumps(page), content_type='application/json')
+
+
+@gzip_page
+@login_required
+def api_items(request):
+    """Bulk read API for items (see inventory.bulk_api for parameters)"""
+    return _bulk_read(request, 'items')
+
+
+@gzip_page
+@login_required
+def api_transactions(request):
+    """Bulk read API for stock movements"""
+    return _bulk_read(request, 'transactions')
+
+
+@gzip_page
+@login_required
+def api_alerts(request):
+    """Bulk read API for alerts"""
+    return _bulk_read(request, 'alerts')
+
+
 def api_dashboard_data(request):
     """API endpoint for dashboard data (for dynamic updates)"""
     try:
@@ -450,6 +617,13 @@ def api_dashboard_data(request):
             'error': str(e)
         })
 
+def metrics(request):
+    """Prometheus text endpoint merging metrics from every worker process"""
+    allowed = request.META.get('REMOTE_ADDR') in settings.METRICS_ALLOWED_IPS
+    if not (allowed or request.user.is_staff):
+        return HttpResponseForbidden('Metrics are only available locally or to staff')
+    return HttpResponse(inventory_metrics.render(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 # Add JsonResponse import workaround
 try:
     from django.http import JsonResponse
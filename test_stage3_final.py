@@ -21,7 +21,7 @@ except Exception as e:
     sys.exit(1)
 
 from django.contrib.auth.models import User
-from inventory.models import Item, InventoryTransaction, InventoryAlert
+from inventory.models import Category, Item, InventoryTransaction, InventoryAlert, Supplier
 from inventory.forms import StockUpdateForm, ReportFilterForm
 from django.test import Client
 from django.urls import reverse
@@ -44,8 +44,8 @@ def test_models():
         name="Test Widget",
         quantity=15,
         price=29.99,
-        category="Electronics",
-        supplier="Test Supplier",
+        category=Category.objects.resolve("Electronics"),
+        supplier=Supplier.objects.resolve("Test Supplier"),
         reorder_level=10
     )
     